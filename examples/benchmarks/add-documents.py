@@ -0,0 +1,46 @@
+# Benchmark the per-document loop of `Storage.add_documents` against the bulk mode.
+# The script ingests synthetic nodes into an empty store and then re-ingests the same nodes (all duplicates).
+#%%
+import contextlib
+import io
+import time
+from llama_index.core.schema import TextNode
+from vfn_rag.retrieval.storage import Storage
+
+NUM_NODES = 20_000
+
+
+def make_nodes(num_nodes: int):
+    return [
+        TextNode(
+            text=f"chunk {i} of the synthetic corpus",
+            metadata={"file_path": f"report-{i // 100}.txt"},
+        )
+        for i in range(num_nodes)
+    ]
+
+
+def run(bulk: bool):
+    storage = Storage.create()
+    nodes = make_nodes(NUM_NODES)
+    start = time.perf_counter()
+    storage.add_documents(nodes, bulk=bulk)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    if bulk:
+        storage.add_documents(nodes, bulk=True)
+    else:
+        # the loop prints a line per duplicate, keep it out of the timing as much as possible
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage.add_documents(nodes)
+    second = time.perf_counter() - start
+    return first, second
+
+
+#%%
+for mode in (False, True):
+    first, second = run(mode)
+    name = "bulk" if mode else "loop"
+    print(
+        f"{name}: new {NUM_NODES / first:,.0f} docs/s, duplicates {NUM_NODES / second:,.0f} docs/s"
+    )
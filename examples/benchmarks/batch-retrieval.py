@@ -0,0 +1,36 @@
+# Throughput of batched retrieval (`batch_query` / `IndexManager.retrieve_batch`): the queries are scored with one
+# matrix-matrix product instead of one matrix-vector product (and one embedding request) per query.
+#%%
+import time
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.vector_store import NumpyVectorStore, batch_query
+
+NUM_VECTORS = 50_000
+DIM = 1536
+NUM_QUERIES = 500
+TOP_K = 10
+
+rng = np.random.default_rng(0)
+embeddings = rng.normal(size=(NUM_VECTORS, DIM)).astype(np.float32)
+queries = rng.normal(size=(NUM_QUERIES, DIM)).astype(np.float32)
+ids = [f"node-{i}" for i in range(NUM_VECTORS)]
+store = NumpyVectorStore()
+store.add_embeddings(ids, embeddings, ids)
+
+#%%
+start = time.perf_counter()
+one_by_one = [
+    store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=TOP_K)).ids for query in queries
+]
+single = time.perf_counter() - start
+
+start = time.perf_counter()
+batched = [result.ids for result in batch_query(store, queries, TOP_K)]
+batch = time.perf_counter() - start
+
+assert batched == one_by_one
+print(f"one query at a time: {NUM_QUERIES / single:,.0f} queries/s")
+print(f"batched: {NUM_QUERIES / batch:,.0f} queries/s ({single / batch:.1f}x)")
+# the embedding round trips are not included: a batch of queries is embedded with one request per
+# `embed_batch_size` texts instead of one request per query.
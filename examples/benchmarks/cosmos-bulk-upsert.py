@@ -0,0 +1,35 @@
+# Write throughput of `Cosmos.bulk_upsert` compared with the sequential writes of `AzureCosmosDBNoSqlVectorSearch.add`
+# (used by `VectorStoreIndex.from_documents(..., storage_context=cosmos.store)`), on the in-memory stand-in with a
+# network latency of 5 ms per request.
+# The stand-in is a test helper (tests/retrieval/cosmos_memory.py): run from the repository root.
+#%%
+import time
+import numpy as np
+from llama_index.core.schema import TextNode
+from vfn_rag.retrieval.cosmos import Cosmos
+from tests.retrieval.cosmos_memory import InMemoryCosmosClient
+
+NUM_NODES = 2000
+DIM = 1536
+LATENCY = 0.005
+
+rng = np.random.default_rng(0)
+nodes = [
+    TextNode(text=f"chunk {i}", id_=f"node-{i}", embedding=rng.normal(size=DIM).tolist())
+    for i in range(NUM_NODES)
+]
+
+#%%
+cosmos = Cosmos.create("db", "sequential", client=InMemoryCosmosClient(latency=LATENCY))
+start = time.perf_counter()
+cosmos.vector_store.add(nodes)
+elapsed = time.perf_counter() - start
+print(f"sequential: {NUM_NODES / elapsed:,.0f} items/s")
+
+for max_concurrency in (4, 16, 64):
+    cosmos = Cosmos.create("db", f"bulk-{max_concurrency}", client=InMemoryCosmosClient(latency=LATENCY))
+    progress = cosmos.bulk_upsert(nodes, batch_size=500, max_concurrency=max_concurrency)
+    print(
+        f"bulk, max_concurrency={max_concurrency}: {progress.items_per_second:,.0f} items/s, "
+        f"{progress.ru_per_second:,.0f} RU/s"
+    )
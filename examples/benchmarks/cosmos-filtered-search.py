@@ -0,0 +1,71 @@
+# Request charge and recall of a vector search restricted by metadata (one source file, recent years: 5% of the
+# items), filtered after retrieval from a larger top-k, or filtered by Cosmos (`MetadataFilters` translated to the
+# WHERE clause of the query) with the filtered paths in or out of the index, on the in-memory stand-in.
+# The stand-in is a test helper (tests/retrieval/cosmos_memory.py): run from the repository root.
+#%%
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilter, MetadataFilters, VectorStoreQuery
+from vfn_rag.retrieval.cosmos import INDEXING_POLICY, Cosmos, filter_indexing_policy
+from tests.retrieval.cosmos_memory import InMemoryCosmosClient
+
+NUM_NODES = 20000
+NUM_QUERIES = 20
+TOP_K = 5
+DIM = 256
+
+rng = np.random.default_rng(0)
+nodes = [
+    TextNode(
+        text=f"chunk {i}",
+        id_=f"node-{i}",
+        embedding=rng.normal(size=DIM).tolist(),
+        metadata={"file_name": f"file-{i % 20}.txt", "year": 2000 + i % 4 * 5, "region": f"region-{i % 7}"},
+    )
+    for i in range(NUM_NODES)
+]
+filters = MetadataFilters(
+    filters=[
+        MetadataFilter(key="file_name", value="file-3.txt"),
+        MetadataFilter(key="year", value=2015, operator=FilterOperator.GTE),
+    ]
+)
+embeddings = [rng.normal(size=DIM).tolist() for _ in range(NUM_QUERIES)]
+
+
+def matches(node) -> bool:
+    return node.metadata["file_name"] == "file-3.txt" and node.metadata["year"] >= 2015
+
+
+def run(name: str, cosmos: Cosmos, top_k: int, pushdown: bool):
+    container = cosmos.container
+    charge, num_matches = container.request_charge, 0
+    for embedding in embeddings:
+        query = VectorStoreQuery(
+            query_embedding=embedding, similarity_top_k=top_k, filters=filters if pushdown else None
+        )
+        result = cosmos.vector_store.query(query)
+        num_matches += min(TOP_K, sum(matches(node) for node in result.nodes))
+    charge = (container.request_charge - charge) / NUM_QUERIES
+    recall = num_matches / (NUM_QUERIES * TOP_K)
+    print(f"{name}: {charge:,.1f} RU/query, {recall:.0%} of the {TOP_K} matching results returned")
+
+
+#%%
+client = InMemoryCosmosClient()
+unindexed_policy = {**INDEXING_POLICY, "includedPaths": [{"path": "/id/?"}], "excludedPaths": [{"path": "/*"}]}
+containers = {
+    "default": Cosmos.create("db", "default", client=client),
+    "unindexed": Cosmos.create("db", "unindexed", client=client, indexing_policy=unindexed_policy),
+    "filter policy": Cosmos.create(
+        "db", "filter-policy", client=client, indexing_policy=filter_indexing_policy(["file_name", "year"])
+    ),
+}
+for cosmos in containers.values():
+    cosmos.bulk_upsert(nodes, batch_size=2000, max_concurrency=64)
+
+for top_k in (50, 200):
+    run(f"filtered after retrieval, top {top_k}", containers["default"], top_k, pushdown=False)
+run("filtered by Cosmos, paths out of the index", containers["unindexed"], TOP_K, pushdown=True)
+run("filtered by Cosmos, INDEXING_POLICY (every path)", containers["default"], TOP_K, pushdown=True)
+run("filtered by Cosmos, filter_indexing_policy", containers["filter policy"], TOP_K, pushdown=True)
@@ -0,0 +1,55 @@
+# Request charge and latency of a tenant's vector search, with the items partitioned by id (every query reads all
+# the physical partitions) or by tenant (`PartitionStrategy.by_metadata("tenant")`, a query scoped to the tenant
+# reads one logical partition), on the in-memory stand-in with 16 physical partitions and a network latency of 5 ms
+# per request.
+# The stand-in is a test helper (tests/retrieval/cosmos_memory.py): run from the repository root.
+#%%
+import time
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.cosmos import Cosmos, PartitionStrategy
+from tests.retrieval.cosmos_memory import InMemoryCosmosClient
+
+NUM_TENANTS = 20
+NUM_NODES = 20000
+NUM_QUERIES = 50
+DIM = 256
+LATENCY = 0.005
+
+rng = np.random.default_rng(0)
+nodes = [
+    TextNode(
+        text=f"chunk {i}",
+        id_=f"node-{i}",
+        embedding=rng.normal(size=DIM).tolist(),
+        metadata={"tenant": f"tenant-{i % NUM_TENANTS}"},
+    )
+    for i in range(NUM_NODES)
+]
+queries = [
+    (f"tenant-{i % NUM_TENANTS}", VectorStoreQuery(query_embedding=rng.normal(size=DIM).tolist(), similarity_top_k=5))
+    for i in range(NUM_QUERIES)
+]
+
+
+def run(name: str, cosmos: Cosmos, scoped: bool):
+    container = cosmos.container
+    charge, start = container.request_charge, time.perf_counter()
+    for tenant, query in queries:
+        cosmos.vector_store.query(query, partition_key=tenant if scoped else None)
+    elapsed = (time.perf_counter() - start) / NUM_QUERIES
+    charge = (container.request_charge - charge) / NUM_QUERIES
+    print(f"{name}: {charge:,.1f} RU/query, {elapsed * 1000:.1f} ms/query")
+
+
+#%%
+client = InMemoryCosmosClient(latency=LATENCY, num_physical_partitions=16)
+by_id = Cosmos.create("db", "by-id", client=client)
+by_id.bulk_upsert(nodes, batch_size=2000, max_concurrency=64)
+by_tenant = Cosmos.create("db", "by-tenant", client=client, partition_strategy=PartitionStrategy.by_metadata("tenant"))
+by_tenant.bulk_upsert(nodes, batch_size=2000, max_concurrency=64)
+
+run("partitioned by id", by_id, scoped=False)
+run("partitioned by tenant, cross-partition query", by_tenant, scoped=False)
+run("partitioned by tenant, partition-scoped query", by_tenant, scoped=True)
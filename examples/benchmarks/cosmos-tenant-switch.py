@@ -0,0 +1,63 @@
+# Latency of the first query after switching tenant (one container per tenant): `Cosmos.load` and one vector query,
+# on the in-memory stand-in with a network latency of 5 ms per request. A new client costs the TLS handshakes and the
+# account read (3 round-trips), `Cosmos.load` reads the container properties (1 round-trip).
+# The stand-in is a test helper (tests/retrieval/cosmos_memory.py): run from the repository root.
+#%%
+import time
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval import cosmos as cosmos_module
+from vfn_rag.retrieval.cosmos import ClientRegistry, Cosmos
+from tests.retrieval.cosmos_memory import InMemoryCosmosClient
+
+NUM_TENANTS = 20
+NUM_SWITCHES = 200
+NUM_NODES = 200
+DIM = 256
+LATENCY = 0.005
+URI, KEY = "https://account.documents.azure.com:443/", "key"
+
+rng = np.random.default_rng(0)
+account = InMemoryCosmosClient(latency=LATENCY)
+tenants = [f"tenant-{i}" for i in range(NUM_TENANTS)]
+for tenant in tenants:
+    nodes = [
+        TextNode(text=f"chunk {i}", id_=f"{tenant}-{i}", embedding=rng.normal(size=DIM).tolist())
+        for i in range(NUM_NODES)
+    ]
+    Cosmos.create("tenants", tenant, client=account).bulk_upsert(nodes)
+
+
+def connect(uri, key, pool_size=None, **kwargs):
+    time.sleep(3 * LATENCY)
+    return account
+
+
+def first_query_latencies(load) -> np.ndarray:
+    latencies = []
+    query = VectorStoreQuery(query_embedding=rng.normal(size=DIM).tolist(), similarity_top_k=5)
+    for tenant in rng.choice(tenants, NUM_SWITCHES):
+        start = time.perf_counter()
+        load(tenant).vector_store.query(query)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def report(name: str, latencies: np.ndarray):
+    print(f"{name}: p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms")
+
+
+#%% a new client for every load (`create_client`).
+report("new client", first_query_latencies(lambda tenant: Cosmos.load("tenants", tenant, client=connect(URI, KEY))))
+
+#%% the process-wide registry.
+cosmos_module.CLIENTS = ClientRegistry(connect)
+report("registry", first_query_latencies(lambda tenant: Cosmos.load("tenants", tenant, uri=URI, key=KEY)))
+
+#%% the registry, with the tenant containers warmed up at start.
+start = time.perf_counter()
+cosmos_module.CLIENTS.warm_up([("tenants", tenant) for tenant in tenants], uri=URI, key=KEY)
+print(f"warm-up of {NUM_TENANTS} containers: {(time.perf_counter() - start) * 1000:.0f} ms")
+report("registry + warm-up", first_query_latencies(lambda tenant: Cosmos.load("tenants", tenant, uri=URI, key=KEY)))
+cosmos_module.CLIENTS.close()
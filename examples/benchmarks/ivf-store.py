@@ -0,0 +1,51 @@
+# Recall@k versus query latency of the IVFVectorStore (approximate search) for increasing nprobe, compared with the
+# exact search of the NumpyVectorStore.
+#%%
+import time
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.ivf_store import IVFVectorStore
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+NUM_VECTORS = 100_000
+DIM = 256
+NUM_CLUSTERS = 500
+NUM_QUERIES = 100
+TOP_K = 10
+
+rng = np.random.default_rng(0)
+centers = rng.normal(size=(NUM_CLUSTERS, DIM)).astype(np.float32)
+labels = rng.integers(NUM_CLUSTERS, size=NUM_VECTORS)
+embeddings = centers[labels] + 0.5 * rng.normal(size=(NUM_VECTORS, DIM)).astype(np.float32)
+query_labels = rng.integers(NUM_CLUSTERS, size=NUM_QUERIES)
+queries = centers[query_labels] + 0.5 * rng.normal(size=(NUM_QUERIES, DIM)).astype(np.float32)
+ids = [f"node-{i}" for i in range(NUM_VECTORS)]
+
+
+def run(store) -> tuple:
+    """Run the queries, return the results and the mean latency in ms."""
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        result = store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=TOP_K))
+        results.append(set(result.ids))
+    return results, (time.perf_counter() - start) / NUM_QUERIES * 1000
+
+
+#%%
+exact = NumpyVectorStore()
+exact.add_embeddings(ids, embeddings, ids)
+exact_results, exact_latency = run(exact)
+print(f"exact: recall@{TOP_K} 1.000, {exact_latency:.2f} ms/query")
+
+ivf = IVFVectorStore(nlist=1024)
+ivf.add_embeddings(ids, embeddings, ids)
+start = time.perf_counter()
+ivf.train()
+print(f"IVF training ({ivf._centroids.shape[0]} lists): {time.perf_counter() - start:.1f} s")
+
+for nprobe in (1, 2, 4, 8, 16, 32, 64):
+    ivf.nprobe = nprobe
+    results, latency = run(ivf)
+    recall = np.mean([len(r & e) / TOP_K for r, e in zip(results, exact_results)])
+    print(f"IVF nprobe={nprobe:>3}: recall@{TOP_K} {recall:.3f}, {latency:.2f} ms/query")
@@ -0,0 +1,55 @@
+# Memory and recall@k of the QuantizedVectorStore (int8 codes) with and without rescoring, compared with the exact
+# search of the NumpyVectorStore.
+#%%
+import os
+import tempfile
+import time
+import numpy as np
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.quantized_store import QuantizedVectorStore
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+NUM_VECTORS = 20_000
+DIM = 3072
+NUM_QUERIES = 50
+TOP_K = 10
+
+rng = np.random.default_rng(0)
+# embeddings of a real model are not isotropic, give them a shared direction and a few clusters.
+centers = rng.normal(size=(50, DIM)).astype(np.float32)
+embeddings = (
+    centers[rng.integers(50, size=NUM_VECTORS)] + rng.normal(size=(NUM_VECTORS, DIM)).astype(np.float32)
+)
+queries = embeddings[rng.choice(NUM_VECTORS, NUM_QUERIES)] + 0.5 * rng.normal(size=(NUM_QUERIES, DIM))
+ids = [f"node-{i}" for i in range(NUM_VECTORS)]
+
+
+def run(store) -> tuple:
+    results = []
+    start = time.perf_counter()
+    for query in queries.astype(np.float32):
+        results.append(store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=TOP_K)).ids)
+    return results, (time.perf_counter() - start) / NUM_QUERIES * 1000
+
+
+#%%
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "default__vector_store.json")
+    exact = NumpyVectorStore()
+    exact.add_embeddings(ids, embeddings, ids)
+    exact_results, latency = run(exact)
+    print(f"exact float32: {exact.embeddings.nbytes / 2**20:,.0f} MB in memory, {latency:.1f} ms/query")
+
+    store = QuantizedVectorStore()
+    store.add_embeddings(ids, embeddings, ids)
+    store.persist(path)
+    # the full-precision embeddings are memory-mapped: only the rescored rows are read from disk.
+    store = QuantizedVectorStore.from_persist_path(path)
+    for rescore_factor in (0, 2, 4):
+        store.rescore_factor = rescore_factor
+        results, latency = run(store)
+        recall = np.mean([len(set(r) & set(e)) / TOP_K for r, e in zip(results, exact_results)])
+        print(
+            f"int8, rescore_factor={rescore_factor}: {store.resident_bytes / 2**20:,.0f} MB in memory, "
+            f"recall@{TOP_K} {recall:.3f}, {latency:.1f} ms/query"
+        )
@@ -0,0 +1,50 @@
+# Compare the persisted size, cold-load time and query time of the SimpleVectorStore (JSON) and the
+# NumpyVectorStore (memory-mapped float32 matrix).
+#%%
+import os
+import tempfile
+import time
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+NUM_VECTORS = 5_000
+DIM = 3072
+NUM_QUERIES = 20
+
+rng = np.random.default_rng(0)
+embeddings = rng.normal(size=(NUM_VECTORS, DIM)).astype(np.float32)
+nodes = [
+    TextNode(id_=f"node-{i}", text="", embedding=embedding.tolist())
+    for i, embedding in enumerate(embeddings)
+]
+queries = rng.normal(size=(NUM_QUERIES, DIM)).astype(np.float32).tolist()
+
+
+def size_mb(directory: str) -> float:
+    return sum(entry.stat().st_size for entry in os.scandir(directory)) / 2**20
+
+
+#%%
+for store_class in (SimpleVectorStore, NumpyVectorStore):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "default__vector_store.json")
+        store = store_class()
+        store.add(nodes)
+        store.persist(path)
+
+        start = time.perf_counter()
+        store = store_class.from_persist_path(path)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for query in queries:
+            store.query(VectorStoreQuery(query_embedding=query, similarity_top_k=10))
+        query_time = (time.perf_counter() - start) / NUM_QUERIES
+
+        print(
+            f"{store_class.__name__}: {size_mb(directory):,.0f} MB on disk, "
+            f"cold load {load_time * 1000:,.1f} ms, query {query_time * 1000:,.1f} ms"
+        )
@@ -0,0 +1,205 @@
+"""Content-defined chunking.
+
+`TokenTextSplitter` cuts a document every `chunk_size` tokens, so inserting or removing a word shifts every
+following chunk, and the chunks of an edited document all get new IDs and new embeddings.
+`ContentDefinedSplitter` places the cut points where a rolling hash over the last few words matches a pattern, so
+the cut points only depend on the local content: after an edit the cut points resynchronize right after the
+changed region and the chunks around it are identical to the old ones. Each chunk gets as ID the SHA-256 hash of
+its document, its text and the number of identical chunks before it in the document, so the unchanged chunks of an
+edited document keep their IDs and are found in the docstore and not embedded again (see
+`IngestionSummary.reuse_ratio`), while a chunk repeated in a document, or in another document, gets its own ID.
+The document is identified by its `file_path` metadata, which survives an edit, or by its ID if it has none.
+The chunks are added to the store with `Storage.add_documents(nodes, generate_id=False)`, which keeps these IDs
+(the default replaces them with the hash of the text).
+"""
+
+import re
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from pydantic import Field, PrivateAttr
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.schema import BaseNode
+from llama_index.core.utils import get_tokenizer, get_tqdm_iterable
+from vfn_rag.utils.helper_functions import generate_content_hash
+
+DEFAULT_CHUNK_SIZE = 512
+DEFAULT_MIN_CHUNK_SIZE = 64
+DEFAULT_TARGET_CHUNK_SIZE = 256
+DEFAULT_WINDOW_SIZE = 16
+# the base of the polynomial rolling hash, the hash is kept in 32 bits.
+_BASE = 16777619
+_MASK = 0xFFFFFFFF
+# a word and the whitespace that follows it.
+_UNIT_PATTERN = re.compile(r"\s*\S+\s*")
+
+__all__ = ["ContentDefinedSplitter", "chunk_id"]
+
+
+class ContentDefinedSplitter(NodeParser):
+    """Split documents at content-defined cut points, within a token budget.
+
+    The text is split in words, and a polynomial rolling hash is computed over the last `window_size` words. A
+    chunk ends after a word when the chunk has at least `min_chunk_size` tokens and the rolling hash is a multiple
+    of `target_chunk_size - min_chunk_size`, so the chunks have about `target_chunk_size` tokens on average. A
+    chunk is always cut before it exceeds `chunk_size` tokens, and a word longer than `chunk_size` tokens is split.
+    """
+
+    chunk_size: int = Field(
+        default=DEFAULT_CHUNK_SIZE, description="The maximum number of tokens of a chunk.", gt=0
+    )
+    min_chunk_size: int = Field(
+        default=DEFAULT_MIN_CHUNK_SIZE,
+        description="The minimum number of tokens of a chunk (except the last chunk of a document).",
+        ge=0,
+    )
+    target_chunk_size: int = Field(
+        default=DEFAULT_TARGET_CHUNK_SIZE, description="The average number of tokens of a chunk.", gt=0
+    )
+    window_size: int = Field(
+        default=DEFAULT_WINDOW_SIZE, description="The number of words of the rolling hash window.", gt=0
+    )
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        min_chunk_size: int = DEFAULT_MIN_CHUNK_SIZE,
+        target_chunk_size: int = DEFAULT_TARGET_CHUNK_SIZE,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        tokenizer: Optional[Callable] = None,
+        **kwargs: Any,
+    ):
+        """Initialize the splitter.
+
+        Parameters
+        ----------
+        chunk_size: int, optional, default is 512.
+            The maximum number of tokens of a chunk.
+        min_chunk_size: int, optional, default is 64.
+            The minimum number of tokens of a chunk (except the last chunk of a document).
+        target_chunk_size: int, optional, default is 256.
+            The average number of tokens of a chunk, between `min_chunk_size` and `chunk_size`.
+        window_size: int, optional, default is 16.
+            The number of words the rolling hash is computed over.
+        tokenizer: Callable, optional, default is None.
+            The tokenizer used to count the tokens, the llama_index default tokenizer if not given.
+        """
+        if not min_chunk_size < target_chunk_size <= chunk_size:
+            raise ValueError(
+                f"Expected min_chunk_size < target_chunk_size <= chunk_size, got {min_chunk_size}, "
+                f"{target_chunk_size} and {chunk_size}."
+            )
+        super().__init__(
+            chunk_size=chunk_size,
+            min_chunk_size=min_chunk_size,
+            target_chunk_size=target_chunk_size,
+            window_size=window_size,
+            **kwargs,
+        )
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContentDefinedSplitter"
+
+    def split_text(self, text: str) -> List[str]:
+        """Split a text at content-defined cut points.
+
+        Parameters
+        ----------
+        text: str
+            The text to split.
+
+        Returns
+        -------
+        List[str]
+            The chunks, their concatenation is the text.
+        """
+        units, units_tokens = [], []
+        for word in _UNIT_PATTERN.findall(text):
+            for unit, num_tokens in self._fit(word):
+                units.append(unit)
+                units_tokens.append(num_tokens)
+        if not units:
+            return []
+
+        divisor = self.target_chunk_size - self.min_chunk_size
+        # the weight of the word leaving the window: _BASE ** window_size.
+        outgoing_weight = pow(_BASE, self.window_size, _MASK + 1)
+        unit_hashes = [zlib.crc32(unit.strip().encode("utf-8")) for unit in units]
+
+        chunks = []
+        start = 0
+        num_tokens = 0
+        rolling_hash = 0
+        for i, unit_tokens in enumerate(units_tokens):
+            if num_tokens and num_tokens + unit_tokens > self.chunk_size:
+                chunks.append("".join(units[start:i]))
+                start, num_tokens = i, 0
+            num_tokens += unit_tokens
+
+            rolling_hash = (rolling_hash * _BASE + unit_hashes[i]) & _MASK
+            if i >= self.window_size:
+                rolling_hash = (rolling_hash - unit_hashes[i - self.window_size] * outgoing_weight) & _MASK
+
+            if num_tokens >= self.min_chunk_size and rolling_hash % divisor == 0:
+                chunks.append("".join(units[start : i + 1]))
+                start, num_tokens = i + 1, 0
+
+        if start < len(units):
+            chunks.append("".join(units[start:]))
+        return chunks
+
+    def _fit(self, word: str) -> List[tuple]:
+        """Split a word (and its whitespace) in halves until every piece has at most `chunk_size` tokens.
+
+        Returns
+        -------
+        List[tuple]
+            The pieces and their number of tokens.
+        """
+        num_tokens = len(self._tokenizer(word))
+        if num_tokens <= self.chunk_size or len(word) == 1:
+            return [(word, num_tokens)]
+        middle = len(word) // 2
+        return self._fit(word[:middle]) + self._fit(word[middle:])
+
+    def _parse_nodes(
+        self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any
+    ) -> List[BaseNode]:
+        all_nodes: List[BaseNode] = []
+        nodes_with_progress = get_tqdm_iterable(nodes, show_progress, "Splitting documents")
+        for node in nodes_with_progress:
+            splits = self.split_text(node.get_content())
+            chunk_nodes = build_nodes_from_splits(splits, node)
+            document_key = node.metadata.get("file_path") or node.node_id
+            occurrences: Dict[str, int] = {}
+            for chunk_node in chunk_nodes:
+                # the ID does not depend on the offset of the chunk, so an unchanged chunk keeps its ID (and its
+                # embedding) when an edit before it adds or removes chunks.
+                occurrence = occurrences.get(chunk_node.text, 0)
+                occurrences[chunk_node.text] = occurrence + 1
+                chunk_node.id_ = chunk_id(document_key, chunk_node.text, occurrence)
+            all_nodes.extend(chunk_nodes)
+        return all_nodes
+
+
+def chunk_id(document_key: str, text: str, occurrence: int = 0) -> str:
+    """Get the ID of a chunk of `ContentDefinedSplitter`.
+
+    Parameters
+    ----------
+    document_key: str
+        The `file_path` of the document, or its ID.
+    text: str
+        The text of the chunk.
+    occurrence: int, optional, default is 0.
+        The number of chunks with the same text before this one in the document.
+
+    Returns
+    -------
+    str
+        The SHA-256 hash of the three values.
+    """
+    return generate_content_hash(f"{document_key}\n{occurrence}\n{text}")
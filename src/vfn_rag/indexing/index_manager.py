@@ -1,19 +1,152 @@
-from typing import List
+import asyncio
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
 from llama_index.core.indices.base import BaseIndex
-from llama_index.core import load_indices_from_storage, VectorStoreIndex
+from llama_index.core.schema import (
+    Document,
+    MetadataMode,
+    NodeWithScore,
+    QueryBundle,
+    TextNode,
+)
+from llama_index.core.utils import get_tokenizer
+from llama_index.core import (
+    StorageContext,
+    load_index_from_storage,
+    load_indices_from_storage,
+    VectorStoreIndex,
+)
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.response_synthesizers import get_response_synthesizer
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.query_engine import RetrieverQueryEngine
+from vfn_rag.indexing.query_cache import CachedQueryEngine, QueryCache
+from vfn_rag.retrieval.keyword_index import HybridRetriever, KeywordIndex
 from vfn_rag.retrieval.storage import Storage
+from vfn_rag.retrieval.vector_store import batch_query
+from vfn_rag.utils.helper_functions import generate_content_hash
+
+CHECKPOINT_FILE = "index_checkpoint.json"
+SHARD_DIR_FORMAT = "shard-{:03d}"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BuildProgress:
+    """Progress of a batched index build, passed to the `progress_callback` of `create_from_storage`.
+
+    Attributes
+    ----------
+    num_done: int
+        The number of documents in the index (including the ones inserted before a resume).
+    num_total: int
+        The number of documents to index.
+    num_tokens: int
+        The number of tokens embedded since the build (or resume) started.
+    elapsed: float
+        The seconds since the build (or resume) started.
+    num_inserted: int
+        The number of documents inserted since the build (or resume) started.
+    """
+
+    num_done: int
+    num_total: int
+    num_tokens: int
+    elapsed: float
+    num_inserted: int
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.num_inserted / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.num_tokens / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class SyncSummary:
+    """Summary of an `IndexManager.sync` call for one index.
+
+    Attributes
+    ----------
+    inserted: List[str]
+        IDs of the documents that were embedded and inserted into the index.
+    deleted: List[str]
+        IDs of the nodes that were deleted from the index because they are no longer in the docstore.
+    """
+
+    inserted: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
 
 
 class IndexManager:
     """A class to manage multiple indexes, handling updates, deletions, and retrieval operations."""
 
-    def __init__(self, ids: List[str], indexes: List[BaseIndex]):
+    def __init__(
+        self,
+        ids: List[str],
+        indexes: Optional[List[BaseIndex]],
+        storages: Optional[List[Storage]] = None,
+        storage_context: Optional[StorageContext] = None,
+        max_resident: Optional[int] = None,
+    ):
         self._indexes = indexes
         self._ids = ids
+        # the storage of each shard, see `create_shards`.
+        self._storages = storages
+        # lazy loading (`indexes` is None): the indexes are loaded from the storage context on first access.
+        self._storage_context = storage_context
+        self._max_resident = max_resident
+        self._resident: "OrderedDict[str, BaseIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped when an index changes, invalidates the cached answers of the index (see `as_query_engine`).
+        self._versions: Dict[str, int] = {}
 
     @classmethod
-    def load_from_storage(cls, storage: Storage) -> "IndexManager":
-        """Reads indexes from storage."""
+    def load_from_storage(
+        cls, storage: Storage, lazy: bool = False, max_resident: Optional[int] = None
+    ) -> "IndexManager":
+        """Reads indexes from storage.
+
+        Parameters
+        ----------
+        storage : Storage
+            The storage to read the indexes from.
+        lazy : bool, optional, default is False.
+            True to only read the index IDs, each index is then loaded the first time it is accessed (see
+            `get_index`), so the load time does not depend on the number of indexes.
+        max_resident : int, optional, default is None.
+            The maximum number of indexes kept loaded in lazy mode, the least recently used index is dropped
+            (and loaded again when accessed). No limit if None. Only the index objects (and their deserialized
+            index structs) are cached: the indexes share the stores of the storage context, which stay in memory
+            when an index is dropped.
+
+        Returns
+        -------
+        IndexManager
+            The index manager object
+        """
+        if lazy:
+            return cls(
+                storage.index_ids(),
+                None,
+                storage_context=storage.store,
+                max_resident=max_resident,
+            )
         storage = storage.store
         index_instructs = storage.index_store.index_structs()
         index_ids = [index_i.index_id for index_i in index_instructs]
@@ -22,24 +155,166 @@ class IndexManager:
 
     @property
     def indexes(self) -> List[BaseIndex]:
+        if self._indexes is None:
+            return [self.get_index(index_id) for index_id in self._ids]
         return self._indexes
 
     @indexes.setter
     def indexes(self, indexes: List[BaseIndex]):
         self._indexes = indexes
 
+    @property
+    def resident_ids(self) -> List[str]:
+        """The IDs of the loaded index objects (all of them if the indexes are not loaded lazily)."""
+        if self._indexes is None:
+            return list(self._resident)
+        return list(self._ids)
+
+    def get_index(self, index_id: str) -> BaseIndex:
+        """Get an index by ID, loading it from the storage if it is not loaded yet (lazy mode).
+
+        Parameters
+        ----------
+        index_id : str
+            The ID of the index.
+
+        Returns
+        -------
+        BaseIndex
+            The index.
+        """
+        if self._indexes is not None:
+            return self._indexes[self._ids.index(index_id)]
+        if index_id not in self._ids:
+            raise ValueError(f"Unknown index: {index_id}")
+        with self._lock:
+            index = self._resident.get(index_id)
+            if index is None:
+                index = load_index_from_storage(self._storage_context, index_id=index_id)
+                self._resident[index_id] = index
+                if self._max_resident is not None:
+                    while len(self._resident) > self._max_resident:
+                        self._resident.popitem(last=False)
+            self._resident.move_to_end(index_id)
+            return index
+
     @property
     def ids(self) -> List[str]:
         return self._ids
 
+    def version(self, index_id: str) -> int:
+        """Get the version of an index, bumped every time `sync` or `insert_documents` changes the index."""
+        return self._versions.get(index_id, 0)
+
+    def _bump_version(self, index_id: str):
+        self._versions[index_id] = self.version(index_id) + 1
+
+    def as_retriever(
+        self,
+        index_id: Optional[str] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+        **kwargs,
+    ) -> BaseRetriever:
+        """Get a retriever of an index, optionally fusing the vector and BM25 rankings.
+
+        Parameters
+        ----------
+        index_id : str, optional, default is None.
+            The ID of the index, the last index if None.
+        keyword_index : KeywordIndex, optional, default is None.
+            The keyword index of the documents of the index, to get a `HybridRetriever`. Exact terms (species
+            names, station codes) are then found with a small `similarity_top_k`.
+        **kwargs :
+            The arguments of `HybridRetriever` (`similarity_top_k`, `candidate_top_k`, `rrf_k`), or of
+            `index.as_retriever` without a keyword index.
+
+        Returns
+        -------
+        BaseRetriever
+            The retriever.
+        """
+        index = self.get_index(index_id or self._ids[-1])
+        if keyword_index is None:
+            return index.as_retriever(**kwargs)
+        return HybridRetriever(index, keyword_index, **kwargs)
+
+    def as_query_engine(
+        self,
+        index_id: Optional[str] = None,
+        cache: Optional[QueryCache] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+        **kwargs,
+    ) -> BaseQueryEngine:
+        """Get a query engine of an index, optionally behind a query cache.
+
+        Parameters
+        ----------
+        index_id : str, optional, default is None.
+            The ID of the index, the last index if None.
+        cache : QueryCache, optional, default is None.
+            The cache of the answers. The cached answers of an index are invalidated when its version changes
+            (see `version`).
+        keyword_index : KeywordIndex, optional, default is None.
+            The keyword index of the documents of the index, to retrieve with a `HybridRetriever` (see
+            `as_retriever`).
+        **kwargs :
+            The arguments of `index.as_query_engine`, or of `RetrieverQueryEngine.from_args` (and
+            `similarity_top_k`) with a keyword index.
+
+        Returns
+        -------
+        BaseQueryEngine
+            The query engine (a `CachedQueryEngine` if a cache is given).
+        """
+        index_id = index_id or self._ids[-1]
+        index = self.get_index(index_id)
+        if keyword_index is None:
+            query_engine = index.as_query_engine(**kwargs)
+        else:
+            retriever_kwargs = {
+                key: kwargs.pop(key)
+                for key in ("similarity_top_k", "candidate_top_k", "rrf_k")
+                if key in kwargs
+            }
+            query_engine = RetrieverQueryEngine.from_args(
+                HybridRetriever(index, keyword_index, **retriever_kwargs), **kwargs
+            )
+        if cache is None:
+            return query_engine
+        return CachedQueryEngine(
+            query_engine,
+            cache,
+            version=lambda: (index_id, self.version(index_id)),
+            embed_model=getattr(index, "_embed_model", None),
+        )
+
     @classmethod
-    def create_from_storage(cls, storage: Storage) -> "IndexManager":
+    def create_from_storage(
+        cls,
+        storage: Storage,
+        batch_size: Optional[int] = None,
+        store_dir: Optional[str] = None,
+        progress_callback: Optional[Callable[[BuildProgress], None]] = None,
+    ) -> "IndexManager":
         """Creates a new index.
 
+            With `batch_size`, the documents are read from the docstore, embedded and inserted one batch at a time.
+            If `store_dir` is given, the storage is saved there (incrementally) after each batch together with a
+            checkpoint (`index_checkpoint.json`). If the build is interrupted, loading the storage from `store_dir`
+            and calling `create_from_storage` again with the same `store_dir` resumes the build: the documents
+            that are already in the index are not embedded again. The checkpoint is removed once the build is done.
+
         Parameters
         ----------
         storage : Storage
             The storage object to create the index from.
+        batch_size : int, optional, default is None.
+            The number of documents embedded and inserted per batch. If None (and no `store_dir` is given), all
+            the documents are indexed at once.
+        store_dir : str, optional, default is None.
+            The directory to save the storage and the checkpoint to after each batch.
+        progress_callback : Callable[[BuildProgress], None], optional, default is None.
+            Called after each batch with the progress and the throughput (documents/s and tokens/s).
 
         Returns
         -------
@@ -47,7 +322,488 @@ class IndexManager:
             The new index manager object
         """
         docstore = storage.docstore
-        index = VectorStoreIndex(
-            list(docstore.docs.values()), storage_context=storage.store
+        if batch_size is None and store_dir is None:
+            index = VectorStoreIndex(
+                list(docstore.docs.values()), storage_context=storage.store
+            )
+            return cls([index.index_id], [index])
+
+        batch_size = batch_size or len(storage.document_ids()) or 1
+        checkpoint = _read_checkpoint(store_dir)
+        # the checkpoint is written before the first save, the index is not in the store if that save was interrupted.
+        if checkpoint is not None and storage.index_store.get_index_struct(checkpoint["index_id"]) is not None:
+            index = load_index_from_storage(
+                storage.store, index_id=checkpoint["index_id"]
+            )
+        else:
+            index = VectorStoreIndex([], storage_context=storage.store)
+        # a sorted list of IDs, so the order of the documents does not depend on the docstore.
+        doc_ids = sorted(storage.document_ids())
+        indexed = set(index.index_struct.nodes_dict)
+        to_index = [doc_id for doc_id in doc_ids if doc_id not in indexed]
+
+        num_done = len(doc_ids) - len(to_index)
+        _insert_in_batches(
+            index,
+            storage,
+            to_index,
+            batch_size,
+            store_dir=store_dir,
+            progress_callback=progress_callback,
+            num_done=num_done,
+            num_total=len(doc_ids),
+            checkpoint=True,
+        )
+        if store_dir is not None:
+            storage.save(store_dir, incremental=True)
+            _remove_checkpoint(store_dir)
+        return cls([index.index_id], [index])
+
+    def sync(
+        self,
+        storage: Storage,
+        store_dir: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        progress_callback: Optional[Callable[[BuildProgress], None]] = None,
+    ) -> Dict[str, SyncSummary]:
+        """Bring the vector indexes in line with the docstore.
+
+            The node IDs of each `VectorStoreIndex` are compared with the IDs in the docstore: the documents that
+            are not in the index are embedded and inserted, the nodes whose document is no longer in the docstore
+            are deleted from the vector store, and the unchanged documents are not touched. The documents IDs are
+            content hashes, so a modified document is a new document and its old version is deleted. The cost of a
+            sync is proportional to the change, not to the size of the index.
+
+            The docstore does not record which index a document belongs to, so the manager must hold a single
+            `VectorStoreIndex` (e.g. the one built by `create_from_storage`). The shards of `create_shards` each
+            have their own storage and are synced one at a time.
+
+        Parameters
+        ----------
+        storage : Storage
+            The storage the indexes were loaded from (or created in), with the updated docstore.
+        store_dir : str, optional, default is None.
+            The directory to save the changes to (an incremental save, see `Storage.save`).
+        batch_size : int, optional, default is None.
+            The number of documents embedded and inserted per batch, all at once if None.
+        progress_callback : Callable[[BuildProgress], None], optional, default is None.
+            Called after each inserted batch with the progress and the throughput.
+
+        Returns
+        -------
+        Dict[str, SyncSummary]
+            The IDs of the inserted and deleted documents, by index ID.
+
+        Raises
+        ------
+        ValueError
+            If the manager holds more than one `VectorStoreIndex`.
+        """
+        vector_index_ids = [
+            index_id
+            for index_id, index in zip(self._ids, self.indexes)
+            if isinstance(index, VectorStoreIndex)
+        ]
+        if len(vector_index_ids) > 1:
+            raise ValueError(
+                f"Cannot sync {len(vector_index_ids)} vector indexes with one docstore, every document would be "
+                f"inserted into every index: {vector_index_ids}."
+            )
+        doc_ids = sorted(storage.document_ids())
+        summaries = {}
+        for index_id, index in zip(self._ids, self.indexes):
+            if not isinstance(index, VectorStoreIndex):
+                continue
+            indexed = set(index.index_struct.nodes_dict)
+            summary = SyncSummary(
+                inserted=[doc_id for doc_id in doc_ids if doc_id not in indexed],
+                deleted=sorted(indexed.difference(doc_ids)),
+            )
+            if summary.deleted:
+                index.vector_store.delete_nodes(summary.deleted)
+                for node_id in summary.deleted:
+                    index.index_struct.delete(node_id)
+                storage.store.index_store.add_index_struct(index.index_struct)
+            if summary.inserted or summary.deleted:
+                self._bump_version(index_id)
+            _insert_in_batches(
+                index,
+                storage,
+                summary.inserted,
+                batch_size or len(summary.inserted) or 1,
+                progress_callback=progress_callback,
+                num_done=len(doc_ids) - len(summary.inserted),
+                num_total=len(doc_ids),
+            )
+            summaries[index_id] = summary
+
+        if store_dir is not None:
+            storage.save(store_dir, incremental=True)
+        return summaries
+
+    @classmethod
+    def create_shards(
+        cls, num_shards: int, vector_store: str = "simple", docstore: str = "simple"
+    ) -> "IndexManager":
+        """Create empty indexes used as shards of one corpus.
+
+            Each shard has its own storage (docstore, index store and vector store), so a corpus that is too large
+            for one vector store can be split. The documents are routed to the shards by a hash of their ID (see
+            `insert_documents`) and `retrieve` queries all the shards in parallel.
+
+        Parameters
+        ----------
+        num_shards : int
+            The number of shards.
+        vector_store : str, optional, default is "simple".
+            The vector store of each shard, see `Storage.create`.
+        docstore : str, optional, default is "simple".
+            The docstore of each shard, see `Storage.create`.
+
+        Returns
+        -------
+        IndexManager
+            The index manager, with one index per shard.
+        """
+        storages = [
+            Storage.create(vector_store=vector_store, docstore=docstore)
+            for _ in range(num_shards)
+        ]
+        indexes = [
+            VectorStoreIndex([], storage_context=storage.store) for storage in storages
+        ]
+        return cls([index.index_id for index in indexes], indexes, storages)
+
+    @classmethod
+    def load_shards(cls, store_dir: str, mmap: bool = True) -> "IndexManager":
+        """Load the shards saved by `save_shards` (the `shard-000`, `shard-001`, ... subdirectories)."""
+        storages = []
+        while (Path(store_dir) / SHARD_DIR_FORMAT.format(len(storages))).exists():
+            shard_dir = Path(store_dir) / SHARD_DIR_FORMAT.format(len(storages))
+            storages.append(Storage.load(str(shard_dir), mmap=mmap))
+        indexes = [load_index_from_storage(storage.store) for storage in storages]
+        return cls([index.index_id for index in indexes], indexes, storages)
+
+    def save_shards(self, store_dir: str, incremental: bool = False):
+        """Save each shard to a subdirectory of `store_dir` (see `Storage.save`)."""
+        if self._storages is None:
+            raise ValueError("The indexes are not shards, see `IndexManager.create_shards`.")
+        for i, storage in enumerate(self._storages):
+            storage.save(
+                str(Path(store_dir) / SHARD_DIR_FORMAT.format(i)), incremental=incremental
+            )
+
+    def shard_of(self, doc_id: str) -> int:
+        """Get the shard of a document: a hash of its ID modulo the number of shards."""
+        return int(generate_content_hash(doc_id)[:16], 16) % len(self._ids)
+
+    def insert_documents(
+        self, docs: Sequence[Union[Document, TextNode]]
+    ) -> Dict[int, int]:
+        """Embed and insert documents, each into the shard given by its ID (see `shard_of`).
+
+        Parameters
+        ----------
+        docs : Sequence[Document/TextNode]
+            The documents to insert.
+
+        Returns
+        -------
+        Dict[int, int]
+            The number of documents inserted in each shard.
+        """
+        routed: Dict[int, List[Union[Document, TextNode]]] = {}
+        for doc in docs:
+            routed.setdefault(self.shard_of(doc.node_id), []).append(doc)
+        for shard, shard_docs in routed.items():
+            self.get_index(self._ids[shard]).insert_nodes(shard_docs)
+            self._bump_version(self._ids[shard])
+        return {shard: len(shard_docs) for shard, shard_docs in sorted(routed.items())}
+
+    def retrieve(
+        self,
+        query: str,
+        similarity_top_k: int = 10,
+        timeout: Optional[float] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[NodeWithScore]:
+        """Retrieve the top-k nodes over all the indexes (shards), queried in parallel.
+
+            The query is embedded once and each index is queried in a thread pool. The candidates of all the
+            indexes are merged into a global top-k by score. An index that does not answer within `timeout` is
+            skipped (with a warning), so one slow shard does not delay the query.
+
+        Parameters
+        ----------
+        query : str
+            The query.
+        similarity_top_k : int, optional, default is 10.
+            The number of nodes to return.
+        timeout : float, optional, default is None.
+            The time (seconds) given to each index to answer, no limit if None.
+        max_workers : int, optional, default is None.
+            The number of threads, one per index if None.
+
+        Returns
+        -------
+        List[NodeWithScore]
+            The nodes, sorted by decreasing score.
+        """
+        indexes = [index for index in self.indexes if isinstance(index, VectorStoreIndex)]
+        if not indexes:
+            return []
+        embed_model = indexes[0]._embed_model
+        query_bundle = QueryBundle(
+            query_str=query,
+            embedding=embed_model.get_agg_embedding_from_queries([query]),
+        )
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or len(indexes))
+        try:
+            futures = {
+                executor.submit(
+                    index.as_retriever(similarity_top_k=similarity_top_k).retrieve,
+                    query_bundle,
+                ): index.index_id
+                for index in indexes
+            }
+            # the indexes are queried in parallel, so the timeout of each index is the timeout of the fan-out.
+            done, not_done = wait(futures, timeout=timeout)
+            for future in not_done:
+                logger.warning(f"Index {futures[future]} did not answer within {timeout} s, skipped.")
+            candidates = {}
+            for future in done:
+                for node in future.result():
+                    best = candidates.get(node.node.node_id)
+                    if best is None or (node.score or 0) > (best.score or 0):
+                        candidates[node.node.node_id] = node
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return heapq.nlargest(
+            similarity_top_k, candidates.values(), key=lambda node: node.score or 0
         )
+
+    def retrieve_batch(
+        self,
+        queries: Sequence[str],
+        similarity_top_k: int = 10,
+        max_workers: Optional[int] = None,
+        max_concurrency: int = 16,
+    ) -> List[List[NodeWithScore]]:
+        """Retrieve the top-k nodes of many queries over all the indexes (shards).
+
+            The queries are embedded concurrently as queries (`aget_query_embedding`, the embedding models that
+            embed queries and documents differently get the query embeddings), with up to `max_concurrency`
+            requests in flight so a large batch does not flood the embedding API, and each vector store scores all
+            the queries with one matrix-matrix product (see `batch_query`). The vector stores are queried in a
+            thread pool and the candidates of every query are merged into a global top-k by score, as in
+            `retrieve`. Indexes sharing a vector store query it once, and each hit is returned with the index whose
+            struct holds the node (hits of nodes of no index are skipped).
+
+        Parameters
+        ----------
+        queries : Sequence[str]
+            The queries.
+        similarity_top_k : int, optional, default is 10.
+            The number of nodes to return per query.
+        max_workers : int, optional, default is None.
+            The number of threads, one per index if None.
+        max_concurrency : int, optional, default is 16.
+            The maximum number of query embeddings in flight.
+
+        Returns
+        -------
+        List[List[NodeWithScore]]
+            The nodes of every query, sorted by decreasing score.
+        """
+        indexes = [index for index in self.indexes if isinstance(index, VectorStoreIndex)]
+        if not indexes or not queries:
+            return [[] for _ in queries]
+        embed_model = indexes[0]._embed_model
+
+        async def embed_queries():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def embed(query: str) -> List[float]:
+                async with semaphore:
+                    return await embed_model.aget_query_embedding(query)
+
+            return await asyncio.gather(*(embed(query) for query in queries))
+
+        query_embeddings = np.asarray(asyncio_run(embed_queries()), dtype=np.float32)
+
+        stores: Dict[int, tuple] = {}
+        for index in indexes:
+            stores.setdefault(id(index.vector_store), (index.vector_store, []))[1].append(index)
+
+        def query_store(item: tuple) -> List[List[tuple]]:
+            vector_store, store_indexes = item
+            results = batch_query(vector_store, query_embeddings, similarity_top_k)
+            candidates = []
+            for result in results:
+                hits = []
+                for node_id, score in zip(result.ids, result.similarities):
+                    owner = next(
+                        (index for index in store_indexes if node_id in index.index_struct.nodes_dict),
+                        None,
+                    )
+                    if owner is not None:
+                        hits.append((score, node_id, owner))
+                candidates.append(hits)
+            return candidates
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(stores)) as executor:
+            per_store = list(executor.map(query_store, stores.values()))
+
+        retrieved = []
+        for candidates in zip(*per_store):
+            best = {}
+            for score, node_id, index in (c for index_candidates in candidates for c in index_candidates):
+                if node_id not in best or score > best[node_id][0]:
+                    best[node_id] = (score, node_id, index)
+            top = heapq.nlargest(similarity_top_k, best.values(), key=lambda c: c[0])
+            # the nodes are read from the docstores only for the merged top-k.
+            retrieved.append(
+                [
+                    NodeWithScore(
+                        node=index.docstore.get_node(index.index_struct.nodes_dict[node_id]),
+                        score=score,
+                    )
+                    for score, node_id, index in top
+                ]
+            )
+        return retrieved
+
+    def query_batch(
+        self,
+        queries: Sequence[str],
+        similarity_top_k: int = 4,
+        max_concurrency: int = 4,
+        **kwargs,
+    ) -> List[RESPONSE_TYPE]:
+        """Answer many queries, retrieved with `retrieve_batch` and synthesized concurrently.
+
+        Parameters
+        ----------
+        queries : Sequence[str]
+            The queries.
+        similarity_top_k : int, optional, default is 4.
+            The number of nodes given to the LLM per query.
+        max_concurrency : int, optional, default is 4.
+            The maximum number of syntheses (LLM calls) in flight.
+        **kwargs :
+            The arguments of `get_response_synthesizer` (e.g. `llm`, `response_mode`).
+
+        Returns
+        -------
+        List[RESPONSE_TYPE]
+            The response of every query.
+        """
+        retrieved = self.retrieve_batch(queries, similarity_top_k=similarity_top_k)
+        synthesizer = get_response_synthesizer(**kwargs)
+
+        async def synthesize_all():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def synthesize(query: str, nodes: List[NodeWithScore]):
+                async with semaphore:
+                    return await synthesizer.asynthesize(query, nodes)
+
+            return await asyncio.gather(
+                *[synthesize(query, nodes) for query, nodes in zip(queries, retrieved)]
+            )
+
+        return asyncio_run(synthesize_all())
+
+    @classmethod
+    def create_from_documents(
+        cls,
+        storage: Storage,
+        batches: Iterable[List[Union[Document, TextNode]]],
+    ) -> "IndexManager":
+        """Creates a new index from a stream of document batches.
+
+        The batches are embedded and inserted one at a time, so only one batch is held in memory. The documents
+        are added to the storage's docstore by the index.
+
+        Parameters
+        ----------
+        storage : Storage
+            The storage object to create the index in.
+        batches : Iterable[List[Document/TextNode]]
+            The batches of documents, e.g. `Storage.iter_documents(path, batch_size=500)`.
+
+        Returns
+        -------
+        IndexManager
+            The new index manager object
+        """
+        index = VectorStoreIndex([], storage_context=storage.store)
+        for batch in batches:
+            index.insert_nodes(batch)
         return cls([index.index_id], [index])
+
+
+def _insert_in_batches(
+    index: VectorStoreIndex,
+    storage: Storage,
+    doc_ids: List[str],
+    batch_size: int,
+    store_dir: Optional[str] = None,
+    progress_callback: Optional[Callable[[BuildProgress], None]] = None,
+    num_done: int = 0,
+    num_total: int = 0,
+    checkpoint: bool = False,
+):
+    """Read documents from the docstore, embed and insert them into the index one batch at a time.
+
+    If `store_dir` is given, the storage (and the build checkpoint if `checkpoint` is True) is saved after each batch.
+    """
+    tokenizer = get_tokenizer()
+    num_tokens = 0
+    start = time.perf_counter()
+    for i in range(0, len(doc_ids), batch_size):
+        batch = storage.docstore.get_nodes(doc_ids[i : i + batch_size])
+        index.insert_nodes(batch)
+        num_done += len(batch)
+        num_tokens += sum(
+            len(tokenizer(node.get_content(metadata_mode=MetadataMode.EMBED)))
+            for node in batch
+        )
+        if store_dir is not None:
+            # the checkpoint names the index before it is saved, so an index saved in `store_dir` is always resumed.
+            if checkpoint:
+                _write_checkpoint(store_dir, index.index_id, num_done, num_total)
+            storage.save(store_dir, incremental=True)
+        if progress_callback is not None:
+            progress_callback(
+                BuildProgress(
+                    num_done=num_done,
+                    num_total=num_total,
+                    num_tokens=num_tokens,
+                    elapsed=time.perf_counter() - start,
+                    num_inserted=i + len(batch),
+                )
+            )
+
+
+def _read_checkpoint(store_dir: Optional[str]) -> Optional[dict]:
+    if store_dir is None or not (Path(store_dir) / CHECKPOINT_FILE).exists():
+        return None
+    with open(Path(store_dir) / CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_checkpoint(store_dir: str, index_id: str, num_done: int, num_total: int):
+    """Write the checkpoint to a temporary file and move it in place, so it is never partially written."""
+    path = Path(store_dir) / CHECKPOINT_FILE
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"index_id": index_id, "num_done": num_done, "num_total": num_total}, f)
+    os.replace(tmp_path, path)
+
+
+def _remove_checkpoint(store_dir: str):
+    path = Path(store_dir) / CHECKPOINT_FILE
+    if path.exists():
+        path.unlink()
@@ -0,0 +1,208 @@
+"""An ingestion pipeline built from the `EXTRACTORS` registry.
+
+The pipeline applies the named transformations of `vfn_rag.retrieval.storage.EXTRACTORS` in order:
+
+- node parsers (e.g. `text_splitter`) split the documents, in a process pool if `num_workers > 1`.
+- metadata extractors (e.g. `title`, `keyword`, `summary`, `question_answer`) call the LLM with a bounded number of
+  concurrent requests. Their output is cached per node, keyed on the configuration of the extractor (its LLM,
+  prompts and arguments) and the node's content with the metadata the prompts read (the extractor's
+  `metadata_mode`), so running the pipeline again only pays for the new chunks, an edited document only pays for
+  its changed chunks, and changing the LLM or a prompt does not reuse stale metadata.
+
+Document-scoped extractors (`DOCUMENT_EXTRACTORS`, e.g. `title`, which derives one title from the first nodes of a
+document) get all the nodes of a document in one call. Their cache keys also hold the node's ref_doc_id, and a
+document is extracted again as a whole if any of its nodes is not cached.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.extractors import BaseExtractor, TitleExtractor
+from llama_index.core.ingestion.pipeline import remove_unstable_values
+from llama_index.core.node_parser import NodeParser
+from llama_index.core.schema import BaseNode
+from vfn_rag.retrieval import storage as storage_module
+from vfn_rag.retrieval.sqlite_store import SQLiteKVStore
+from vfn_rag.utils.helper_functions import generate_content_hash
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_EXTRACT_BATCH_SIZE = 8
+# the extractors whose output depends on all the nodes of a document.
+DOCUMENT_EXTRACTORS = (TitleExtractor,)
+
+__all__ = ["ExtractionPipeline"]
+
+
+class ExtractionPipeline:
+    """Split documents and extract metadata with the transformations of the `EXTRACTORS` registry."""
+
+    def __init__(
+        self,
+        extractors: Sequence[str],
+        extractor_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+        cache_path: Optional[str] = None,
+        num_workers: Optional[int] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        batch_size: int = DEFAULT_EXTRACT_BATCH_SIZE,
+    ):
+        """Initialize the pipeline.
+
+        Parameters
+        ----------
+        extractors: Sequence[str]
+            The names of the transformations (keys of `EXTRACTORS`), applied in order,
+            e.g. ["text_splitter", "title", "keyword"].
+        extractor_kwargs: Dict[str, Dict[str, Any]], optional, default is None.
+            The arguments of each transformation, by name, e.g. {"text_splitter": {"chunk_size": 512}}.
+        cache_path: str, optional, default is None.
+            The SQLite file caching the extractors' output. If not given, the output is not cached.
+        num_workers: int, optional, default is None.
+            The number of processes used to split the documents, they are split in this process if None or 1.
+        max_concurrency: int, optional, default is 4.
+            The maximum number of concurrent extractor (LLM) calls.
+        batch_size: int, optional, default is 8.
+            The number of nodes sent to an extractor per call.
+        """
+        unknown = [name for name in extractors if name not in storage_module.EXTRACTORS]
+        if unknown:
+            raise ValueError(
+                f"Unknown extractors: {unknown}, available: {list(storage_module.EXTRACTORS)}"
+            )
+        extractor_kwargs = extractor_kwargs or {}
+        self._kwargs = [extractor_kwargs.get(name, {}) for name in extractors]
+        self._transformations = [
+            (name, storage_module.EXTRACTORS[name](**kwargs))
+            for name, kwargs in zip(extractors, self._kwargs)
+        ]
+        # the part of the cache keys identifying the configuration of every extractor.
+        self._configs = {
+            name: _extractor_config(transformation)
+            for name, transformation in self._transformations
+            if isinstance(transformation, BaseExtractor)
+        }
+        self._cache = SQLiteKVStore(cache_path) if cache_path is not None else None
+        self._num_workers = num_workers
+        self._max_concurrency = max_concurrency
+        self._batch_size = batch_size
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def run(self, nodes: Sequence[BaseNode]) -> List[BaseNode]:
+        """Apply the transformations to documents/nodes.
+
+        Parameters
+        ----------
+        nodes: Sequence[BaseNode]
+            The documents/nodes to transform.
+
+        Returns
+        -------
+        List[BaseNode]
+            The transformed nodes, with the extracted metadata.
+        """
+        nodes = list(nodes)
+        for (name, transformation), kwargs in zip(self._transformations, self._kwargs):
+            if isinstance(transformation, BaseExtractor):
+                asyncio_run(self._extract(name, transformation, nodes))
+            else:
+                nodes = self._split(transformation, kwargs, nodes)
+        return nodes
+
+    async def arun(self, nodes: Sequence[BaseNode]) -> List[BaseNode]:
+        """Apply the transformations to documents/nodes (async version of `run`)."""
+        nodes = list(nodes)
+        for (name, transformation), kwargs in zip(self._transformations, self._kwargs):
+            if isinstance(transformation, BaseExtractor):
+                await self._extract(name, transformation, nodes)
+            else:
+                nodes = self._split(transformation, kwargs, nodes)
+        return nodes
+
+    def _split(
+        self, parser: NodeParser, kwargs: Dict[str, Any], nodes: List[BaseNode]
+    ) -> List[BaseNode]:
+        """Split the nodes, in a process pool if more than one worker is configured."""
+        if not self._num_workers or self._num_workers <= 1 or len(nodes) <= 1:
+            return list(parser(nodes))
+
+        chunk_size = max(1, len(nodes) // (self._num_workers * 4))
+        chunks = [nodes[i : i + chunk_size] for i in range(0, len(nodes), chunk_size)]
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self._num_workers, mp_context=context) as executor:
+            # the parsers do not pickle completely (e.g. their split functions), they are rebuilt in the workers.
+            results = executor.map(
+                _run_parser,
+                [type(parser)] * len(chunks),
+                [kwargs] * len(chunks),
+                chunks,
+            )
+            return [node for result in results for node in result]
+
+    async def _extract(self, name: str, extractor: BaseExtractor, nodes: List[BaseNode]):
+        """Extract metadata for the nodes that are not cached, and add it to the nodes."""
+        collection = f"extractor/{name}"
+        config = self._configs[name]
+        if isinstance(extractor, DOCUMENT_EXTRACTORS):
+            keys = [
+                generate_content_hash(f"{config}\n{node.ref_doc_id}\n{node.get_content()}")
+                for node in nodes
+            ]
+        else:
+            # the output of a chunk-level extractor only depends on what its prompts read, not on the document.
+            keys = [
+                generate_content_hash(
+                    f"{config}\n{node.get_content(metadata_mode=extractor.metadata_mode)}"
+                )
+                for node in nodes
+            ]
+        missing = []
+        for node, key in zip(nodes, keys):
+            metadata = self._cache.get(key, collection) if self._cache else None
+            if metadata is None:
+                missing.append((node, key))
+            else:
+                node.metadata.update(metadata)
+        if isinstance(extractor, DOCUMENT_EXTRACTORS):
+            # one batch per document, a document with any node missing is extracted again with all its nodes.
+            missing_documents = {node.ref_doc_id for node, _ in missing}
+            documents: Dict[Optional[str], List[tuple]] = {}
+            for node, key in zip(nodes, keys):
+                if node.ref_doc_id in missing_documents:
+                    documents.setdefault(node.ref_doc_id, []).append((node, key))
+            batches = list(documents.values())
+        else:
+            batches = [
+                missing[i : i + self._batch_size]
+                for i in range(0, len(missing), self._batch_size)
+            ]
+        num_extracted = sum(len(batch) for batch in batches)
+        self.stats[name] = {"cached": len(nodes) - num_extracted, "extracted": num_extracted}
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def extract_batch(batch):
+            async with semaphore:
+                return await extractor.aextract([node for node, _ in batch])
+
+        results = await asyncio.gather(*[extract_batch(batch) for batch in batches])
+        extracted = []
+        for batch, metadata_list in zip(batches, results):
+            for (node, key), metadata in zip(batch, metadata_list):
+                node.metadata.update(metadata)
+                extracted.append((key, metadata))
+        if self._cache is not None and extracted:
+            self._cache.put_all(extracted, collection=collection)
+            self._cache.commit()
+
+
+def _extractor_config(extractor: BaseExtractor) -> str:
+    """Get the configuration of an extractor (LLM, prompts and arguments) as a string, without memory addresses."""
+    return remove_unstable_values(str(extractor.to_dict()))
+
+
+def _run_parser(
+    parser_class: type, kwargs: Dict[str, Any], nodes: List[BaseNode]
+) -> List[BaseNode]:
+    """Build and run a node parser (module-level so it can be sent to a worker process)."""
+    return list(parser_class(**kwargs)(nodes))
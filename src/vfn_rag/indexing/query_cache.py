@@ -0,0 +1,278 @@
+"""A two-tier query cache in front of the query engines of the `IndexManager` indexes.
+
+- the exact tier is keyed on the normalized query text (lower case, collapsed whitespace, no trailing punctuation)
+  and the version of the index.
+- the semantic tier embeds the query and returns the cached answer of the most similar cached query of the same
+  index version, if their cosine similarity is above `similarity_threshold`.
+
+The entries expire after `ttl` seconds and the least recently used entries are evicted beyond `max_entries`. The
+version of an index is bumped by `IndexManager.sync` (and `insert_documents`), which invalidates its cached answers.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import numpy as np
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.response.schema import RESPONSE_TYPE
+from llama_index.core.schema import QueryBundle
+from llama_index.core import Settings
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_ENTRIES = 1000
+
+__all__ = ["QueryCache", "CachedQueryEngine", "normalize_query"]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for the exact tier: lower case, collapsed whitespace and no trailing punctuation."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+@dataclass
+class _Entry:
+    response: Any
+    embedding: Optional[np.ndarray]
+    created: float
+    latency: float
+
+
+class QueryCache:
+    """A size and TTL bounded cache of query responses, with an exact and a semantic tier."""
+
+    def __init__(
+        self,
+        similarity_threshold: Optional[float] = DEFAULT_SIMILARITY_THRESHOLD,
+        ttl: Optional[float] = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        """Initialize the cache.
+
+        Parameters
+        ----------
+        similarity_threshold: float, optional, default is 0.95.
+            The minimum cosine similarity between two query embeddings for the semantic tier. None to only use
+            the exact tier.
+        ttl: float, optional, default is 3600.
+            The time (seconds) an entry is valid, None for no expiry.
+        max_entries: int, optional, default is 1000.
+            The maximum number of entries, the least recently used entries are evicted.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """The hits of each tier, the misses, the hit rate and the latency saved by the hits (seconds)."""
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def get_exact(self, query: str, version: Hashable) -> Optional[Any]:
+        """Get the cached response of the same (normalized) query and index version."""
+        with self._lock:
+            self._purge(version)
+            entry = self._entries.get((version, normalize_query(query)))
+            if entry is None:
+                return None
+            self._entries.move_to_end((version, normalize_query(query)))
+            self.exact_hits += 1
+            self.saved_seconds += entry.latency
+            return entry.response
+
+    def get_similar(self, embedding: np.ndarray, version: Hashable) -> Optional[Any]:
+        """Get the cached response of the most similar query of the same index version (semantic tier)."""
+        if self.similarity_threshold is None:
+            return None
+        with self._lock:
+            self._purge(version)
+            keys = [
+                key for key, entry in self._entries.items()
+                if key[0] == version and entry.embedding is not None
+            ]
+            if not keys:
+                return None
+            matrix = np.stack([self._entries[key].embedding for key in keys])
+            similarities = matrix @ _unit(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            entry = self._entries[keys[best]]
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            self.saved_seconds += entry.latency
+            return entry.response
+
+    def put(
+        self,
+        query: str,
+        version: Hashable,
+        response: Any,
+        embedding: Optional[np.ndarray] = None,
+        latency: float = 0.0,
+    ):
+        """Cache a response.
+
+        Parameters
+        ----------
+        query: str
+            The query.
+        version: Hashable
+            The version of the index that answered the query.
+        response: Any
+            The response.
+        embedding: np.ndarray, optional, default is None.
+            The embedding of the query, for the semantic tier.
+        latency: float, optional, default is 0.
+            The time (seconds) it took to compute the response, counted as saved for every hit.
+        """
+        with self._lock:
+            key = (version, normalize_query(query))
+            self._entries[key] = _Entry(
+                response=response,
+                embedding=None if embedding is None else _unit(embedding),
+                created=time.monotonic(),
+                latency=latency,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def invalidate(self, version: Optional[Hashable] = None):
+        """Remove the entries of an index version, or all the entries if None."""
+        with self._lock:
+            if version is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == version]:
+                del self._entries[key]
+
+    def _purge(self, version: Hashable):
+        """Remove the expired entries, and the entries of the older versions of the same index."""
+        now = time.monotonic()
+        index_id = version[0] if isinstance(version, tuple) else None
+        for key in list(self._entries):
+            entry = self._entries[key]
+            expired = self.ttl is not None and now - entry.created > self.ttl
+            outdated = (
+                index_id is not None
+                and isinstance(key[0], tuple)
+                and key[0][0] == index_id
+                and key[0] != version
+            )
+            if expired or outdated:
+                del self._entries[key]
+
+
+class CachedQueryEngine(BaseQueryEngine):
+    """A query engine that answers from a `QueryCache` before calling the wrapped query engine."""
+
+    def __init__(
+        self,
+        query_engine: BaseQueryEngine,
+        cache: QueryCache,
+        version: Callable[[], Hashable],
+        embed_model: Optional[BaseEmbedding] = None,
+    ):
+        """Wrap a query engine.
+
+        Parameters
+        ----------
+        query_engine: BaseQueryEngine
+            The query engine, e.g. `index.as_query_engine()`.
+        cache: QueryCache
+            The cache, can be shared by several query engines.
+        version: Callable[[], Hashable]
+            Returns the current version of the index, e.g. `(index_id, IndexManager.version(index_id))`.
+        embed_model: BaseEmbedding, optional, default is None.
+            The model embedding the queries for the semantic tier, `Settings.embed_model` if not given. The
+            embedding is passed on to the query engine, so the query is embedded only once.
+        """
+        super().__init__(callback_manager=query_engine.callback_manager)
+        self._query_engine = query_engine
+        self._cache = cache
+        self._version = version
+        self._embed_model = embed_model
+
+    @property
+    def cache(self) -> QueryCache:
+        return self._cache
+
+    def _get_prompt_modules(self) -> Dict[str, Any]:
+        return {"query_engine": self._query_engine}
+
+    def _lookup(self, query_bundle: QueryBundle) -> Tuple[Hashable, Optional[Any]]:
+        version = self._version()
+        response = self._cache.get_exact(query_bundle.query_str, version)
+        if response is None and self._cache.similarity_threshold is not None:
+            if query_bundle.embedding is None:
+                embed_model = self._embed_model or Settings.embed_model
+                query_bundle.embedding = embed_model.get_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+            response = self._cache.get_similar(np.asarray(query_bundle.embedding), version)
+        if response is None:
+            self._cache.record_miss()
+        return version, response
+
+    def _store(self, query_bundle: QueryBundle, version: Hashable, response: Any, start: float):
+        embedding = None if query_bundle.embedding is None else np.asarray(query_bundle.embedding)
+        self._cache.put(
+            query_bundle.query_str,
+            version,
+            response,
+            embedding=embedding,
+            latency=time.perf_counter() - start,
+        )
+
+    def _query(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        version, response = self._lookup(query_bundle)
+        if response is not None:
+            return response
+        start = time.perf_counter()
+        response = self._query_engine.query(query_bundle)
+        self._store(query_bundle, version, response, start)
+        return response
+
+    async def _aquery(self, query_bundle: QueryBundle) -> RESPONSE_TYPE:
+        version, response = self._lookup(query_bundle)
+        if response is not None:
+            return response
+        start = time.perf_counter()
+        response = await self._query_engine.aquery(query_bundle)
+        self._store(query_bundle, version, response, start)
+        return response
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
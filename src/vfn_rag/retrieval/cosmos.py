@@ -10,13 +10,46 @@ create_storage_context method returns a `StorageContext` configured with an
 `AzureCosmosDBNoSqlVectorSearch` vector store.
 """
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple
+import atexit
+import copy
+import hashlib
+import json
+import logging
 import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from itertools import chain, islice
+from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
 from vfn_rag.retrieval.base_storage import BaseStorage
-from azure.cosmos import CosmosClient, PartitionKey
+from vfn_rag.utils.helper_functions import generate_content_hash
+from azure.core.pipeline.transport import RequestsTransport
+from azure.cosmos import ContainerProxy, CosmosClient, PartitionKey
+from azure.cosmos.exceptions import CosmosHttpResponseError
 from llama_index.vector_stores.azurecosmosnosql import AzureCosmosDBNoSqlVectorSearch
-from llama_index.core import StorageContext
-
+from llama_index.core import Settings, StorageContext
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
 
 CONTAINER_PROPERTIES = {"partition_key": PartitionKey(path="/id")}
 VectorEmbeddingPolicy = {
@@ -38,19 +71,791 @@ INDEXING_POLICY = {
 }
 
 
-__all__ = ["Cosmos"]
+# the item property holding the partition value, when the items are not partitioned by id.
+PARTITION_KEY_PROPERTY = "partitionKey"
+
+DEFAULT_BULK_BATCH_SIZE = 100
+DEFAULT_BULK_CONCURRENCY = 16
+DEFAULT_BULK_MAX_RETRIES = 10
+BULK_CHECKPOINT_FILE = "cosmos_bulk_checkpoint.json"
+# throttled (429), timed out (408), retry-with (449) and unavailable (503) requests are retried.
+RETRIABLE_STATUS_CODES = {408, 429, 449, 503}
+# the maximum time (seconds) an item waits for throttled requests to be retried.
+MAX_THROTTLE_WAIT = 60.0
+# the number of pooled connections of a client (the requests default).
+DEFAULT_POOL_SIZE = 10
+DEFAULT_WARM_UP_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+# the operators of the metadata filters translated to a comparison.
+COMPARISON_OPERATORS = {
+    FilterOperator.EQ: "=",
+    FilterOperator.NE: "!=",
+    FilterOperator.GT: ">",
+    FilterOperator.GTE: ">=",
+    FilterOperator.LT: "<",
+    FilterOperator.LTE: "<=",
+}
+
+__all__ = [
+    "Cosmos",
+    "BulkProgress",
+    "ClientRegistry",
+    "CLIENTS",
+    "CosmosVectorStore",
+    "PartitionStrategy",
+    "filters_to_where",
+    "filter_indexing_policy",
+]
+
+
+@dataclass(frozen=True)
+class PartitionStrategy:
+    """How the items of a container are spread over logical partitions.
+
+        With the default partitioning by id, every item is its own logical partition and a vector search reads
+        every physical partition of the container: its charge and latency grow with the container. Partitioning by
+        a collection name or a metadata value (the source file, the tenant) keeps the items that are searched
+        together in one logical partition; a query scoped to it (`partition_key`) reads only that partition.
+        The partition value is written to the `partitionKey` property of the items at ingest.
+
+        A logical partition holds at most 20 GB, a partition value should not gather more items than that.
+
+    Attributes
+    ----------
+    metadata_key: str, optional
+        The metadata giving the partition value of a node (e.g. "file_name", "tenant").
+    value: str, optional
+        The partition value of all the nodes (a collection name), when several collections share a container.
+    """
+
+    metadata_key: Optional[str] = None
+    value: Optional[str] = None
+
+    @classmethod
+    def by_id(cls) -> "PartitionStrategy":
+        return cls()
+
+    @classmethod
+    def by_collection(cls, name: str) -> "PartitionStrategy":
+        return cls(value=name)
+
+    @classmethod
+    def by_metadata(cls, metadata_key: str) -> "PartitionStrategy":
+        return cls(metadata_key=metadata_key)
+
+    @classmethod
+    def by_source_file(cls, metadata_key: str = "file_name") -> "PartitionStrategy":
+        return cls(metadata_key=metadata_key)
+
+    @classmethod
+    def of_container(
+        cls,
+        properties: Dict[str, Any],
+        partition_strategy: Optional["PartitionStrategy"] = None,
+    ) -> "PartitionStrategy":
+        """Get the partition strategy of an existing container, checked against its partition key.
+
+        Parameters
+        ----------
+        properties: Dict[str, Any]
+            The properties of the container (`ContainerProxy.read`).
+        partition_strategy: PartitionStrategy, optional, default is None.
+            The strategy the container was created with, by id if None.
+
+        Returns
+        -------
+        PartitionStrategy
+
+        Raises
+        ------
+        ValueError
+            If the container is not partitioned by the item property of the strategy. The metadata key or value of
+            a container partitioned by `partitionKey` is not stored in the container, it must be given.
+        """
+        paths = properties.get("partitionKey", {}).get("paths", ["/id"])
+        partition_strategy = partition_strategy or cls.by_id()
+        if paths != [f"/{partition_strategy.item_property}"]:
+            raise ValueError(
+                f"The container {properties.get('id')} is partitioned by {', '.join(paths)}, not by "
+                f"/{partition_strategy.item_property}: load it with the partition strategy it was created with."
+            )
+        return partition_strategy
+
+    @property
+    def item_property(self) -> str:
+        """The item property holding the partition value."""
+        return (
+            "id"
+            if self.metadata_key is None and self.value is None
+            else PARTITION_KEY_PROPERTY
+        )
+
+    @property
+    def partition_key(self) -> PartitionKey:
+        """The partition key definition of the container."""
+        return PartitionKey(path=f"/{self.item_property}")
+
+    def partition_value(self, node: BaseNode) -> str:
+        """Get the partition value of a node.
+
+        Raises
+        ------
+        ValueError
+            If the node does not have the metadata of the strategy.
+        """
+        if self.value is not None:
+            return self.value
+        if self.metadata_key is None:
+            return node.node_id
+        if self.metadata_key not in node.metadata:
+            raise ValueError(
+                f"Node {node.node_id} has no {self.metadata_key!r} metadata to partition it by."
+            )
+        return str(node.metadata[self.metadata_key])
+
+
+@dataclass
+class BulkProgress:
+    """Progress of a `Cosmos.bulk_upsert` run.
+
+    Attributes
+    ----------
+    num_done: int
+        The number of nodes written, including the nodes written before a resumed run.
+    num_total: int, optional
+        The number of nodes to write, None if the input has no length.
+    num_upserted: int
+        The number of items upserted by this run.
+    num_throttled: int
+        The number of requests throttled (HTTP 429), by the service or retried by the SDK.
+    request_charge: float
+        The request units consumed by this run.
+    elapsed: float
+        The time (seconds) since the start of this run.
+    concurrency: int
+        The current number of concurrent requests, reduced on throttling.
+    """
+
+    num_done: int = 0
+    num_total: Optional[int] = None
+    num_upserted: int = 0
+    num_throttled: int = 0
+    request_charge: float = 0.0
+    elapsed: float = 0.0
+    concurrency: int = 0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.num_upserted / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def ru_per_second(self) -> float:
+        return self.request_charge / self.elapsed if self.elapsed else 0.0
+
+
+class AdaptiveConcurrency:
+    """Limit the number of requests in flight, halved when a request is throttled (additive increase,
+    multiplicative decrease)."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def throttled(self):
+        """Halve the limit, the requests in flight above it finish normally."""
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+    def release(self, throttled: bool = False):
+        if throttled:
+            self.throttled()
+        with self._condition:
+            self._in_flight -= 1
+            if not throttled:
+                # grow back by one request once a full window of requests succeeded.
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
 
+def node_to_item(vector_store: Any, node: BaseNode) -> Dict[str, Any]:
+    """Convert a node (with its embedding) to a Cosmos item, with the keys and the partition strategy of the vector
+    store."""
+    item = {
+        vector_store._id_key: node.node_id,
+        vector_store._embedding_key: node.get_embedding(),
+        vector_store._text_key: node.get_content(metadata_mode=MetadataMode.NONE) or "",
+        vector_store._metadata_key: node_to_metadata_dict(
+            node, remove_text=True, flat_metadata=vector_store.flat_metadata
+        ),
+    }
+    strategy = getattr(vector_store, "partition_strategy", None)
+    if strategy is not None and strategy.item_property != vector_store._id_key:
+        item[strategy.item_property] = strategy.partition_value(node)
+    return item
 
-def create_client(uri: str, key: str) -> CosmosClient:
-    """Create a CosmosClient instance."""
+
+def filters_to_where(
+    filters: MetadataFilters, metadata_key: str = "metadata"
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """Translate llama_index metadata filters to the condition of a Cosmos query.
+
+        The values are passed as query parameters (`@filter0`, `@filter1`, ...). The keys are always quoted
+        (`c.metadata["year"]`), so a key that is a keyword of the query language (`value`, `order`, `top`, ...)
+        is a valid path. The items store flat metadata (strings and numbers), the operators on lists (`any`,
+        `all`, `contains`) are not supported.
+
+    Parameters
+    ----------
+    filters: MetadataFilters
+        The filters, possibly nested, combined with "and", "or" or "not" (the negation of their conjunction).
+    metadata_key: str, optional, default is "metadata".
+        The item property of the metadata.
+
+    Returns
+    -------
+    Tuple[str, List[Dict[str, Any]]]
+        The condition (without the WHERE keyword, empty without filters or with empty groups only) and its
+        parameters.
+
+    Raises
+    ------
+    ValueError
+        If a filter operator is not supported, or the value of an `in`/`nin` filter is not a list.
+
+    Example:
+        >>> filters = MetadataFilters(filters=[MetadataFilter(key="year", value=2020, operator=">=")])
+        >>> filters_to_where(filters)
+        ('c.metadata["year"] >= @filter0', [{'name': '@filter0', 'value': 2020}])
+    """
+    parameters: List[Dict[str, Any]] = []
+
+    def parameter(value: Any) -> str:
+        name = f"@filter{len(parameters)}"
+        parameters.append({"name": name, "value": value})
+        return name
+
+    def condition(metadata_filter: MetadataFilter) -> str:
+        key, operator, value = (
+            metadata_filter.key,
+            metadata_filter.operator,
+            metadata_filter.value,
+        )
+        path = f"c.{metadata_key}[{json.dumps(key)}]"
+        if operator in (FilterOperator.IN, FilterOperator.NIN) and not isinstance(
+            value, list
+        ):
+            raise ValueError(
+                f"The value of the {operator.value!r} metadata filter on {key!r} must be a list, got {value!r}."
+            )
+        if operator in COMPARISON_OPERATORS:
+            return f"{path} {COMPARISON_OPERATORS[operator]} {parameter(value)}"
+        if operator == FilterOperator.IN:
+            return f"ARRAY_CONTAINS({parameter(list(value))}, {path})"
+        if operator == FilterOperator.NIN:
+            return f"NOT ARRAY_CONTAINS({parameter(list(value))}, {path})"
+        if operator == FilterOperator.TEXT_MATCH:
+            return f"CONTAINS({path}, {parameter(value)})"
+        if operator == FilterOperator.TEXT_MATCH_INSENSITIVE:
+            return f"CONTAINS({path}, {parameter(value)}, true)"
+        if operator == FilterOperator.IS_EMPTY:
+            return f"(NOT IS_DEFINED({path}) OR {path} = null OR {path} = '')"
+        raise ValueError(
+            f"The Cosmos vector store does not support the {operator.value!r} metadata filter."
+        )
+
+    def combine(filters: MetadataFilters) -> str:
+        conditions = []
+        for f in filters.filters:
+            if isinstance(f, MetadataFilters):
+                # an empty nested group does not restrict the items.
+                nested = combine(f)
+                if nested:
+                    conditions.append(f"({nested})")
+            else:
+                conditions.append(condition(f))
+        if not conditions:
+            return ""
+        if filters.condition == FilterCondition.NOT:
+            return f"NOT ({' AND '.join(conditions)})"
+        return f" {(filters.condition or FilterCondition.AND).value.upper()} ".join(
+            conditions
+        )
+
+    return combine(filters), parameters
+
+
+def query_where(
+    vector_store: Any, query: VectorStoreQuery
+) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """The condition restricting a vector search to the metadata filters, `doc_ids` and `node_ids` of a query, None
+    if it has none."""
+    conditions, parameters = [], []
+    if query.filters is not None:
+        condition, parameters = filters_to_where(
+            query.filters, vector_store._metadata_key
+        )
+        if condition:
+            conditions.append(f"({condition})")
+    if query.doc_ids:
+        conditions.append(
+            f"ARRAY_CONTAINS(@doc_ids, c.{vector_store._metadata_key}.ref_doc_id)"
+        )
+        parameters.append({"name": "@doc_ids", "value": list(query.doc_ids)})
+    if query.node_ids:
+        conditions.append(f"ARRAY_CONTAINS(@node_ids, c.{vector_store._id_key})")
+        parameters.append({"name": "@node_ids", "value": list(query.node_ids)})
+    return (" AND ".join(conditions) or None), parameters
+
+
+def filter_indexing_policy(
+    metadata_keys: Iterable[str],
+    indexing_policy: Optional[Dict[str, Any]] = None,
+    metadata_key: str = "metadata",
+    embedding_path: str = "/embedding",
+) -> Dict[str, Any]:
+    """The indexing policy recommended for vector searches filtered on metadata.
+
+        The range index covers only the filtered metadata (and the document ids and partition values used by the
+        deletes), instead of every property: a filter on these paths reads only the matching items, so a filtered
+        search costs request units in proportion to the filtered set, and writes do not index the embeddings and
+        the texts. A filter on a path out of the index reads every item of the partitions it queries.
+
+    Parameters
+    ----------
+    metadata_keys: Iterable[str]
+        The metadata used in filters, e.g. ["file_name", "year", "region"].
+    indexing_policy: Dict[str, Any], optional, default is None.
+        The policy to extend (its mode and vector indexes are kept), `INDEXING_POLICY` if None.
+    metadata_key: str, optional, default is "metadata".
+        The item property of the metadata.
+    embedding_path: str, optional, default is "/embedding".
+        The path of the embeddings, excluded from the range index.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The indexing policy, to pass to `Cosmos.create`.
+    """
+    policy = copy.deepcopy(indexing_policy or INDEXING_POLICY)
+    keys = [*metadata_keys, "ref_doc_id"]
+    # the keys are quoted as in the queries (`filters_to_where`).
+    included = [f"/{metadata_key}/{json.dumps(key)}/?" for key in keys]
+    included.append(f"/{PARTITION_KEY_PROPERTY}/?")
+    excluded = [
+        "/*",
+        *(p["path"] for p in policy.get("excludedPaths", [])),
+        f"{embedding_path}/*",
+    ]
+    policy["includedPaths"] = [{"path": path} for path in dict.fromkeys(included)]
+    policy["excludedPaths"] = [{"path": path} for path in dict.fromkeys(excluded)]
+    return policy
+
+
+def vector_search_sql(
+    vector_store: Any,
+    similarity_top_k: int,
+    pre_filter: Optional[Dict[str, Any]] = None,
+    where: Optional[str] = None,
+) -> str:
+    """The vector search of `AzureCosmosDBNoSqlVectorSearch.query`, with its `pre_filter` argument (a `where_clause`
+    and a `limit_offset_clause`) and a condition (`query_where`). The query embedding is the `@embeddings`
+    parameter; the condition is evaluated by Cosmos before the `VectorDistance` ordering.
+    """
+    pre_filter = pre_filter or {}
+    sql = "SELECT "
+    if pre_filter.get("limit_offset_clause") is None:
+        sql += f"TOP {similarity_top_k} "
+    sql += (
+        f"c.{vector_store._id_key}, c.{vector_store._text_key}, c.{vector_store._metadata_key}, "
+        f"VectorDistance(c.{vector_store._embedding_key}, @embeddings) AS SimilarityScore FROM c"
+    )
+    where_clause = pre_filter.get("where_clause")
+    if where is not None and where_clause is not None:
+        where_clause = re.sub(r"^\s*WHERE\s+", "", where_clause, flags=re.I)
+        sql += f" WHERE ({where_clause}) AND {where}"
+    elif where is not None:
+        sql += f" WHERE {where}"
+    elif where_clause is not None:
+        sql += f" {where_clause}"
+    sql += f" ORDER BY VectorDistance(c.{vector_store._embedding_key}, @embeddings)"
+    if pre_filter.get("limit_offset_clause") is not None:
+        sql += f" {pre_filter['limit_offset_clause']}"
+    return sql
+
+
+def items_to_result(
+    vector_store: Any, items: Iterable[Dict[str, Any]]
+) -> VectorStoreQueryResult:
+    """Convert the items of a `vector_search_sql` query to a query result."""
+    nodes, similarities, ids = [], [], []
+    for item in items:
+        node = metadata_dict_to_node(item[vector_store._metadata_key])
+        node.set_content(item[vector_store._text_key])
+        nodes.append(node)
+        similarities.append(item["SimilarityScore"])
+        ids.append(item[vector_store._id_key])
+    return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+
+def _resolve_credentials(uri: Optional[str], key: Any) -> Tuple[str, Any]:
     if uri is None:
         uri = os.environ.get("AZURE_COSMOSDB_URI")
     if key is None:
         key = os.environ.get("AZURE_COSMOSDB_KEY")
     if uri is None or key is None:
         raise ValueError("Either cosmos_client or both uri and key must be provided")
+    return uri, key
+
+
+def create_client(
+    uri: str, key: Any, pool_size: Optional[int] = None, **kwargs: Any
+) -> CosmosClient:
+    """Create a CosmosClient instance.
+
+    Parameters
+    ----------
+    uri: str
+        The account URI, the `AZURE_COSMOSDB_URI` environment variable if None.
+    key: str or TokenCredential
+        The account key (or an Entra ID credential), the `AZURE_COSMOSDB_KEY` environment variable if None.
+    pool_size: int, optional, default is None.
+        The maximum number of pooled connections kept open, the requests default (10) if None. Requests above it
+        open connections that are closed after use.
+    **kwargs:
+        Other arguments of the `CosmosClient` (e.g. `consistency_level`, `retry_total`).
+    """
+    uri, key = _resolve_credentials(uri, key)
+    if pool_size is not None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        kwargs["transport"] = RequestsTransport(session=session, session_owner=True)
+    return CosmosClient(uri, credential=key, **kwargs)
+
+
+class ClientRegistry:
+    """Process-wide `CosmosClient`s, one per account URI and credential.
+
+        A `CosmosClient` holds an HTTP connection pool, the account and container metadata and the partition key
+        ranges of the containers; creating one per request (or per tenant) pays the TLS handshakes and the metadata
+        requests again before the first query. The registry creates a client the first time an account is used and
+        returns it afterwards, to all the threads of the process (the client is thread safe).
+
+        `warm_up` fetches the metadata of the containers in advance (database, container properties and partition
+        key ranges, cached by the client), and keeps their container proxies: `Cosmos.load` opens a warmed container
+        without any request, so the first query after switching to a tenant costs one round-trip.
+
+        `close` closes the clients (and their connections); it runs at the interpreter exit for the global registry
+        `CLIENTS`. A client requested after `close` is created again.
+
+    Example:
+        CLIENTS.warm_up([("tenants", "tenant-a"), ("tenants", "tenant-b")], uri=uri, key=key)
+        cosmos = Cosmos.load("tenants", "tenant-a", uri=uri, key=key)
+    """
 
-    return CosmosClient(uri, credential=key)
+    def __init__(self, client_factory: Callable[..., CosmosClient] = create_client):
+        """Create an empty registry.
+
+        Parameters
+        ----------
+        client_factory: Callable[..., CosmosClient], optional, default is `create_client`.
+            Creates a client from `(uri, key, pool_size=..., **kwargs)`.
+        """
+        self.client_factory = client_factory
+        self._clients: Dict[Tuple[str, str], CosmosClient] = {}
+        # the warmed container proxies and their properties.
+        self._containers: Dict[
+            Tuple[Tuple[str, str], str, str], Tuple[ContainerProxy, Dict[str, Any]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    @staticmethod
+    def key(uri: str, key: Any) -> Tuple[str, str]:
+        """The registry key of an account and a credential: a digest of an account key (the key itself is not kept
+        in the registry), the identity of a credential object."""
+        if isinstance(key, str):
+            identity = "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+        else:
+            identity = f"{type(key).__qualname__}:{id(key)}"
+        return uri.rstrip("/"), identity
+
+    def get(
+        self,
+        uri: Optional[str] = None,
+        key: Any = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        **kwargs: Any,
+    ) -> CosmosClient:
+        """Get the client of an account, created on first use.
+
+        Parameters
+        ----------
+        uri: str, optional, default is None.
+            The account URI, the `AZURE_COSMOSDB_URI` environment variable if None.
+        key: str or TokenCredential, optional, default is None.
+            The account key (or an Entra ID credential), the `AZURE_COSMOSDB_KEY` environment variable if None.
+        pool_size: int, optional, default is 10.
+            The number of pooled connections of a new client, a client already created keeps its pool.
+        **kwargs:
+            Other arguments of a new client.
+
+        Returns
+        -------
+        CosmosClient
+        """
+        uri, key = _resolve_credentials(uri, key)
+        registry_key = self.key(uri, key)
+        with self._lock:
+            client = self._clients.get(registry_key)
+            if client is None:
+                client = self.client_factory(uri, key, pool_size=pool_size, **kwargs)
+                self._clients[registry_key] = client
+        return client
+
+    def warm_up(
+        self,
+        containers: Iterable[Tuple[str, str]],
+        uri: Optional[str] = None,
+        key: Any = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_workers: int = DEFAULT_WARM_UP_WORKERS,
+    ) -> Dict[Tuple[str, str], ContainerProxy]:
+        """Fetch the metadata of containers in advance, in parallel.
+
+        Parameters
+        ----------
+        containers: Iterable[Tuple[str, str]]
+            The (database name, container name) pairs.
+        uri: str, optional, default is None.
+            The account URI, the `AZURE_COSMOSDB_URI` environment variable if None.
+        key: str or TokenCredential, optional, default is None.
+            The account key, the `AZURE_COSMOSDB_KEY` environment variable if None.
+        pool_size: int, optional, default is 10.
+            The number of pooled connections of a new client.
+        max_workers: int, optional, default is 8.
+            The number of containers warmed up at once.
+
+        Returns
+        -------
+        Dict[Tuple[str, str], ContainerProxy]
+            The container proxies by (database name, container name).
+
+        Raises
+        ------
+        CosmosResourceNotFoundError
+            If a database or a container does not exist.
+        """
+        uri, key = _resolve_credentials(uri, key)
+        client = self.get(uri, key, pool_size=pool_size)
+        registry_key = self.key(uri, key)
+        containers = list(dict.fromkeys(containers))
+
+        def warm_up_database(database_name: str):
+            client.get_database_client(database_name).read()
+
+        def warm_up_container(
+            names: Tuple[str, str],
+        ) -> Tuple[ContainerProxy, Dict[str, Any]]:
+            container = client.get_database_client(names[0]).get_container_client(
+                names[1]
+            )
+            properties = container.read()
+            # the partition key ranges, the routing map of the cross-partition queries.
+            list(container.read_feed_ranges())
+            return container, properties
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(
+                executor.map(
+                    warm_up_database, {database_name for database_name, _ in containers}
+                )
+            )
+            warmed = dict(zip(containers, executor.map(warm_up_container, containers)))
+        with self._lock:
+            for (database_name, container_name), entry in warmed.items():
+                self._containers[(registry_key, database_name, container_name)] = entry
+        return {names: container for names, (container, _) in warmed.items()}
+
+    def warmed_container(
+        self,
+        database_name: str,
+        container_name: str,
+        uri: Optional[str] = None,
+        key: Any = None,
+    ) -> Optional[ContainerProxy]:
+        """Get the proxy of a warmed container, None if it was not warmed up."""
+        warmed = self._warmed(database_name, container_name, uri, key)
+        return None if warmed is None else warmed[0]
+
+    def _warmed(
+        self,
+        database_name: str,
+        container_name: str,
+        uri: Optional[str] = None,
+        key: Any = None,
+    ) -> Optional[Tuple[ContainerProxy, Dict[str, Any]]]:
+        """Get the proxy and the properties of a warmed container, None if it was not warmed up."""
+        uri, key = _resolve_credentials(uri, key)
+        return self._containers.get((self.key(uri, key), database_name, container_name))
+
+    def close(self, uri: Optional[str] = None, key: Any = None):
+        """Close the client of an account (e.g. after a key rotation), or all the clients.
+
+        Parameters
+        ----------
+        uri: str, optional, default is None.
+            The account URI, all the clients if None.
+        key: str or TokenCredential, optional, default is None.
+            The account key.
+        """
+        with self._lock:
+            if uri is None:
+                clients, self._clients = self._clients, {}
+                self._containers = {}
+            else:
+                registry_key = self.key(*_resolve_credentials(uri, key))
+                clients = (
+                    {registry_key: self._clients.pop(registry_key)}
+                    if registry_key in self._clients
+                    else {}
+                )
+                self._containers = {
+                    names: container
+                    for names, container in self._containers.items()
+                    if names[0] != registry_key
+                }
+        for registry_key, client in clients.items():
+            try:
+                client.close()
+            except Exception as error:
+                # a shutdown must close the other clients.
+                logger.warning(
+                    f"Failed to close the Cosmos client of {registry_key[0]}: {error}"
+                )
+
+
+CLIENTS = ClientRegistry()
+atexit.register(CLIENTS.close)
+
+
+class CosmosVectorStore(AzureCosmosDBNoSqlVectorSearch):
+    """`AzureCosmosDBNoSqlVectorSearch` with a partition strategy, that can also open a container proxy fetched in
+    advance (by `ClientRegistry.warm_up`), without the database and container requests of its constructor.
+
+        The nodes are written with their partition value, and `query` takes a `partition_key` argument to search a
+        single logical partition, e.g. `index.as_retriever(vector_store_kwargs={"partition_key": "tenant-a"})`.
+    """
+
+    _partition_strategy: PartitionStrategy = PrivateAttr(
+        default_factory=PartitionStrategy
+    )
+
+    def __init__(
+        self,
+        *args: Any,
+        container: Optional[ContainerProxy] = None,
+        partition_strategy: Optional[PartitionStrategy] = None,
+        **kwargs: Any,
+    ) -> None:
+        if container is None:
+            super().__init__(*args, **kwargs)
+            self._partition_strategy = partition_strategy or PartitionStrategy()
+            return
+
+        # the attributes set by `AzureCosmosDBNoSqlVectorSearch.__init__`, pinned by the tests.
+        BasePydanticVectorStore.__init__(self)
+        self._cosmos_client = kwargs["cosmos_client"]
+        self._database_name = kwargs.get("database_name", "vectorSearchDB")
+        self._container_name = kwargs.get("container_name", "vectorSearchContainer")
+        self._vector_embedding_policy = kwargs["vector_embedding_policy"]
+        self._indexing_policy = kwargs["indexing_policy"]
+        self._cosmos_container_properties = kwargs["cosmos_container_properties"]
+        self._cosmos_database_properties = (
+            kwargs.get("cosmos_database_properties") or {}
+        )
+        self._id_key = kwargs.get("id_key", "id")
+        self._text_key = kwargs.get("text_key", "text")
+        self._metadata_key = kwargs.get("metadata_key", "metadata")
+        self._embedding_key = self._vector_embedding_policy["vectorEmbeddings"][0][
+            "path"
+        ][1:]
+        self._database = self._cosmos_client.get_database_client(self._database_name)
+        self._container = container
+        self._partition_strategy = partition_strategy or PartitionStrategy()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CosmosVectorStore"
+
+    @property
+    def partition_strategy(self) -> PartitionStrategy:
+        return self._partition_strategy
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        for node in nodes:
+            self._container.upsert_item(node_to_item(self, node))
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete the nodes of a document, from their partitions."""
+        items = self._container.query_items(
+            query=(
+                f"SELECT c.id, c.{self.partition_strategy.item_property} AS partitionKey FROM c "
+                f"WHERE c.{self._metadata_key}.ref_doc_id = @ref_doc_id"
+            ),
+            parameters=[{"name": "@ref_doc_id", "value": ref_doc_id}],
+            enable_cross_partition_query=True,
+        )
+        for item in items:
+            self._container.delete_item(item["id"], partition_key=item["partitionKey"])
+
+    def query(
+        self,
+        query: VectorStoreQuery,
+        partition_key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> VectorStoreQueryResult:
+        """Get the `similarity_top_k` nearest nodes, in one logical partition if a `partition_key` is given, in the
+        whole container otherwise (see `AzureCosmosDBNoSqlVectorSearch.query` for the `pre_filter` argument).
+
+            The metadata filters, `doc_ids` and `node_ids` of the query are evaluated by Cosmos (`filters_to_where`):
+            the nearest nodes are searched among the matching items.
+        """
+        scope = (
+            {"enable_cross_partition_query": True}
+            if partition_key is None
+            else {"partition_key": partition_key}
+        )
+        where, parameters = query_where(self, query)
+        items = self._container.query_items(
+            query=vector_search_sql(
+                self, query.similarity_top_k, kwargs.get("pre_filter"), where
+            ),
+            parameters=[
+                {"name": "@embeddings", "value": query.query_embedding},
+                *parameters,
+            ],
+            **scope,
+        )
+        return items_to_result(self, items)
 
 
 class Cosmos(BaseStorage):
@@ -89,14 +894,28 @@ class Cosmos(BaseStorage):
         key: Optional[str] = None,
         **kwargs: Any,
     ) -> "Cosmos":
-        """Create and return a StorageContext configured with the Cosmos vector store."""
+        """Create and return a StorageContext configured with the Cosmos vector store.
+
+        A `partition_strategy` (`PartitionStrategy`, by id if None) sets the partition key of the container and the
+        partition value written with every node; `load` the container with the same strategy (checked against the
+        partition key of the container).
+
+        Raises
+        ------
+        ValueError
+            If the container already exists and is partitioned differently from the `partition_strategy`.
+        """
 
         if client is None:
-            client = create_client(uri, key)
+            client = CLIENTS.get(uri, key)
 
         storage = cls._base_read_write(
             database_name, container_name, client, create_container=True, **kwargs
         )
+        # the container may already exist with another partition key, the nodes would be written to it anyway.
+        PartitionStrategy.of_container(
+            storage.vector_store._container.read(), kwargs.get("partition_strategy")
+        )
 
         return cls(storage, client)
 
@@ -110,11 +929,41 @@ class Cosmos(BaseStorage):
         key: Optional[str] = None,
         **kwargs: Any,
     ):
+        """Open an existing container (fetched in advance if it was warmed up, see `ClientRegistry.warm_up`).
+
+        The partition key of the container is read from its properties and checked against the
+        `partition_strategy` (by id if not given).
+
+        Raises
+        ------
+        CosmosResourceNotFoundError
+            If the database or the container does not exist.
+        ValueError
+            If the container is partitioned differently from the `partition_strategy`.
+        """
+        warmed = None
         if client is None:
-            client = create_client(uri, key)
+            client = CLIENTS.get(uri, key)
+            warmed = CLIENTS._warmed(database_name, container_name, uri, key)
+        if warmed is None:
+            container = client.get_database_client(database_name).get_container_client(
+                container_name
+            )
+            properties = container.read()
+        else:
+            container, properties = warmed
+        partition_strategy = PartitionStrategy.of_container(
+            properties, kwargs.pop("partition_strategy", None)
+        )
 
         storage = cls._base_read_write(
-            database_name, container_name, client, create_container=False, **kwargs
+            database_name,
+            container_name,
+            client,
+            create_container=False,
+            container=container,
+            partition_strategy=partition_strategy,
+            **kwargs,
         )
 
         return cls(storage, client)
@@ -129,19 +978,234 @@ class Cosmos(BaseStorage):
         vector_embedding_policy: Optional[Dict[str, Any]] = None,
         cosmos_container_properties: Optional[Dict[str, Any]] = None,
         cosmos_database_properties: Optional[Dict[str, Any]] = None,
+        container: Optional[ContainerProxy] = None,
+        partition_strategy: Optional[PartitionStrategy] = None,
     ) -> StorageContext:
 
+        cosmos_container_properties = (
+            cosmos_container_properties or CONTAINER_PROPERTIES
+        )
+        if partition_strategy is not None:
+            cosmos_container_properties = {
+                **cosmos_container_properties,
+                "partition_key": partition_strategy.partition_key,
+            }
         init_kwargs: Dict[str, Any] = {
             "cosmos_client": client,
             "database_name": database_name,
             "container_name": container_name,
             "vector_embedding_policy": vector_embedding_policy or VectorEmbeddingPolicy,
             "indexing_policy": indexing_policy or INDEXING_POLICY,
-            "cosmos_container_properties": cosmos_container_properties or CONTAINER_PROPERTIES,
+            "cosmos_container_properties": cosmos_container_properties,
             "cosmos_database_properties": cosmos_database_properties or {},
             "create_container": create_container,
         }
 
-        store = AzureCosmosDBNoSqlVectorSearch(**init_kwargs)
+        store = CosmosVectorStore(
+            container=container, partition_strategy=partition_strategy, **init_kwargs
+        )
         storage = StorageContext.from_defaults(vector_store=store)
         return storage
+
+    @property
+    def container(self):
+        """The Cosmos container of the vector store."""
+        return self.vector_store._container
+
+    def to_item(self, node: BaseNode) -> Dict[str, Any]:
+        """Convert a node (with its embedding) to the item written by `AzureCosmosDBNoSqlVectorSearch.add`."""
+        return node_to_item(self.vector_store, node)
+
+    def bulk_upsert(
+        self,
+        nodes: Iterable[BaseNode],
+        batch_size: int = DEFAULT_BULK_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        embed_model: Optional[BaseEmbedding] = None,
+        checkpoint_dir: Optional[str] = None,
+        progress_callback: Optional[Callable[[BulkProgress], None]] = None,
+        max_retries: int = DEFAULT_BULK_MAX_RETRIES,
+    ) -> BulkProgress:
+        """Write nodes to the container with concurrent upserts, in resumable batches.
+
+            `VectorStoreIndex.from_documents(..., storage_context=cosmos.store)` writes the items one after the
+            other. Here the nodes are embedded a batch at a time (only the nodes without an embedding), and the
+            items of a batch are upserted by up to `max_concurrency` threads. A throttled request (HTTP 429) is
+            retried after the delay asked by the service and halves the concurrency, which then grows back by
+            one request per window of successful requests. The requests throttled and retried by the SDK itself
+            (`x-ms-throttle-retry-count` header) reduce the concurrency as well.
+
+            With a `checkpoint_dir`, the number of nodes written is saved after every batch. After a failure, the
+            same call (with the same input, in the same order) skips the nodes that were written and continues
+            with the first unfinished batch; upserts are idempotent, so re-writing part of a batch is harmless.
+            The checkpoint records a fingerprint of the input (the IDs of the first batch): a checkpoint of
+            another input is ignored and all the nodes are written. The checkpoint is removed when all the nodes
+            are written. The index can then be opened with
+            `VectorStoreIndex.from_vector_store(cosmos.vector_store)`.
+
+        Parameters
+        ----------
+        nodes: Iterable[BaseNode]
+            The nodes (or documents), e.g. the output of a node parser.
+        batch_size: int, optional, default is 100.
+            The number of nodes embedded and written per batch (the checkpoint granularity).
+        max_concurrency: int, optional, default is 16.
+            The maximum number of upserts in flight.
+        embed_model: BaseEmbedding, optional, default is None.
+            The model embedding the nodes without an embedding, `Settings.embed_model` if not given.
+        checkpoint_dir: str, optional, default is None.
+            The directory of the checkpoint, no checkpoint if None.
+        progress_callback: Callable[[BulkProgress], None], optional, default is None.
+            Called after every batch.
+        max_retries: int, optional, default is 10.
+            The number of times a failed request is retried before the run fails. Throttled requests are retried
+            as long as their total wait stays under `MAX_THROTTLE_WAIT` seconds.
+
+        Returns
+        -------
+        BulkProgress
+            The number of items written, the request units consumed and the throughput of the run.
+        """
+        num_total = len(nodes) if hasattr(nodes, "__len__") else None
+        nodes = iter(nodes)
+        first_batch = list(islice(nodes, batch_size))
+        fingerprint = generate_content_hash(
+            "\n".join(node.node_id for node in first_batch)
+        )
+        num_done = _read_bulk_checkpoint(checkpoint_dir, self.container.id, fingerprint)
+        progress = BulkProgress(
+            num_done=num_done,
+            num_total=num_total,
+            concurrency=max_concurrency,
+        )
+        limiter = AdaptiveConcurrency(max_concurrency)
+        lock = threading.Lock()
+        start = time.perf_counter()
+
+        def record(headers, result):
+            with lock:
+                progress.request_charge += float(headers.get("x-ms-request-charge", 0))
+                if int(headers.get("x-ms-throttle-retry-count", 0) or 0):
+                    progress.num_throttled += int(headers["x-ms-throttle-retry-count"])
+                    limiter.throttled()
+
+        def upsert(item: Dict[str, Any]):
+            attempt, throttle_wait = 0, 0.0
+            while True:
+                limiter.acquire()
+                throttled, failure = False, None
+                try:
+                    self.container.upsert_item(item, response_hook=record)
+                except CosmosHttpResponseError as error:
+                    throttled = error.status_code == 429
+                    if error.status_code not in RETRIABLE_STATUS_CODES:
+                        raise
+                    failure = error
+                finally:
+                    # any error (e.g. a connection reset) frees the slot, the queued upserts would wait for it forever.
+                    limiter.release(throttled=throttled)
+                if failure is None:
+                    with lock:
+                        progress.num_upserted += 1
+                    return
+                delay = _retry_delay(failure, attempt)
+                if throttled:
+                    # the service says when to retry, a throttled request is retried within a time budget.
+                    with lock:
+                        progress.num_throttled += 1
+                    throttle_wait += delay
+                    if throttle_wait > MAX_THROTTLE_WAIT:
+                        raise failure
+                else:
+                    attempt += 1
+                    if attempt > max_retries:
+                        raise failure
+                time.sleep(delay)
+
+        nodes = islice(chain(first_batch, nodes), num_done, None)
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while batch := list(islice(nodes, batch_size)):
+                _embed_missing(batch, embed_model)
+                # consume the results to raise the first error of the batch.
+                list(executor.map(upsert, [self.to_item(node) for node in batch]))
+                progress.num_done += len(batch)
+                progress.elapsed = time.perf_counter() - start
+                progress.concurrency = limiter.limit
+                if checkpoint_dir is not None:
+                    _write_bulk_checkpoint(
+                        checkpoint_dir,
+                        self.container.id,
+                        fingerprint,
+                        progress.num_done,
+                    )
+                if progress_callback is not None:
+                    progress_callback(replace(progress))
+
+        progress.elapsed = time.perf_counter() - start
+        progress.concurrency = limiter.limit
+        if checkpoint_dir is not None:
+            (Path(checkpoint_dir) / BULK_CHECKPOINT_FILE).unlink(missing_ok=True)
+        logger.info(
+            f"Upserted {progress.num_upserted} items in {progress.elapsed:.1f} s "
+            f"({progress.items_per_second:.1f} items/s, {progress.ru_per_second:.1f} RU/s)"
+        )
+        return progress
+
+
+def _embed_missing(nodes: List[BaseNode], embed_model: Optional[BaseEmbedding]):
+    """Embed the nodes that have no embedding, with one batched call."""
+    missing = [node for node in nodes if node.embedding is None]
+    if not missing:
+        return
+    embeddings = (embed_model or Settings.embed_model).get_text_embedding_batch(
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in missing]
+    )
+    for node, embedding in zip(missing, embeddings):
+        node.embedding = embedding
+
+
+def _retry_delay(error: CosmosHttpResponseError, attempt: int) -> float:
+    """The delay asked by the `x-ms-retry-after-ms` header (jittered, so the throttled requests do not all retry at
+    once), or a jittered exponential backoff."""
+    retry_after = (error.headers or {}).get("x-ms-retry-after-ms")
+    if retry_after is not None:
+        return float(retry_after) / 1000 * random.uniform(1.0, 2.0)
+    return random.uniform(0, min(30.0, 0.1 * 2**attempt))
+
+
+def _read_bulk_checkpoint(
+    checkpoint_dir: Optional[str], container_id: str, fingerprint: str
+) -> int:
+    """Get the number of nodes of an input already written to a container, 0 without a checkpoint of this input."""
+    if checkpoint_dir is None:
+        return 0
+    path = Path(checkpoint_dir) / BULK_CHECKPOINT_FILE
+    if not path.exists():
+        return 0
+    checkpoint = json.loads(path.read_text())
+    if checkpoint.get("container") != container_id:
+        return 0
+    if checkpoint.get("fingerprint") != fingerprint:
+        logger.warning(
+            f"Ignoring the checkpoint in {checkpoint_dir}, it was written for another input"
+        )
+        return 0
+    return checkpoint["num_done"]
+
+
+def _write_bulk_checkpoint(
+    checkpoint_dir: str, container_id: str, fingerprint: str, num_done: int
+):
+    path = Path(checkpoint_dir) / BULK_CHECKPOINT_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(
+        json.dumps(
+            {
+                "container": container_id,
+                "fingerprint": fingerprint,
+                "num_done": num_done,
+            }
+        )
+    )
+    os.replace(tmp_path, path)
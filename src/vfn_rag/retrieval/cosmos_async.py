@@ -0,0 +1,475 @@
+"""Asynchronous Azure Cosmos DB (NoSQL) storage, on the `azure.cosmos.aio` client.
+
+`Cosmos` uses the synchronous client: every request blocks a thread until Cosmos answers, so a query service
+serving many retrievals at once needs a thread per outstanding round-trip. `AsyncCosmos` creates, loads, queries,
+upserts and deletes with the aio client instead, and all the requests of an event loop share one pool of HTTP
+connections. The items have the same layout as the ones written by `AzureCosmosDBNoSqlVectorSearch`, so a container
+written by `Cosmos` (or `Cosmos.bulk_upsert`) can be served by `AsyncCosmos` and vice versa.
+
+Example:
+    async with await AsyncCosmos.load(database_name, container_name, uri=uri, key=key) as cosmos:
+        index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+        retriever = index.as_retriever(similarity_top_k=5)
+        results = await asyncio.gather(*(retriever.aretrieve(query) for query in queries))
+
+The vector store only implements the async methods of llama_index (`async_add`, `adelete`, `adelete_nodes`,
+`aquery`), reached through `index.ainsert_nodes`, `index.adelete_ref_doc`, `retriever.aretrieve` and
+`query_engine.aquery`; the synchronous ones raise `NotImplementedError`.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.cosmos.aio import CosmosClient
+from llama_index.core import StorageContext
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from vfn_rag.retrieval.base_storage import BaseStorage
+from vfn_rag.retrieval.cosmos import (
+    CONTAINER_PROPERTIES,
+    INDEXING_POLICY,
+    PartitionStrategy,
+    VectorEmbeddingPolicy,
+    items_to_result,
+    node_to_item,
+    query_where,
+    vector_search_sql,
+)
+
+# the maximum number of open connections of a client, shared by all its requests.
+DEFAULT_CONNECTION_LIMIT = 100
+# the maximum number of concurrent requests of one `async_add` or `adelete` call.
+DEFAULT_ASYNC_CONCURRENCY = 16
+
+__all__ = ["AsyncCosmos", "AsyncCosmosVectorStore", "create_async_client"]
+
+
+def create_async_client(
+    uri: Optional[str] = None,
+    key: Optional[str] = None,
+    connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+    **kwargs: Any,
+) -> CosmosClient:
+    """Create an `azure.cosmos.aio.CosmosClient` with a pool of `connection_limit` connections.
+
+        The connection pool is bound to the running event loop: call it from a coroutine, and close the client
+        (`await client.close()`) in the same loop.
+
+    Parameters
+    ----------
+    uri: str, optional, default is None.
+        The account URI, the `AZURE_COSMOSDB_URI` environment variable if None.
+    key: str, optional, default is None.
+        The account key, the `AZURE_COSMOSDB_KEY` environment variable if None.
+    connection_limit: int, optional, default is 100.
+        The maximum number of open connections; further requests wait for a free connection.
+    **kwargs:
+        Other arguments of the `CosmosClient` (e.g. `consistency_level`, `retry_total`).
+
+    Returns
+    -------
+    CosmosClient
+        The aio client, owning its connection pool.
+    """
+    if uri is None:
+        uri = os.environ.get("AZURE_COSMOSDB_URI")
+    if key is None:
+        key = os.environ.get("AZURE_COSMOSDB_KEY")
+    if uri is None or key is None:
+        raise ValueError("Either cosmos_client or both uri and key must be provided")
+
+    connector = aiohttp.TCPConnector(
+        limit=connection_limit, limit_per_host=connection_limit
+    )
+    transport = AioHttpTransport(
+        session=aiohttp.ClientSession(connector=connector), session_owner=True
+    )
+    return CosmosClient(uri, credential=key, transport=transport, **kwargs)
+
+
+class AsyncCosmosVectorStore(BasePydanticVectorStore):
+    """Vector store on a container of the `azure.cosmos.aio` client, with the item layout of
+    `AzureCosmosDBNoSqlVectorSearch`."""
+
+    stores_text: bool = True
+    flat_metadata: bool = True
+    max_concurrency: int = DEFAULT_ASYNC_CONCURRENCY
+
+    _container: Any = PrivateAttr()
+    _id_key: str = PrivateAttr()
+    _embedding_key: str = PrivateAttr()
+    _text_key: str = PrivateAttr()
+    _metadata_key: str = PrivateAttr()
+    _partition_strategy: PartitionStrategy = PrivateAttr(
+        default_factory=PartitionStrategy
+    )
+
+    def __init__(
+        self,
+        container: Any,
+        embedding_key: str = "embedding",
+        id_key: str = "id",
+        text_key: str = "text",
+        metadata_key: str = "metadata",
+        max_concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+        partition_strategy: Optional[PartitionStrategy] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Create the vector store.
+
+        Parameters
+        ----------
+        container: azure.cosmos.aio.ContainerProxy
+            The container of the items.
+        embedding_key: str, optional, default is "embedding".
+            The property of the embeddings (the path of the vector embedding policy, without the "/").
+        id_key: str, optional, default is "id".
+            The property of the node ids.
+        text_key: str, optional, default is "text".
+            The property of the node texts.
+        metadata_key: str, optional, default is "metadata".
+            The property of the node metadata.
+        max_concurrency: int, optional, default is 16.
+            The maximum number of concurrent requests of one `async_add` or `adelete` call.
+        partition_strategy: PartitionStrategy, optional, default is None.
+            The partition strategy of the container, by id if None.
+        """
+        super().__init__(max_concurrency=max_concurrency, **kwargs)
+        self._partition_strategy = partition_strategy or PartitionStrategy()
+        self._container = container
+        self._id_key = id_key
+        self._embedding_key = embedding_key
+        self._text_key = text_key
+        self._metadata_key = metadata_key
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "AsyncCosmosVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._container
+
+    @property
+    def partition_strategy(self) -> PartitionStrategy:
+        return self._partition_strategy
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        raise NotImplementedError(
+            "AsyncCosmosVectorStore is asynchronous, use `async_add` (`index.ainsert_nodes`)."
+        )
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        raise NotImplementedError(
+            "AsyncCosmosVectorStore is asynchronous, use `adelete` (`index.adelete_ref_doc`)."
+        )
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        raise NotImplementedError(
+            "AsyncCosmosVectorStore is asynchronous, use `aquery` (`retriever.aretrieve`)."
+        )
+
+    async def async_add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Upsert the nodes, with up to `max_concurrency` requests in flight."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def upsert(node: BaseNode):
+            async with semaphore:
+                await self._container.upsert_item(node_to_item(self, node))
+
+        await asyncio.gather(*(upsert(node) for node in nodes))
+        return [node.node_id for node in nodes]
+
+    async def adelete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete the nodes of a document."""
+        await self._delete_where(
+            f"c.{self._metadata_key}.ref_doc_id = @ref_doc_id",
+            [{"name": "@ref_doc_id", "value": ref_doc_id}],
+        )
+
+    async def adelete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        """Delete the nodes with the given ids and matching the metadata filters."""
+        where, parameters = query_where(
+            self, VectorStoreQuery(node_ids=node_ids, filters=filters)
+        )
+        if where is not None:
+            await self._delete_where(where, parameters)
+
+    async def _delete_where(self, condition: str, parameters: List[Dict[str, Any]]):
+        items = [
+            item
+            async for item in self._container.query_items(
+                query=(
+                    f"SELECT c.id, c.{self.partition_strategy.item_property} AS partitionKey FROM c WHERE {condition}"
+                ),
+                parameters=parameters,
+            )
+        ]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def delete(item: Dict[str, Any]):
+            async with semaphore:
+                await self._container.delete_item(
+                    item["id"], partition_key=item["partitionKey"]
+                )
+
+        await asyncio.gather(*(delete(item) for item in items))
+
+    async def aquery(
+        self,
+        query: VectorStoreQuery,
+        partition_key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> VectorStoreQueryResult:
+        """Get the `similarity_top_k` nearest nodes, in one logical partition if a `partition_key` is given, with the
+        query of `CosmosVectorStore.query` (the metadata filters are evaluated by Cosmos).
+        """
+        where, parameters = query_where(self, query)
+        items = self._container.query_items(
+            query=vector_search_sql(
+                self, query.similarity_top_k, kwargs.get("pre_filter"), where
+            ),
+            parameters=[
+                {"name": "@embeddings", "value": query.query_embedding},
+                *parameters,
+            ],
+            partition_key=partition_key,
+        )
+        return items_to_result(self, [item async for item in items])
+
+
+class AsyncCosmos(BaseStorage):
+    """Storage on Azure Cosmos DB NoSQL with the `azure.cosmos.aio` client.
+
+    Example:
+        cosmos = await AsyncCosmos.create(database_name, container_name, uri=uri, key=key)
+        index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+        await index.ainsert_nodes(nodes)
+        await cosmos.close()
+    """
+
+    def __init__(
+        self, storage: StorageContext, client: CosmosClient, owns_client: bool = False
+    ) -> None:
+        self.client = client
+        self._owns_client = owns_client
+        super().__init__(storage)
+
+    @classmethod
+    async def create(
+        cls,
+        database_name: str,
+        container_name: str,
+        client: Optional[CosmosClient] = None,
+        uri: Optional[str] = None,
+        key: Optional[str] = None,
+        connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+        indexing_policy: Optional[Dict[str, Any]] = None,
+        vector_embedding_policy: Optional[Dict[str, Any]] = None,
+        cosmos_container_properties: Optional[Dict[str, Any]] = None,
+        cosmos_database_properties: Optional[Dict[str, Any]] = None,
+        max_concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+        partition_strategy: Optional[PartitionStrategy] = None,
+    ) -> "AsyncCosmos":
+        """Create the database and the container if they do not exist.
+
+        Parameters
+        ----------
+        database_name: str
+            The name of the database.
+        container_name: str
+            The name of the container.
+        client: azure.cosmos.aio.CosmosClient, optional, default is None.
+            The client, shared with other storages. A new client (closed by `close`) if None.
+        uri: str, optional, default is None.
+            The account URI of a new client.
+        key: str, optional, default is None.
+            The account key of a new client.
+        connection_limit: int, optional, default is 100.
+            The size of the connection pool of a new client.
+        indexing_policy: Dict[str, Any], optional, default is None.
+            The indexing policy of a new container, `INDEXING_POLICY` if None.
+        vector_embedding_policy: Dict[str, Any], optional, default is None.
+            The vector embedding policy of a new container, `VectorEmbeddingPolicy` if None.
+        cosmos_container_properties: Dict[str, Any], optional, default is None.
+            Other properties of a new container (`partition_key`, `default_ttl`, `offer_throughput`, ...),
+            `CONTAINER_PROPERTIES` if None.
+        cosmos_database_properties: Dict[str, Any], optional, default is None.
+            Other properties of a new database (`offer_throughput`, ...).
+        max_concurrency: int, optional, default is 16.
+            The maximum number of concurrent requests of one upsert or delete call of the vector store.
+        partition_strategy: PartitionStrategy, optional, default is None.
+            The partition key of a new container, and the partition value written with the nodes. By id if None.
+
+        Returns
+        -------
+        AsyncCosmos
+
+        Raises
+        ------
+        ValueError
+            If the container already exists and is partitioned differently from the `partition_strategy`.
+        """
+        owns_client = client is None
+        if client is None:
+            client = create_async_client(uri, key, connection_limit)
+
+        vector_embedding_policy = vector_embedding_policy or VectorEmbeddingPolicy
+        container_properties = dict(cosmos_container_properties or CONTAINER_PROPERTIES)
+        if partition_strategy is not None:
+            container_properties["partition_key"] = partition_strategy.partition_key
+        try:
+            database = await client.create_database_if_not_exists(
+                id=database_name, **(cosmos_database_properties or {})
+            )
+            container = await database.create_container_if_not_exists(
+                id=container_name,
+                partition_key=container_properties.pop("partition_key"),
+                indexing_policy=indexing_policy or INDEXING_POLICY,
+                vector_embedding_policy=vector_embedding_policy,
+                **container_properties,
+            )
+            # the container may already exist with another partition key.
+            partition_strategy = PartitionStrategy.of_container(
+                await container.read(), partition_strategy
+            )
+        except Exception:
+            if owns_client:
+                await client.close()
+            raise
+        return cls._from_container(
+            container,
+            vector_embedding_policy,
+            client,
+            owns_client,
+            max_concurrency,
+            partition_strategy,
+        )
+
+    @classmethod
+    async def load(
+        cls,
+        database_name: str,
+        container_name: str,
+        client: Optional[CosmosClient] = None,
+        uri: Optional[str] = None,
+        key: Optional[str] = None,
+        connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+        max_concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+        partition_strategy: Optional[PartitionStrategy] = None,
+    ) -> "AsyncCosmos":
+        """Open an existing container, the embedding path is read from its vector embedding policy.
+
+        Parameters
+        ----------
+        database_name: str
+            The name of the database.
+        container_name: str
+            The name of the container.
+        client: azure.cosmos.aio.CosmosClient, optional, default is None.
+            The client, shared with other storages. A new client (closed by `close`) if None.
+        uri: str, optional, default is None.
+            The account URI of a new client.
+        key: str, optional, default is None.
+            The account key of a new client.
+        connection_limit: int, optional, default is 100.
+            The size of the connection pool of a new client.
+        max_concurrency: int, optional, default is 16.
+            The maximum number of concurrent requests of one upsert or delete call of the vector store.
+        partition_strategy: PartitionStrategy, optional, default is None.
+            The partition strategy the container was created with, by id if None. It is checked against the
+            partition key of the container.
+
+        Returns
+        -------
+        AsyncCosmos
+
+        Raises
+        ------
+        CosmosResourceNotFoundError
+            If the database or the container does not exist.
+        ValueError
+            If the container is partitioned differently from the `partition_strategy`.
+        """
+        owns_client = client is None
+        if client is None:
+            client = create_async_client(uri, key, connection_limit)
+
+        try:
+            container = client.get_database_client(database_name).get_container_client(
+                container_name
+            )
+            properties = await container.read()
+        except Exception:
+            if owns_client:
+                await client.close()
+            raise
+        vector_embedding_policy = (
+            properties.get("vectorEmbeddingPolicy") or VectorEmbeddingPolicy
+        )
+        try:
+            partition_strategy = PartitionStrategy.of_container(
+                properties, partition_strategy
+            )
+        except ValueError:
+            if owns_client:
+                await client.close()
+            raise
+        return cls._from_container(
+            container,
+            vector_embedding_policy,
+            client,
+            owns_client,
+            max_concurrency,
+            partition_strategy,
+        )
+
+    @classmethod
+    def _from_container(
+        cls,
+        container: Any,
+        vector_embedding_policy: Dict[str, Any],
+        client: CosmosClient,
+        owns_client: bool,
+        max_concurrency: int,
+        partition_strategy: Optional[PartitionStrategy],
+    ) -> "AsyncCosmos":
+        store = AsyncCosmosVectorStore(
+            container,
+            embedding_key=vector_embedding_policy["vectorEmbeddings"][0]["path"][1:],
+            max_concurrency=max_concurrency,
+            partition_strategy=partition_strategy,
+        )
+        return cls(
+            StorageContext.from_defaults(vector_store=store), client, owns_client
+        )
+
+    @property
+    def container(self):
+        """The Cosmos container of the vector store."""
+        return self.vector_store.client
+
+    async def close(self):
+        """Close the client (and its connections) if it was created by the storage."""
+        if self._owns_client:
+            await self.client.close()
+
+    async def __aenter__(self) -> "AsyncCosmos":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
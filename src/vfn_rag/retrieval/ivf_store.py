@@ -0,0 +1,251 @@
+"""An approximate nearest-neighbour (IVF-flat) local vector store.
+
+`NumpyVectorStore` scores every stored vector on every query, so the query time grows linearly with the number of
+vectors. `IVFVectorStore` partitions the vectors with spherical k-means into `nlist` inverted lists and only scores
+the vectors of the `nprobe` lists whose centroids are the closest to the query. `nprobe` trades recall for speed:
+`nprobe = nlist` is an exact search.
+
+The index is trained by `train`, or by `persist` once the store holds `min_train_size` vectors and is not trained
+yet or has grown by `retrain_factor` since the last training (`needs_training`). An incremental `Storage.save` of
+a store that needs training writes a full snapshot instead, so the index is trained there too. Queries never train the index, so
+the read path does not run k-means nor replace the centroids under a concurrent query: an untrained store is
+searched exactly, and new vectors are assigned to the closest existing centroid until the next training. The
+centroids and the list of every vector are persisted next to the arrays of `NumpyVectorStore`.
+"""
+
+from typing import Any, Dict, Optional
+import numpy as np
+import fsspec
+from pydantic import Field, PrivateAttr
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from vfn_rag.retrieval.vector_store import NumpyVectorStore, top_k_indices, _decode
+
+DEFAULT_NPROBE = 8
+DEFAULT_MIN_TRAIN_SIZE = 1024
+DEFAULT_TRAIN_SIZE = 50_000
+DEFAULT_RETRAIN_FACTOR = 2.0
+# the number of rows assigned to the centroids at a time, to bound the memory used with memory-mapped embeddings.
+ASSIGN_CHUNK_SIZE = 65536
+
+__all__ = ["IVFVectorStore"]
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """A `NumpyVectorStore` with an inverted-file (IVF-flat) index for approximate top-k queries.
+
+    The store searches all the vectors (exactly) until it is trained, and queries restricted with `node_ids` or
+    `doc_ids` are always exact.
+    """
+
+    nlist: Optional[int] = Field(
+        default=None,
+        description="The number of inverted lists (k-means centroids), 4 * sqrt(n) if None.",
+    )
+    nprobe: int = Field(
+        default=DEFAULT_NPROBE, description="The number of lists searched per query.", gt=0
+    )
+    min_train_size: int = Field(
+        default=DEFAULT_MIN_TRAIN_SIZE, description="The number of vectors needed to train the index."
+    )
+    train_size: int = Field(
+        default=DEFAULT_TRAIN_SIZE, description="The maximum number of vectors sampled to train the index."
+    )
+    retrain_factor: float = Field(
+        default=DEFAULT_RETRAIN_FACTOR,
+        description="The growth of the store (since the last training) that triggers a new training.",
+    )
+    num_iterations: int = Field(default=10, description="The number of k-means iterations.")
+    seed: int = Field(default=0, description="The seed of the k-means initialization.")
+
+    _centroids: Optional[np.ndarray] = PrivateAttr(default=None)
+    _assignments: Optional[np.ndarray] = PrivateAttr(default=None)
+    _trained_count: int = PrivateAttr(default=0)
+    # the rows sorted by list, and the start of every list in it.
+    _order: Optional[np.ndarray] = PrivateAttr(default=None)
+    _offsets: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        centroids: Optional[np.ndarray] = None,
+        assignments: Optional[np.ndarray] = None,
+        trained_count: int = 0,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize the store.
+
+        Parameters
+        ----------
+        centroids: np.ndarray, optional, default is None.
+            The (nlist, dim) unit-norm centroids of a trained index.
+        assignments: np.ndarray, optional, default is None.
+            The list of every stored vector.
+        trained_count: int, optional, default is 0.
+            The number of vectors when the index was trained.
+        **kwargs:
+            The arrays of `NumpyVectorStore` and the parameters of the index (`nlist`, `nprobe`, `min_train_size`,
+            `train_size`, `retrain_factor`, `num_iterations`, `seed`).
+        """
+        super().__init__(**kwargs)
+        self._centroids = centroids
+        self._assignments = assignments
+        self._trained_count = trained_count
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "IVFVectorStore"
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        """True if the store holds `min_train_size` vectors and is not trained or has grown by `retrain_factor`."""
+        count = self.count
+        if count < self.min_train_size:
+            return False
+        return not self.is_trained or count > self.retrain_factor * self._trained_count
+
+    def train(self, nlist: Optional[int] = None):
+        """Train the centroids with spherical k-means on a sample of the vectors, and assign all the vectors.
+
+        Parameters
+        ----------
+        nlist: int, optional, default is None.
+            The number of lists, `self.nlist` (or 4 * sqrt(n)) if not given.
+        """
+        self._consolidate()
+        live_rows = self._live_rows()
+        count = len(live_rows)
+        if count == 0:
+            return
+        nlist = min(count, nlist or self.nlist or max(1, int(4 * np.sqrt(count))))
+        rng = np.random.default_rng(self.seed)
+        sample_rows = np.sort(rng.choice(count, size=min(count, max(self.train_size, nlist)), replace=False))
+        sample = self._normalized(live_rows[sample_rows])
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.num_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sizes = np.bincount(labels, minlength=nlist)
+            empty = sizes == 0
+            # sum the vectors of every cluster: sort them by cluster and add up the contiguous runs.
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            sums[~empty] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts[~empty])
+            # restart the empty clusters from random vectors.
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+        self._centroids = centroids
+        self._assignments = self._assign(np.arange(len(self._ids)))
+        self._trained_count = count
+        self._order = None
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Get the (approximate) top-k most similar nodes (cosine similarity)."""
+        if query.filters is not None:
+            raise ValueError("IVFVectorStore does not support metadata filters.")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+        self._consolidate()
+        if query.node_ids is not None or query.doc_ids is not None or not self.is_trained:
+            return super().query(query, **kwargs)
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        rows = self._probe(query_embedding, self.nprobe)
+        if len(rows) == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        scores = self._scores(query_embedding, rows)
+        top = top_k_indices(scores, query.similarity_top_k)
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(), ids=_decode(self._ids[rows[top]])
+        )
+
+    def _probe(self, query_embedding: np.ndarray, nprobe: int) -> np.ndarray:
+        """Get the rows of the `nprobe` lists closest to the query."""
+        if self._order is None:
+            self._order = np.argsort(self._assignments, kind="stable")
+            self._offsets = np.concatenate(
+                [[0], np.cumsum(np.bincount(self._assignments, minlength=len(self._centroids)))]
+            )
+        lists = top_k_indices(self._centroids @ query_embedding, nprobe)
+        rows = np.sort(
+            np.concatenate([self._order[self._offsets[i] : self._offsets[i + 1]] for i in lists])
+        )
+        return rows if self._deleted is None else rows[~self._deleted[rows]]
+
+    def _normalized(self, rows: np.ndarray) -> np.ndarray:
+        embeddings = self._take(rows)
+        norms = self._norms[rows][:, None]
+        return embeddings / np.where(norms == 0, 1.0, norms)
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        """Get the closest centroid of the vectors of some rows."""
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), ASSIGN_CHUNK_SIZE):
+            chunk = rows[start : start + ASSIGN_CHUNK_SIZE]
+            labels[start : start + len(chunk)] = np.argmax(
+                self._normalized(chunk) @ self._centroids.T, axis=1
+            )
+        return labels
+
+    def _consolidate(self):
+        """Append the buffered embeddings to the matrix and assign them to the closest lists."""
+        if not self._pending:
+            return
+        count = len(self._ids)
+        super()._consolidate()
+        if self.is_trained:
+            new_rows = np.arange(count, len(self._ids))
+            self._assignments = np.concatenate([self._assignments, self._assign(new_rows)])
+            self._order = None
+
+    def persist(
+        self,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+    ) -> None:
+        """Persist the store (see `NumpyVectorStore.persist`), after training the index if it `needs_training`."""
+        if self.needs_training:
+            self.train()
+        super().persist(persist_path, fs=fs)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = super()._arrays()
+        if self.is_trained:
+            arrays.update(centroids=self._centroids, assignments=self._live(self._assignments))
+        return arrays
+
+    def _header(self) -> Dict[str, Any]:
+        header = super()._header()
+        header.update(
+            trained_count=self._trained_count,
+            nlist=self.nlist,
+            nprobe=self.nprobe,
+            min_train_size=self.min_train_size,
+            train_size=self.train_size,
+            retrain_factor=self.retrain_factor,
+            num_iterations=self.num_iterations,
+            seed=self.seed,
+        )
+        return header
+
+    @classmethod
+    def _load_arrays(cls, base: str, header: Dict[str, Any], mmap: bool) -> Dict[str, Any]:
+        kwargs = super()._load_arrays(base, header, mmap)
+        if header.get("trained_count"):
+            kwargs.update(
+                centroids=np.load(f"{base}.centroids.npy"),
+                assignments=np.load(f"{base}.assignments.npy"),
+                trained_count=header["trained_count"],
+            )
+        for name in ("nlist", "nprobe", "min_train_size", "train_size", "retrain_factor", "num_iterations", "seed"):
+            if name in header:
+                kwargs[name] = header[name]
+        return kwargs
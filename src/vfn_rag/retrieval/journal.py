@@ -0,0 +1,254 @@
+"""Append-only journal (write-ahead log) for incremental saves of a local store.
+
+A full save of a store (`StorageContext.persist`) is the snapshot. An incremental save appends the records that
+changed since the last save to a new segment in the `wal` directory next to the snapshot:
+
+- the puts and deletes on the docstore and index store, recorded by `JournaledKVStore`. Only the last change of a
+  key is kept, so the index struct an index puts again on every insert is written once per save.
+- the embeddings added, re-added or deleted in the vector stores, from the node IDs the vector stores record as
+  changed (`JournaledSimpleVectorStore` and `NumpyVectorStore.changed_ids`).
+
+Loading the store replays the segments in order on top of the snapshot, and compacting the store writes a new
+snapshot and removes the segments. The segments are numbered in sequence, and once the snapshot is written the
+number of the last segment it includes is recorded next to it (`wal_snapshot.json`): loading skips the segments at
+or below that number, so segments left behind by an interrupted compaction are not replayed over a newer snapshot.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pydantic import PrivateAttr
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION
+from llama_index.core.vector_stores import SimpleVectorStore
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+WAL_DIR = "wal"
+SEGMENT_SUFFIX = ".jsonl"
+SNAPSHOT_FNAME = "wal_snapshot.json"
+VECTOR_STORE_PREFIX = "vector_store/"
+
+__all__ = ["JournaledKVStore", "JournaledSimpleVectorStore"]
+
+
+class JournaledKVStore(SimpleKVStore):
+    """A `SimpleKVStore` that records the last put or delete of every key since the last save."""
+
+    def __init__(self, data: Optional[Dict[str, Dict[str, dict]]] = None) -> None:
+        super().__init__(data)
+        self._journal: Dict[Tuple[str, str], Tuple[str, Optional[dict]]] = {}
+
+    @property
+    def journal(self) -> List[Tuple[str, str, str, Optional[dict]]]:
+        """The (operation, collection, key, value) records since the last save, in the order of the last change."""
+        return [
+            (operation, collection, key, value)
+            for (collection, key), (operation, value) in self._journal.items()
+        ]
+
+    def clear_journal(self):
+        self._journal = {}
+
+    def _record(self, operation: str, collection: str, key: str, value: Optional[dict]):
+        # move the key to the end, the records keep the order of the last changes.
+        self._journal.pop((collection, key), None)
+        self._journal[(collection, key)] = (operation, value)
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        super().put(key, val, collection=collection)
+        self._record("put", collection, key, val)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        deleted = super().delete(key, collection=collection)
+        if deleted:
+            self._record("delete", collection, key, None)
+        return deleted
+
+    def replay(self, operation: str, collection: str, key: str, value: Optional[dict]):
+        """Apply a journal record without recording it again."""
+        if operation == "put":
+            super().put(key, value, collection=collection)
+        else:
+            super().delete(key, collection=collection)
+
+
+class JournaledSimpleVectorStore(SimpleVectorStore):
+    """A `SimpleVectorStore` that records the IDs of the nodes added or deleted since the last save."""
+
+    _changed_ids: Dict[str, None] = PrivateAttr(default_factory=dict)
+
+    @property
+    def changed_ids(self) -> List[str]:
+        """The IDs of the nodes added, re-added or deleted since the last save."""
+        return list(self._changed_ids)
+
+    def clear_changed_ids(self):
+        self._changed_ids = {}
+
+    def add(self, nodes, **add_kwargs: Any) -> List[str]:
+        node_ids = super().add(nodes, **add_kwargs)
+        self._changed_ids.update(dict.fromkeys(node_ids))
+        return node_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        node_ids = [
+            node_id
+            for node_id, node_ref_doc_id in self.data.text_id_to_ref_doc_id.items()
+            if node_ref_doc_id == ref_doc_id
+        ]
+        super().delete(ref_doc_id, **delete_kwargs)
+        self._changed_ids.update(dict.fromkeys(node_ids))
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Any = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        candidates = list(self.data.embedding_dict) if node_ids is None else node_ids
+        candidates = [node_id for node_id in candidates if node_id in self.data.embedding_dict]
+        super().delete_nodes(node_ids, filters, **delete_kwargs)
+        self._changed_ids.update(
+            dict.fromkeys(
+                node_id for node_id in candidates if node_id not in self.data.embedding_dict
+            )
+        )
+
+    def clear(self) -> None:
+        self._changed_ids.update(dict.fromkeys(self.data.embedding_dict))
+        super().clear()
+
+
+def is_journaled_vector_store(vector_store: Any) -> bool:
+    """Check if the changes of a vector store can be journaled."""
+    return isinstance(vector_store, (JournaledSimpleVectorStore, NumpyVectorStore))
+
+
+def vector_record(vector_store: Any, node_id: str) -> Optional[Dict[str, Any]]:
+    """Get the journal value of a node in a vector store, None if the node is not in the store."""
+    if isinstance(vector_store, SimpleVectorStore):
+        data = vector_store.data
+        if node_id not in data.embedding_dict:
+            return None
+        return {
+            "embedding": data.embedding_dict[node_id],
+            "ref_doc_id": data.text_id_to_ref_doc_id.get(node_id),
+            "metadata": (data.metadata_dict or {}).get(node_id),
+        }
+    try:
+        return {
+            "embedding": vector_store.get(node_id),
+            "ref_doc_id": vector_store.get_ref_doc_id(node_id),
+        }
+    except KeyError:
+        return None
+
+
+def replay_vector_records(vector_store: Any, records: Dict[str, Optional[dict]]):
+    """Apply the final state of the journaled nodes (value, or None if deleted) to a vector store."""
+    if isinstance(vector_store, SimpleVectorStore):
+        data = vector_store.data
+        for node_id, value in records.items():
+            if value is None:
+                data.embedding_dict.pop(node_id, None)
+                data.text_id_to_ref_doc_id.pop(node_id, None)
+                if data.metadata_dict is not None:
+                    data.metadata_dict.pop(node_id, None)
+                continue
+            data.embedding_dict[node_id] = value["embedding"]
+            data.text_id_to_ref_doc_id[node_id] = value["ref_doc_id"]
+            if value.get("metadata") is not None:
+                data.metadata_dict[node_id] = value["metadata"]
+        return
+
+    # remove the old rows first, a re-added node must not be duplicated.
+    vector_store.delete_nodes(list(records))
+    added = {node_id: value for node_id, value in records.items() if value is not None}
+    vector_store.add_embeddings(
+        list(added),
+        [value["embedding"] for value in added.values()],
+        [value["ref_doc_id"] for value in added.values()],
+    )
+
+
+def write_segment(store_dir: str, records: List[Dict[str, Any]]) -> Optional[Path]:
+    """Write the records to a new segment, named after the segment number.
+
+    The segment is written to a temporary file and moved in place, so a segment is either complete or absent.
+
+    Returns
+    -------
+    Path
+        The path of the segment, or None if there were no records.
+    """
+    if not records:
+        return None
+    wal_dir = Path(store_dir) / WAL_DIR
+    wal_dir.mkdir(parents=True, exist_ok=True)
+    segments = _segments(store_dir)
+    number = max(int(segments[-1].stem) if segments else 0, snapshot_segment(store_dir)) + 1
+    path = wal_dir / f"{number:08d}{SEGMENT_SUFFIX}"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record))
+            f.write("\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_segments(store_dir: str) -> Iterator[Dict[str, Any]]:
+    """Read the records of the segments written after the snapshot, in the order they were written."""
+    for segment in _segments(store_dir):
+        with open(segment, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def wal_size(store_dir: str) -> int:
+    """Get the total size of the segments in bytes."""
+    return sum(segment.stat().st_size for segment in _segments(store_dir))
+
+
+def clear_segments(store_dir: str):
+    """Remove all the segments (after a full save)."""
+    shutil.rmtree(Path(store_dir) / WAL_DIR, ignore_errors=True)
+
+
+def mark_snapshot(store_dir: str):
+    """Record that the snapshot in `store_dir` includes all the segments written so far.
+
+    Called after the snapshot is written and before the segments are removed, the marker is written to a temporary
+    file and moved in place.
+    """
+    segments = _segments(store_dir, include_snapshot=True)
+    number = max(int(segments[-1].stem) if segments else 0, snapshot_segment(store_dir))
+    path = Path(store_dir) / SNAPSHOT_FNAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"segment": number}, f)
+    os.replace(tmp_path, path)
+
+
+def snapshot_segment(store_dir: str) -> int:
+    """Get the number of the last segment included in the snapshot, 0 if none."""
+    path = Path(store_dir) / SNAPSHOT_FNAME
+    if not path.exists():
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        return int(json.load(f)["segment"])
+
+
+def _segments(store_dir: str, include_snapshot: bool = False) -> List[Path]:
+    """Get the segments written after the snapshot (or all of them), in order."""
+    wal_dir = Path(store_dir) / WAL_DIR
+    if not wal_dir.exists():
+        return []
+    segments = sorted(wal_dir.glob(f"*{SEGMENT_SUFFIX}"))
+    if include_snapshot:
+        return segments
+    number = snapshot_segment(store_dir)
+    return [segment for segment in segments if int(segment.stem) > number]
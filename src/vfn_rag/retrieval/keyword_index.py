@@ -0,0 +1,335 @@
+"""A BM25 keyword index of the documents of a store, and a hybrid (BM25 + vector) retriever.
+
+Vector similarity often misses exact terms such as species names and station codes. `KeywordIndex` is an inverted
+index: every term maps to its postings, two arrays with the rows of the documents containing the term and the term
+frequencies. The documents added or removed since the last refresh are buffered (added postings in lists, removed
+documents in a set), and `refresh` appends the buffered postings to the arrays, drops the postings of the removed
+documents and builds the document lengths array, once per batch of changes instead of once per query. The rows of
+the removed documents are dropped when the index is saved.
+
+`HybridRetriever` fuses the ranking of a vector retriever and the BM25 ranking with reciprocal-rank fusion (RRF),
+`score(d) = sum(1 / (rrf_k + rank(d)))` over the rankings, which needs no normalization of the two kinds of scores.
+
+The index is saved next to the store as `keyword_index.npz`.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+import numpy as np
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.indices.base import BaseIndex
+from llama_index.core.schema import BaseNode, Document, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.storage.docstore import BaseDocumentStore
+from vfn_rag.retrieval.vector_store import top_k_indices
+
+KEYWORD_INDEX_FILE = "keyword_index.npz"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_RRF_K = 60
+DEFAULT_SIMILARITY_TOP_K = 4
+DEFAULT_CANDIDATE_TOP_K = 20
+
+__all__ = ["KeywordIndex", "BM25Retriever", "HybridRetriever", "tokenize"]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text in lower case terms (words and numbers, punctuation is ignored)."""
+    return re.findall(r"\w+", text.lower())
+
+
+class KeywordIndex:
+    """An inverted index of documents scored with BM25."""
+
+    def __init__(self, k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        """Initialize an empty index.
+
+        Parameters
+        ----------
+        k1: float, optional, default is 1.2.
+            The saturation of the term frequencies.
+        b: float, optional, default is 0.75.
+            The normalization of the term frequencies by the document length (0 for none).
+        """
+        self.k1 = k1
+        self.b = b
+        self._doc_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._deleted: set = set()
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+        # the arrays of the last refresh, see `refresh`.
+        self._length_array = np.empty(0, dtype=np.float32)
+        self._average_length = 1.0
+        self._num_docs = 0
+        self._purged: set = set()
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    @property
+    def num_terms(self) -> int:
+        return len(self._postings.keys() | self._pending.keys())
+
+    @classmethod
+    def from_docstore(cls, docstore: BaseDocumentStore, **kwargs) -> "KeywordIndex":
+        """Build the index of all the documents of a docstore (e.g. `Storage.docstore`).
+
+        Parameters
+        ----------
+        docstore: BaseDocumentStore
+            The docstore, a `SQLiteDocumentStore` is read one document at a time.
+        **kwargs:
+            The parameters of the index (`k1`, `b`).
+        """
+        if hasattr(docstore, "get_document_ids"):
+            doc_ids = docstore.get_document_ids()
+        else:
+            doc_ids = list(docstore.get_all_document_hashes().values())
+        index = cls(**kwargs)
+        index.add_documents(docstore.get_document(doc_id) for doc_id in sorted(doc_ids))
+        return index
+
+    def add(self, doc_id: str, text: str):
+        """Add (or replace) a document."""
+        if doc_id in self._rows:
+            self.remove([doc_id])
+        row = len(self._doc_ids)
+        terms = tokenize(text)
+        self._doc_ids.append(doc_id)
+        self._rows[doc_id] = row
+        self._lengths.append(len(terms))
+        unique, counts = np.unique(np.array(terms, dtype=str), return_counts=True)
+        for term, count in zip(unique.tolist(), counts.tolist()):
+            rows, freqs = self._pending.setdefault(term, ([], []))
+            rows.append(row)
+            freqs.append(count)
+        self._stale = True
+
+    def add_documents(self, docs: Iterable[Union[Document, TextNode]]):
+        """Add (or replace) documents, indexed by their `node_id`, and refresh the index."""
+        for doc in docs:
+            self.add(doc.node_id, doc.get_content())
+        self.refresh()
+
+    def remove(self, doc_ids: Sequence[str]):
+        """Remove documents from the index, IDs that are not in the index are ignored."""
+        for doc_id in doc_ids:
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._deleted.add(row)
+                self._stale = True
+
+    def refresh(self):
+        """Apply the buffered changes to the arrays searched by `search`.
+
+        The buffered postings are appended to the arrays of their terms, the postings of the documents removed
+        since the last refresh are dropped, and the document lengths are converted to an array. `search` refreshes
+        the index if it changed since the last refresh.
+        """
+        if not self._stale:
+            return
+        for term, (rows, freqs) in self._pending.items():
+            old_rows, old_freqs = self._postings.get(term, (np.empty(0, np.int32), np.empty(0, np.int32)))
+            self._postings[term] = (
+                np.concatenate([old_rows, np.array(rows, dtype=np.int32)]),
+                np.concatenate([old_freqs, np.array(freqs, dtype=np.int32)]),
+            )
+        self._pending = {}
+
+        alive = np.ones(len(self._doc_ids), dtype=bool)
+        alive[list(self._deleted)] = False
+        if self._deleted != self._purged:
+            for term, (rows, freqs) in list(self._postings.items()):
+                keep = alive[rows]
+                if keep.all():
+                    continue
+                if keep.any():
+                    self._postings[term] = (rows[keep], freqs[keep])
+                else:
+                    del self._postings[term]
+            self._purged = set(self._deleted)
+
+        self._length_array = np.array(self._lengths, dtype=np.float32)
+        self._num_docs = int(alive.sum())
+        self._average_length = (float(self._length_array[alive].mean()) if self._num_docs else 0.0) or 1.0
+        self._stale = False
+
+    def search(self, query: str, top_k: int = DEFAULT_CANDIDATE_TOP_K) -> List[Tuple[str, float]]:
+        """Get the documents with the highest BM25 score for a query.
+
+        Parameters
+        ----------
+        query: str
+            The query.
+        top_k: int, optional, default is 20.
+            The maximum number of documents.
+
+        Returns
+        -------
+        List[Tuple[str, float]]
+            The IDs and scores of the documents containing at least one term of the query, by decreasing score.
+        """
+        if not self._rows:
+            return []
+        self.refresh()
+        lengths = self._length_array
+
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            rows, freqs = self._postings[term]
+            idf = np.log(1 + (self._num_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / self._average_length)
+            scores[rows] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+
+        matched = np.flatnonzero(scores)
+        top = matched[top_k_indices(scores[matched], top_k)]
+        return [(self._doc_ids[row], float(scores[row])) for row in top]
+
+    def save(self, store_dir: str):
+        """Save the index to `store_dir/keyword_index.npz`, dropping the rows of the deleted documents."""
+        self.refresh()
+        alive = np.ones(len(self._doc_ids), dtype=bool)
+        alive[list(self._deleted)] = False
+        new_rows = np.cumsum(alive, dtype=np.int64) - 1
+
+        terms, offsets, all_rows, all_freqs = [], [0], [], []
+        for term in sorted(self._postings):
+            rows, freqs = self._postings[term]
+            keep = alive[rows]
+            if not keep.any():
+                continue
+            terms.append(term)
+            all_rows.append(new_rows[rows[keep]].astype(np.int32))
+            all_freqs.append(freqs[keep])
+            offsets.append(offsets[-1] + int(keep.sum()))
+
+        np.savez(
+            Path(store_dir) / KEYWORD_INDEX_FILE,
+            parameters=np.array([self.k1, self.b]),
+            doc_ids=np.array(self._doc_ids, dtype=str)[alive],
+            lengths=np.array(self._lengths, dtype=np.int32)[alive],
+            terms=np.array(terms, dtype=str),
+            offsets=np.array(offsets, dtype=np.int64),
+            rows=np.concatenate(all_rows) if all_rows else np.empty(0, np.int32),
+            freqs=np.concatenate(all_freqs) if all_freqs else np.empty(0, np.int32),
+        )
+
+    @classmethod
+    def load(cls, store_dir: str) -> "KeywordIndex":
+        """Load the index saved in a store directory, an empty index if there is none."""
+        path = Path(store_dir) / KEYWORD_INDEX_FILE
+        index = cls()
+        if not path.exists():
+            return index
+        with np.load(path) as data:
+            index.k1, index.b = data["parameters"].tolist()
+            index._doc_ids = data["doc_ids"].tolist()
+            index._rows = {doc_id: row for row, doc_id in enumerate(index._doc_ids)}
+            index._lengths = data["lengths"].tolist()
+            offsets, rows, freqs = data["offsets"], data["rows"], data["freqs"]
+            index._postings = {
+                term: (rows[offsets[i] : offsets[i + 1]], freqs[offsets[i] : offsets[i + 1]])
+                for i, term in enumerate(data["terms"].tolist())
+            }
+        index._stale = True
+        index.refresh()
+        return index
+
+
+class BM25Retriever(BaseRetriever):
+    """Retrieve the documents of a docstore with a `KeywordIndex`."""
+
+    def __init__(
+        self,
+        keyword_index: KeywordIndex,
+        docstore: BaseDocumentStore,
+        similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+        **kwargs,
+    ):
+        """Initialize the retriever.
+
+        Parameters
+        ----------
+        keyword_index: KeywordIndex
+            The index of the documents of the docstore.
+        docstore: BaseDocumentStore
+            The docstore holding the documents.
+        similarity_top_k: int, optional, default is 4.
+            The number of documents retrieved.
+        """
+        super().__init__(**kwargs)
+        self._keyword_index = keyword_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        hits = self._keyword_index.search(query_bundle.query_str, self._similarity_top_k)
+        return _with_nodes(hits, self._docstore, {})
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieve the documents of an index with the reciprocal-rank fusion of vector and BM25 rankings."""
+
+    def __init__(
+        self,
+        index: BaseIndex,
+        keyword_index: KeywordIndex,
+        similarity_top_k: int = DEFAULT_SIMILARITY_TOP_K,
+        candidate_top_k: int = DEFAULT_CANDIDATE_TOP_K,
+        rrf_k: int = DEFAULT_RRF_K,
+        **kwargs,
+    ):
+        """Initialize the retriever.
+
+        Parameters
+        ----------
+        index: BaseIndex
+            The vector index, e.g. `IndexManager.get_index(index_id)`.
+        keyword_index: KeywordIndex
+            The keyword index of the documents of the index's docstore.
+        similarity_top_k: int, optional, default is 4.
+            The number of documents retrieved.
+        candidate_top_k: int, optional, default is 20.
+            The length of the vector and BM25 rankings that are fused.
+        rrf_k: int, optional, default is 60.
+            The constant of the reciprocal-rank fusion, a larger value gives more weight to the lower ranks.
+        """
+        super().__init__(**kwargs)
+        self._vector_retriever = index.as_retriever(similarity_top_k=candidate_top_k)
+        self._keyword_index = keyword_index
+        self._docstore = index.docstore
+        self._similarity_top_k = similarity_top_k
+        self._candidate_top_k = candidate_top_k
+        self._rrf_k = rrf_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_hits = self._vector_retriever.retrieve(query_bundle)
+        keyword_hits = self._keyword_index.search(query_bundle.query_str, self._candidate_top_k)
+
+        scores: Dict[str, float] = {}
+        for ranking in ([hit.node.node_id for hit in vector_hits], [doc_id for doc_id, _ in keyword_hits]):
+            for rank, doc_id in enumerate(ranking, start=1):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self._rrf_k + rank)
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        nodes = {hit.node.node_id: hit.node for hit in vector_hits}
+        return _with_nodes(fused[: self._similarity_top_k], self._docstore, nodes)
+
+
+def _with_nodes(
+    hits: List[Tuple[str, float]], docstore: BaseDocumentStore, nodes: Dict[str, BaseNode]
+) -> List[NodeWithScore]:
+    """Get the nodes of scored IDs, from `nodes` or else the docstore (IDs not in the docstore are skipped)."""
+    results = []
+    for doc_id, score in hits:
+        node = nodes.get(doc_id) or docstore.get_document(doc_id, raise_error=False)
+        if node is not None:
+            results.append(NodeWithScore(node=node, score=score))
+    return results
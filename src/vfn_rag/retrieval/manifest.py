@@ -0,0 +1,236 @@
+"""A persisted manifest of the files ingested into a store.
+
+The manifest maps every ingested file (path relative to the data directory) to its size, modification time and
+content hash, and to the IDs of the documents that were read from it. It is saved next to the store as
+`file_manifest.csv`, and is used by `Storage.read_changed_documents` to read only new or modified files.
+
+The `metadata_index.csv` file of older stores (one `file_name, doc_id` row per document) is left as it is, and is
+converted when a store has no manifest yet: its files have no known state, so they are all read again once and
+their old documents are reported as stale.
+"""
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence, Union
+import pandas as pd
+from vfn_rag.utils.helper_functions import generate_file_hash
+
+MANIFEST_FILE = "file_manifest.csv"
+# the file name -> document ID mapping of older stores.
+ID_MAPPING_FILE = "metadata_index.csv"
+LEGACY_COLUMNS = ["file_name", "doc_id"]
+COLUMNS = ["file_path", "size", "mtime_ns", "file_hash", "doc_id"]
+
+__all__ = ["FileManifest", "FileRecord", "ManifestDiff"]
+
+
+@dataclass
+class FileRecord:
+    """The state of an ingested file and the documents read from it."""
+
+    size: int
+    mtime_ns: int
+    file_hash: str
+    doc_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestDiff:
+    """The difference between a manifest and the files currently in a directory.
+
+    Attributes
+    ----------
+    new: List[str]
+        Files that are not in the manifest.
+    modified: List[str]
+        Files whose content hash differs from the one in the manifest.
+    unchanged: List[str]
+        Files with the same content as the one in the manifest.
+    deleted: List[str]
+        Files in the manifest that do not exist anymore.
+    stale_doc_ids: List[str]
+        IDs of the documents read from the modified and deleted files, which should be removed from the store.
+        The IDs still referenced by an unchanged file are kept.
+    """
+
+    new: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    stale_doc_ids: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> List[str]:
+        """Files that have to be (re)read."""
+        return self.new + self.modified
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.new or self.modified or self.deleted)
+
+
+class FileManifest:
+    """Track the files ingested into a store."""
+
+    def __init__(self, records: Dict[str, FileRecord] = None):
+        """Initialize the manifest.
+
+        Parameters
+        ----------
+        records: Dict[str, FileRecord], optional, default is None.
+            The file records, keyed by the file path relative to the data directory.
+        """
+        self._records = records or {}
+
+    @property
+    def records(self) -> Dict[str, FileRecord]:
+        return self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._records
+
+    @classmethod
+    def load(cls, store_dir: str) -> "FileManifest":
+        """Load the manifest saved next to a store.
+
+        A missing manifest gives an empty manifest, so every file is treated as new. Without a manifest, the
+        `metadata_index.csv` of an older store is converted: its files are treated as modified (their state is not
+        known) and the IDs of their old documents as stale.
+
+        Parameters
+        ----------
+        store_dir: str
+            The directory containing the store.
+
+        Returns
+        -------
+        FileManifest
+        """
+        path = Path(store_dir) / MANIFEST_FILE
+        if not path.exists():
+            return cls._load_legacy(Path(store_dir) / ID_MAPPING_FILE)
+
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        records = {}
+        for file_path, rows in df.groupby("file_path", sort=False):
+            first = rows.iloc[0]
+            records[file_path] = FileRecord(
+                size=int(first["size"]),
+                mtime_ns=int(first["mtime_ns"]),
+                file_hash=first["file_hash"],
+                doc_ids=[doc_id for doc_id in rows["doc_id"] if doc_id],
+            )
+        return cls(records)
+
+    @classmethod
+    def _load_legacy(cls, path: Path) -> "FileManifest":
+        """Convert the `file_name, doc_id` mapping of an older store, with an unknown state for every file."""
+        if not path.exists():
+            return cls()
+
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        if not set(LEGACY_COLUMNS).issubset(df.columns):
+            return cls()
+
+        return cls(
+            {
+                file_name: FileRecord(
+                    size=-1,
+                    mtime_ns=-1,
+                    file_hash="",
+                    doc_ids=[doc_id for doc_id in rows["doc_id"] if doc_id],
+                )
+                for file_name, rows in df.groupby("file_name", sort=False)
+            }
+        )
+
+    def save(self, store_dir: str):
+        """Save the manifest next to a store.
+
+        Parameters
+        ----------
+        store_dir: str
+            The directory containing the store.
+        """
+        rows = []
+        for file_path, record in self._records.items():
+            # a file that did not produce any document still gets a row, so it is not read again.
+            for doc_id in record.doc_ids or [""]:
+                rows.append(
+                    [file_path, record.size, record.mtime_ns, record.file_hash, doc_id]
+                )
+        os.makedirs(store_dir, exist_ok=True)
+        pd.DataFrame(rows, columns=COLUMNS).to_csv(
+            Path(store_dir) / MANIFEST_FILE, index=False
+        )
+
+    def diff(self, root: str, files: Sequence[Union[str, Path]]) -> ManifestDiff:
+        """Compare the manifest with the files currently in a directory.
+
+        The content hash of a file is only computed if its size or modification time changed.
+
+        Parameters
+        ----------
+        root: str
+            The data directory, the manifest keys are relative to it.
+        files: Sequence[str]
+            The files currently in the directory.
+
+        Returns
+        -------
+        ManifestDiff
+        """
+        diff = ManifestDiff()
+        seen = set()
+        for file in files:
+            key = self.key(root, file)
+            seen.add(key)
+            record = self._records.get(key)
+            if record is None:
+                diff.new.append(key)
+                continue
+
+            stat = os.stat(file)
+            if stat.st_size == record.size and stat.st_mtime_ns == record.mtime_ns:
+                diff.unchanged.append(key)
+            elif generate_file_hash(file) == record.file_hash:
+                # touched but not changed, remember the new mtime to skip hashing next time.
+                record.size, record.mtime_ns = stat.st_size, stat.st_mtime_ns
+                diff.unchanged.append(key)
+            else:
+                diff.modified.append(key)
+                diff.stale_doc_ids.extend(record.doc_ids)
+
+        for key, record in self._records.items():
+            if key not in seen:
+                diff.deleted.append(key)
+                diff.stale_doc_ids.extend(record.doc_ids)
+
+        # identical contents give identical doc IDs, the IDs of an unchanged file are still live.
+        live = {doc_id for key in diff.unchanged for doc_id in self._records[key].doc_ids}
+        diff.stale_doc_ids = [doc_id for doc_id in dict.fromkeys(diff.stale_doc_ids) if doc_id not in live]
+        return diff
+
+    def record(self, root: str, file: Union[str, Path], doc_ids: List[str]):
+        """Record the current state of a file and the IDs of the documents read from it."""
+        stat = os.stat(file)
+        self._records[self.key(root, file)] = FileRecord(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            file_hash=generate_file_hash(file),
+            doc_ids=list(doc_ids),
+        )
+
+    def remove(self, file_paths: Sequence[str]):
+        """Remove files from the manifest."""
+        for file_path in file_paths:
+            self._records.pop(file_path, None)
+
+    @staticmethod
+    def key(root: str, file: Union[str, Path]) -> str:
+        """Get the manifest key of a file (the posix path relative to the data directory)."""
+        return Path(os.path.relpath(file, root)).as_posix()
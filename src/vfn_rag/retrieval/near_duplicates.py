@@ -0,0 +1,294 @@
+"""Near-duplicate detection of documents with MinHash signatures and locality-sensitive hashing (LSH).
+
+`Storage.add_documents` only skips documents whose text is exactly the same (same SHA-256 ID). A re-exported PDF or
+a version of a report with a different header gets another ID and is embedded again. `NearDuplicateIndex` computes
+a MinHash signature of the word shingles of every document (or chunk) and keeps the signatures in an LSH index:
+the signature is cut in `bands` bands of `rows` values, and two documents are candidates if one of their bands is
+equal. Only the candidates are compared (with their signatures, which estimate the Jaccard similarity of the
+shingle sets), so the cost of a lookup does not grow with the number of documents. A text without words (empty or
+punctuation only) has no shingles and no meaningful signature, it is never a near-duplicate.
+
+The index is saved next to the store as `near_duplicates.npz`.
+"""
+
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+NEAR_DUPLICATES_FILE = "near_duplicates.npz"
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 5
+# the (Mersenne) prime of the universal hash functions, the hashes of the shingles are 32-bit.
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# the number of shingles hashed at a time, to bound the temporary (num_perm, n) matrix of long documents.
+HASH_CHUNK_SIZE = 8192
+
+__all__ = ["MinHasher", "NearDuplicateIndex", "optimal_bands"]
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Get the number of bands and rows per band of an LSH index for a Jaccard threshold.
+
+    Two documents with a Jaccard similarity `s` are candidates with a probability `1 - (1 - s**rows)**bands`. The
+    bands and rows are chosen to minimize the sum of the false positive probability (below the threshold) and the
+    false negative probability (above the threshold).
+
+    Parameters
+    ----------
+    threshold: float
+        The Jaccard similarity above which two documents are near-duplicates.
+    num_perm: int
+        The length of the signatures.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The number of bands and the number of rows per band.
+    """
+    best, best_error = (1, num_perm), np.inf
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        below = np.linspace(0, threshold, 100)
+        above = np.linspace(threshold, 1, 100)
+        false_positive = np.mean(1 - (1 - below**rows) ** bands) * threshold
+        false_negative = np.mean((1 - above**rows) ** bands) * (1 - threshold)
+        if false_positive + false_negative < best_error:
+            best, best_error = (bands, rows), false_positive + false_negative
+    return best
+
+
+def shingle_hashes(text: str, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    """Get the (unique) 32-bit hashes of the word shingles of a text (lower case, punctuation ignored)."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i : i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.unique(
+        np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    )
+
+
+class MinHasher:
+    """Compute the MinHash signatures of texts, with `num_perm` universal hash functions."""
+
+    def __init__(
+        self,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        seed: int = 0,
+    ):
+        """Initialize the hash functions.
+
+        Parameters
+        ----------
+        num_perm: int, optional, default is 128.
+            The length of the signatures, the error of the estimated Jaccard similarity is about
+            `1 / sqrt(num_perm)`.
+        shingle_size: int, optional, default is 5.
+            The number of consecutive words of a shingle.
+        seed: int, optional, default is 0.
+            The seed of the hash functions, the signatures are comparable only with the same seed.
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and the hashes < 2**32, so a * hash + b does not overflow 64 bits.
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Get the (num_perm,) MinHash signature of a text."""
+        return self._signature(shingle_hashes(text, self.shingle_size))
+
+    def _signature(self, hashes: np.ndarray) -> np.ndarray:
+        """Get the MinHash signature of the hashes of a set of shingles."""
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), HASH_CHUNK_SIZE):
+            chunk = hashes[start : start + HASH_CHUNK_SIZE]
+            permuted = (np.outer(self._a, chunk) + self._b[:, None]) % _PRIME & _MAX_HASH
+            signature = np.minimum(signature, permuted.min(axis=1))
+        return signature
+
+
+class NearDuplicateIndex:
+    """An LSH index of MinHash signatures to find the near-duplicates of documents.
+
+    The near-duplicates are not stored, they are linked to the first document of their group (the canonical
+    document), see `canonical_of`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        seed: int = 0,
+    ):
+        """Initialize an empty index.
+
+        Parameters
+        ----------
+        threshold: float, optional, default is 0.8.
+            The (estimated) Jaccard similarity of the shingles above which a document is a near-duplicate.
+        num_perm: int, optional, default is 128.
+            The length of the MinHash signatures.
+        shingle_size: int, optional, default is 5.
+            The number of consecutive words of a shingle.
+        seed: int, optional, default is 0.
+            The seed of the hash functions.
+        """
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+        self._canonical: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._signatures
+
+    @property
+    def duplicates(self) -> Dict[str, str]:
+        """The IDs of the near-duplicates that were found, mapped to the IDs of their canonical documents."""
+        return self._canonical
+
+    def canonical_of(self, doc_id: str) -> str:
+        """Get the ID of the canonical document of a near-duplicate, or the ID itself."""
+        return self._canonical.get(doc_id, doc_id)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.bands)
+        ]
+
+    def query(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Get the most similar indexed document of a signature above the threshold.
+
+        Parameters
+        ----------
+        signature: np.ndarray
+            The MinHash signature, see `MinHasher.signature`.
+
+        Returns
+        -------
+        Tuple[str, float]
+            The ID of the document and the estimated Jaccard similarity, None if there is no near-duplicate.
+        """
+        candidates = {
+            doc_id
+            for bucket, key in zip(self._buckets, self._band_keys(signature))
+            for doc_id in bucket.get(key, ())
+        }
+        best = None
+        for doc_id in sorted(candidates):
+            similarity = float(np.mean(self._signatures[doc_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (doc_id, similarity)
+        return best
+
+    def insert(self, doc_id: str, signature: np.ndarray):
+        """Add the signature of a document to the index."""
+        if doc_id in self._signatures:
+            return
+        self._signatures[doc_id] = signature
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(doc_id)
+
+    def check(self, doc_id: str, text: str) -> Optional[str]:
+        """Check if a document is a near-duplicate of an indexed document, and index it otherwise.
+
+        Parameters
+        ----------
+        doc_id: str
+            The ID of the document.
+        text: str
+            The text of the document (or chunk).
+
+        Returns
+        -------
+        str
+            The ID of the canonical document if the document is a near-duplicate (the link is recorded in
+            `duplicates`), None if the document was added to the index or has no shingles.
+        """
+        if doc_id in self._signatures:
+            return None
+        if doc_id in self._canonical:
+            return self._canonical[doc_id]
+        hashes = shingle_hashes(text, self.hasher.shingle_size)
+        if len(hashes) == 0:
+            # all the texts without shingles have the same signature, they are not compared (nor indexed).
+            return None
+        signature = self.hasher._signature(hashes)
+        match = self.query(signature)
+        if match is not None:
+            self._canonical[doc_id] = match[0]
+            return match[0]
+        self.insert(doc_id, signature)
+        return None
+
+    def remove(self, doc_ids: Sequence[str]):
+        """Remove documents from the index, and the links of their near-duplicates.
+
+        Parameters
+        ----------
+        doc_ids: Sequence[str]
+            The IDs of the documents, IDs that are not in the index are ignored.
+        """
+        removed = set(doc_ids)
+        for doc_id in removed:
+            signature = self._signatures.pop(doc_id, None)
+            if signature is None:
+                continue
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                bucket[key].remove(doc_id)
+                if not bucket[key]:
+                    del bucket[key]
+        self._canonical = {
+            doc_id: canonical
+            for doc_id, canonical in self._canonical.items()
+            if doc_id not in removed and canonical not in removed
+        }
+
+    def save(self, store_dir: str):
+        """Save the index to `store_dir/near_duplicates.npz`."""
+        doc_ids = list(self._signatures)
+        signatures = (
+            np.stack([self._signatures[doc_id] for doc_id in doc_ids])
+            if doc_ids
+            else np.empty((0, self.hasher.num_perm), dtype=np.uint64)
+        )
+        np.savez(
+            Path(store_dir) / NEAR_DUPLICATES_FILE,
+            parameters=np.array(
+                [self.threshold, self.hasher.num_perm, self.hasher.shingle_size, self.hasher.seed]
+            ),
+            doc_ids=np.array(doc_ids, dtype=str),
+            signatures=signatures,
+            duplicate_ids=np.array(list(self._canonical), dtype=str),
+            canonical_ids=np.array(list(self._canonical.values()), dtype=str),
+        )
+
+    @classmethod
+    def load(cls, store_dir: str) -> "NearDuplicateIndex":
+        """Load the index saved in a store directory, an empty index (default parameters) if there is none."""
+        path = Path(store_dir) / NEAR_DUPLICATES_FILE
+        if not path.exists():
+            return cls()
+        with np.load(path) as data:
+            threshold, num_perm, shingle_size, seed = data["parameters"].tolist()
+            index = cls(threshold, int(num_perm), int(shingle_size), int(seed))
+            for doc_id, signature in zip(data["doc_ids"].tolist(), data["signatures"]):
+                index.insert(doc_id, signature)
+            index._canonical = dict(
+                zip(data["duplicate_ids"].tolist(), data["canonical_ids"].tolist())
+            )
+        return index
@@ -0,0 +1,180 @@
+"""A local vector store with int8 (scalar) quantized embeddings.
+
+A 3072-dimensional float32 embedding takes 12 KB, which limits the number of vectors that can be kept in memory.
+`QuantizedVectorStore` keeps in memory an int8 code of every embedding with a per-vector scale (1 byte per
+dimension, 4 times less), and searches the codes with an asymmetric distance: the query stays in float32 and is
+compared with the dequantized codes. The full-precision embeddings are persisted as in `NumpyVectorStore` and
+memory-mapped when the store is loaded, so they stay on disk and only the rows of the best candidates are read to
+rescore them.
+"""
+
+from typing import Any, Dict, Optional
+import numpy as np
+from pydantic import Field, PrivateAttr
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from vfn_rag.retrieval.vector_store import NumpyVectorStore, top_k_indices, _decode
+
+DEFAULT_RESCORE_FACTOR = 4
+# the number of codes converted to float32 at a time when scoring, to bound the temporary memory.
+SCORE_CHUNK_SIZE = 2048
+
+__all__ = ["QuantizedVectorStore", "quantize"]
+
+
+def quantize(embeddings: np.ndarray) -> tuple:
+    """Quantize embeddings to int8 with one scale per vector (symmetric, max-abs scaling).
+
+    Parameters
+    ----------
+    embeddings: np.ndarray
+        The (n, dim) embeddings.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The (n, dim) int8 codes and the (n,) float32 scales, `embeddings ~= codes * scales[:, None]`.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scales = np.abs(embeddings).max(axis=1) / 127.0 if len(embeddings) else np.empty(0)
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class QuantizedVectorStore(NumpyVectorStore):
+    """A `NumpyVectorStore` searched through int8 codes, with optional rescoring in full precision.
+
+    The `rescore_factor * k` best candidates of the approximate search are rescored with the full-precision
+    embeddings, `rescore_factor = 0` returns the approximate scores.
+    """
+
+    rescore_factor: int = Field(
+        default=DEFAULT_RESCORE_FACTOR,
+        description="The number of candidates rescored in full precision, as a multiple of k (0 to disable).",
+        ge=0,
+    )
+
+    _codes: np.ndarray = PrivateAttr()
+    _scales: np.ndarray = PrivateAttr()
+
+    def __init__(
+        self,
+        codes: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize the store.
+
+        Parameters
+        ----------
+        codes: np.ndarray, optional, default is None.
+            The (n, dim) int8 codes of the embeddings, computed if not given.
+        scales: np.ndarray, optional, default is None.
+            The (n,) scales of the codes.
+        **kwargs:
+            The arrays of `NumpyVectorStore` and `rescore_factor`.
+        """
+        super().__init__(**kwargs)
+        if codes is None:
+            codes, scales = quantize(self._embeddings) if len(self._ids) else (
+                np.empty((0, 0), dtype=np.int8),
+                np.empty(0, dtype=np.float32),
+            )
+        self._codes = codes
+        self._scales = scales
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedVectorStore"
+
+    @property
+    def codes(self) -> np.ndarray:
+        """The (n, dim) int8 codes."""
+        self._consolidate()
+        return self._live(self._codes)
+
+    @property
+    def resident_bytes(self) -> int:
+        """The size of the arrays searched in memory (codes, scales and norms)."""
+        self._consolidate()
+        return self._codes.nbytes + self._scales.nbytes + self._norms.nbytes
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Get the top-k most similar nodes (cosine similarity), searched through the int8 codes."""
+        if query.filters is not None:
+            raise ValueError("QuantizedVectorStore does not support metadata filters.")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        self._consolidate()
+        rows = self._candidate_rows(query)
+        if self.count == 0 or (rows is not None and len(rows) == 0):
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        scores = self._approximate_scores(query_embedding, rows)
+        if rows is None:
+            rows = np.arange(len(self._ids))
+        if self.rescore_factor:
+            candidates = top_k_indices(scores, self.rescore_factor * query.similarity_top_k)
+            # read the full-precision rows in order, memory-mapped files are read sequentially.
+            candidates = np.sort(candidates)
+            rows = rows[candidates]
+            scores = self._scores(query_embedding, rows)
+        top = top_k_indices(scores, query.similarity_top_k)
+        return VectorStoreQueryResult(similarities=scores[top].tolist(), ids=_decode(self._ids[rows[top]]))
+
+    def _approximate_scores(
+        self, query_embedding: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Compute the cosine similarity between the float32 query and the dequantized codes (of some rows).
+
+        A large subset of rows is scored with contiguous slices of all the codes instead of gathered rows.
+        """
+        contiguous = rows is None or len(rows) > len(self._ids) // 2
+        selected = np.arange(len(self._ids)) if contiguous else rows
+        scores = np.empty(len(selected), dtype=np.float32)
+        for start in range(0, len(selected), SCORE_CHUNK_SIZE):
+            end = start + SCORE_CHUNK_SIZE
+            chunk = slice(start, end) if contiguous else rows[start:end]
+            codes = self._codes[chunk].astype(np.float32)
+            scores[start : start + len(codes)] = (codes @ query_embedding) * self._scales[chunk]
+        if contiguous and rows is not None:
+            scores = scores[rows]
+        norms = self._norms if rows is None else self._norms[rows]
+        query_norm = np.linalg.norm(query_embedding) or 1.0
+        return scores / (np.where(norms == 0, 1.0, norms) * query_norm)
+
+    def _consolidate(self):
+        """Append the buffered embeddings to the matrix and quantize them."""
+        if not self._pending:
+            return
+        new_embeddings = np.concatenate([embeddings for _, _, embeddings in self._pending])
+        super()._consolidate()
+        codes, scales = quantize(new_embeddings)
+        self._codes = np.concatenate([self._codes, codes]) if len(self._codes) else codes
+        self._scales = np.concatenate([self._scales, scales])
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = super()._arrays()
+        arrays.update(codes=self._live(self._codes), scales=self._live(self._scales))
+        return arrays
+
+    def _header(self) -> Dict[str, Any]:
+        header = super()._header()
+        header.update(rescore_factor=self.rescore_factor)
+        return header
+
+    @classmethod
+    def _load_arrays(cls, base: str, header: Dict[str, Any], mmap: bool) -> Dict[str, Any]:
+        kwargs = super()._load_arrays(base, header, mmap)
+        kwargs.update(
+            codes=np.load(f"{base}.codes.npy"),
+            scales=np.load(f"{base}.scales.npy"),
+            rescore_factor=header.get("rescore_factor", DEFAULT_RESCORE_FACTOR),
+        )
+        return kwargs
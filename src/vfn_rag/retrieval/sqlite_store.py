@@ -0,0 +1,237 @@
+"""A document store backed by SQLite.
+
+`SimpleDocumentStore` holds every node in a Python dict and persists the whole store as one JSON file.
+`SQLiteDocumentStore` keeps the nodes in a SQLite database (stdlib `sqlite3`) and reads them by ID on demand, so
+only the nodes that are actually used are held in memory. `document_exists` is a primary-key lookup. The writes
+are staged in one open transaction that saving the store (`persist`) commits, so adding documents does not pay for a
+commit per call, and the database on disk only changes when the store is saved.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.kvstore.types import BaseKVStore, DEFAULT_COLLECTION
+
+SQLITE_DOCSTORE_FNAME = "docstore.sqlite"
+DEFAULT_BATCH_SIZE = 1000
+
+__all__ = ["SQLiteKVStore", "SQLiteDocumentStore"]
+
+
+class SQLiteKVStore(BaseKVStore):
+    """A key-value store in a SQLite database.
+
+    All the collections are stored in one table with a (collection, key) primary key, the values are JSON. The puts
+    and deletes are staged in a transaction until `commit` (or `persist`), the store reads its own staged writes.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Open (or create) the database.
+
+        Parameters
+        ----------
+        path: str, optional, default is None.
+            The database file. If not given, a temporary file is used until the store is persisted.
+        """
+        self._is_temporary = path is None
+        self._cleanup = None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix=".sqlite", prefix="vfn-rag-docstore-")
+            os.close(fd)
+            # remove the temporary database if the store is never persisted.
+            self._cleanup = weakref.finalize(self, _remove_database, path)
+        self._path = str(path)
+        self._lock = threading.Lock()
+        self._conn = self._connect(self._path)
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (collection, key)) WITHOUT ROWID"
+        )
+        conn.commit()
+        return conn
+
+    @property
+    def path(self) -> str:
+        """The database file."""
+        return self._path
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """Write key-value pairs (staged until `commit`), `batch_size` pairs are serialized at a time."""
+        for start in range(0, len(kv_pairs), batch_size):
+            rows = [
+                (collection, key, json.dumps(val))
+                for key, val in kv_pairs[start : start + batch_size]
+            ]
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)",
+                    rows,
+                )
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM kv WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def keys(self, collection: str = DEFAULT_COLLECTION) -> List[str]:
+        """Get the keys of a collection without reading the values."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE collection = ?", (collection,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            )
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+    def commit(self):
+        """Commit the staged writes to the database file."""
+        with self._lock:
+            self._conn.commit()
+
+    def persist(self, persist_path: str):
+        """Save the database to a file.
+
+        A store opened from a temporary file moves to `persist_path` and keeps using it, so the next saves only
+        have to commit. A store opened from another file is copied to `persist_path`.
+        """
+        persist_path = str(persist_path)
+        self.commit()
+        if os.path.abspath(persist_path) == os.path.abspath(self._path):
+            return
+
+        os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+        with self._lock:
+            target = sqlite3.connect(persist_path)
+            self._conn.backup(target)
+            target.close()
+            if self._is_temporary:
+                self._conn.close()
+                self._cleanup()
+                self._path = persist_path
+                self._is_temporary = False
+                self._conn = self._connect(persist_path)
+
+    def close(self):
+        """Close the database, the writes that were not committed are discarded and a temporary database is removed."""
+        with self._lock:
+            self._conn.close()
+            if self._is_temporary:
+                self._cleanup()
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """A document store persisted in a SQLite database (`docstore.sqlite`)."""
+
+    def __init__(
+        self,
+        sqlite_kvstore: Optional[SQLiteKVStore] = None,
+        namespace: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """Initialize the document store.
+
+        Parameters
+        ----------
+        sqlite_kvstore: SQLiteKVStore, optional, default is None.
+            The key-value store, a temporary database is created if not given.
+        namespace: str, optional, default is None.
+            The namespace of the docstore collections.
+        batch_size: int, optional, default is 1000.
+            The number of documents serialized and written at a time.
+        """
+        super().__init__(
+            sqlite_kvstore or SQLiteKVStore(), namespace=namespace, batch_size=batch_size
+        )
+
+    @property
+    def kvstore(self) -> SQLiteKVStore:
+        return self._kvstore
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, **kwargs) -> "SQLiteDocumentStore":
+        """Open the document store saved in a directory."""
+        return cls(SQLiteKVStore(str(Path(persist_dir) / SQLITE_DOCSTORE_FNAME)), **kwargs)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        """Check if a directory contains a SQLite document store."""
+        return (Path(persist_dir) / SQLITE_DOCSTORE_FNAME).exists()
+
+    def persist(self, persist_path: str, fs=None) -> None:
+        """Save the document store.
+
+        Parameters
+        ----------
+        persist_path: str
+            The path given by the `StorageContext` (e.g. `<store_dir>/docstore.json`), the database is saved as
+            `docstore.sqlite` in the same directory.
+        """
+        self._kvstore.persist(str(Path(persist_path).parent / SQLITE_DOCSTORE_FNAME))
+
+    def get_document_ids(self) -> List[str]:
+        """Get the IDs of all the documents without reading them."""
+        return self._kvstore.keys(collection=self._node_collection)
+
+    def close(self):
+        self._kvstore.close()
+
+
+def _remove_database(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(f"{path}{suffix}"):
+            os.remove(f"{path}{suffix}")
@@ -1,35 +1,110 @@
 """A module for managing vector Storage and retrieval."""
 
 import os
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Sequence, Union, List
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Sequence, Union, List, Optional, Set, Tuple
 import pandas as pd
 from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.types import DEFAULT_PERSIST_FNAME as DOCSTORE_FNAME
 from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.index_store.keyval_index_store import (
+    DEFAULT_COLLECTION_SUFFIX,
+    DEFAULT_NAMESPACE,
+)
+from llama_index.core.storage.index_store.types import (
+    DEFAULT_PERSIST_FNAME as INDEX_STORE_FNAME,
+)
 from llama_index.core.vector_stores import SimpleVectorStore
 from llama_index.core import StorageContext
 from llama_index.core.schema import Document, TextNode
 from llama_index.core import SimpleDirectoryReader
 from llama_index.core.node_parser import TokenTextSplitter
+from llama_index.core.utils import get_tqdm_iterable
 from llama_index.core.extractors import (
     TitleExtractor,
     QuestionsAnsweredExtractor,
     KeywordExtractor,
     SummaryExtractor,
 )
+from vfn_rag.indexing.chunking import ContentDefinedSplitter
 from vfn_rag.retrieval.base_storage import BaseStorage
+from vfn_rag.retrieval.vector_store import NumpyVectorStore, load_vector_stores
+from vfn_rag.retrieval.ivf_store import IVFVectorStore
+from vfn_rag.retrieval.quantized_store import QuantizedVectorStore
+from vfn_rag.retrieval import journal
+from vfn_rag.retrieval.journal import JournaledKVStore, JournaledSimpleVectorStore
+from vfn_rag.retrieval.sqlite_store import SQLiteDocumentStore
+from vfn_rag.retrieval.manifest import FileManifest, ManifestDiff
+from vfn_rag.retrieval.near_duplicates import NearDuplicateIndex
+from vfn_rag.retrieval.keyword_index import KeywordIndex
 from vfn_rag.utils.helper_functions import generate_content_hash
 from vfn_rag.utils.errors import StorageNotFoundError
 
 
 EXTRACTORS = dict(
     text_splitter=TokenTextSplitter,
+    content_defined_splitter=ContentDefinedSplitter,
     title=TitleExtractor,
     question_answer=QuestionsAnsweredExtractor,
     summary=SummaryExtractor,
     keyword=KeywordExtractor,
 )
-ID_MAPPING_FILE = "metadata_index.csv"
+VECTOR_STORES = dict(
+    simple=JournaledSimpleVectorStore,
+    numpy=NumpyVectorStore,
+    ivf=IVFVectorStore,
+    quantized=QuantizedVectorStore,
+)
+DOCSTORES = dict(
+    simple=SimpleDocumentStore,
+    sqlite=SQLiteDocumentStore,
+)
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMPACT_THRESHOLD = 64 * 2**20
+
+
+@dataclass
+class IngestionSummary:
+    """Summary of an `add_documents` call.
+
+    Attributes
+    ----------
+    added: List[str]
+        IDs of the documents that were not in the docstore and have been added.
+    updated: List[str]
+        IDs of the documents that already existed and have been overwritten.
+    skipped: List[str]
+        IDs of the documents that already existed (or were duplicated in the input) and were not written.
+    near_duplicates: Dict[str, str]
+        IDs of the near-duplicates that were not written, mapped to the IDs of their canonical documents (only
+        with a `NearDuplicateIndex`).
+    """
+
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    near_duplicates: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def num_added(self) -> int:
+        return len(self.added)
+
+    @property
+    def num_updated(self) -> int:
+        return len(self.updated)
+
+    @property
+    def num_skipped(self) -> int:
+        return len(self.skipped)
+
+    @property
+    def reuse_ratio(self) -> float:
+        """The fraction of the input that was already stored (e.g. the chunks of an edited document that are
+        unchanged with `ContentDefinedSplitter`, and do not need to be embedded again)."""
+        total = self.num_added + self.num_updated + self.num_skipped
+        return self.num_skipped / total if total else 0.0
 
 
 class Storage(BaseStorage):
@@ -47,21 +122,50 @@ class Storage(BaseStorage):
             will be created. default=None.
         """
         super().__init__(storage_backend)
+        # the snapshot the journals are relative to, see `save`.
+        self._snapshot_dir = None
 
     @classmethod
-    def create(cls) -> "Storage":
-        """Create a new instance of the Storage class."""
-        storage = cls._create_simple_storage_context()
+    def create(cls, vector_store: str = "simple", docstore: str = "simple") -> "Storage":
+        """Create a new instance of the Storage class.
+
+        Parameters
+        ----------
+        vector_store: str, optional, default is "simple".
+            The local vector store to use, one of the keys of `VECTOR_STORES`: "simple" (llama_index
+            `SimpleVectorStore`, persisted as JSON), "numpy" (`NumpyVectorStore`, persisted as a binary float32
+            matrix that is memory-mapped on load), "ivf" (`IVFVectorStore`, a `NumpyVectorStore` with an
+            approximate nearest-neighbour index) or "quantized" (`QuantizedVectorStore`, searched through int8
+            codes, the full-precision embeddings stay on disk).
+        docstore: str, optional, default is "simple".
+            The document store to use, one of the keys of `DOCSTORES`: "simple" (llama_index `SimpleDocumentStore`,
+            held in memory and persisted as JSON) or "sqlite" (`SQLiteDocumentStore`, kept on disk and read by ID).
+        """
+        storage = cls._create_simple_storage_context(vector_store, docstore)
         return cls(storage)
 
     @staticmethod
-    def _create_simple_storage_context() -> StorageContext:
+    def _create_simple_storage_context(
+        vector_store: str = "simple", docstore: str = "simple"
+    ) -> StorageContext:
         """Create a simple Storage context."""
-        return StorageContext.from_defaults(
-            docstore=SimpleDocumentStore(),
-            vector_store=SimpleVectorStore(),
-            index_store=SimpleIndexStore(),
+        if vector_store not in VECTOR_STORES:
+            raise ValueError(
+                f"Unknown vector store: {vector_store}, available: {list(VECTOR_STORES)}"
+            )
+        if docstore not in DOCSTORES:
+            raise ValueError(f"Unknown docstore: {docstore}, available: {list(DOCSTORES)}")
+
+        if docstore == "simple":
+            docstore = SimpleDocumentStore(simple_kvstore=JournaledKVStore())
+        else:
+            docstore = DOCSTORES[docstore]()
+        storage = StorageContext.from_defaults(
+            docstore=docstore,
+            vector_store=VECTOR_STORES[vector_store](),
+            index_store=SimpleIndexStore(simple_kvstore=JournaledKVStore()),
         )
+        return _journal_simple_vector_stores(storage)
 
     @staticmethod
     def _create_metadata_index():
@@ -70,28 +174,162 @@ class Storage(BaseStorage):
         return pd.DataFrame(columns=["file_name", "doc_id"])
 
 
-    def save(self, store_dir: str):
+    def save(
+        self,
+        store_dir: str,
+        incremental: bool = False,
+        compact_threshold: int = DEFAULT_COMPACT_THRESHOLD,
+    ):
         """Save the store to a directory.
 
+            By default the whole store is written (a snapshot). With `incremental=True`, only the records that
+            changed since the store was loaded from or saved to `store_dir` are appended to a new segment of the
+            write-ahead log (the `wal` directory next to the snapshot), so the cost of the save depends on the size of
+            the change and not on the size of the store. The segments are replayed by `load`, and are compacted into a
+            new snapshot by `compact`, or automatically once their total size exceeds `compact_threshold`.
+
+            A full save is done instead if there is no snapshot of this store in `store_dir` yet, if the
+            storage context was not created by `Storage.create`/`Storage.load` (its changes are not journaled), or
+            if a vector store needs training (`IVFVectorStore.needs_training`): the index is trained by the full
+            save, the write-ahead log only holds the embeddings.
+
         Parameters
         ----------
         store_dir: str
             The directory to save the store.
+        incremental: bool, optional, default is False.
+            True to append the changes to the write-ahead log instead of writing the whole store.
+        compact_threshold: int, optional, default is 64 MB.
+            The size (in bytes) of the write-ahead log above which the store is compacted.
 
         Returns
         -------
         None
         """
+        if not incremental or not self._can_journal(store_dir) or self._needs_training():
+            self.compact(store_dir)
+            return
+
+        journal.write_segment(store_dir, self._journal_records())
+        if isinstance(self.docstore, SQLiteDocumentStore):
+            # the SQLite docstore stages its writes in its own database, the save commits them.
+            self.docstore.kvstore.commit()
+        self._mark_saved(store_dir)
+        if journal.wal_size(store_dir) > compact_threshold:
+            self.compact(store_dir)
+
+    def compact(self, store_dir: str):
+        """Write a full snapshot of the store and remove the write-ahead log.
+
+        Parameters
+        ----------
+        store_dir: str
+            The directory to save the store.
+        """
         self.store.persist(persist_dir=store_dir)
+        journal.mark_snapshot(store_dir)
+        journal.clear_segments(store_dir)
+        self._mark_saved(store_dir)
+
+    def _needs_training(self) -> bool:
+        """Check if a vector store has an index to (re)train, which is only saved by a full save."""
+        return any(
+            getattr(vector_store, "needs_training", False)
+            for vector_store in self.store.vector_stores.values()
+        )
+
+    def _journaled_kvstores(self) -> dict:
+        """Get the journaled key-value stores of the docstore and index store."""
+        # the kvstores are private in llama_index, they are only journaled if created by this class.
+        kvstores = {
+            "docstore": getattr(self.docstore, "_kvstore", None),
+            "index_store": getattr(self.index_store, "_kvstore", None),
+        }
+        return {
+            name: kvstore
+            for name, kvstore in kvstores.items()
+            if isinstance(kvstore, JournaledKVStore)
+        }
+
+    def _can_journal(self, store_dir: str) -> bool:
+        kvstores = self._journaled_kvstores()
+        # a SQLite docstore saved in the store directory stages its changes in place and needs no journal.
+        docstore_journaled = "docstore" in kvstores or (
+            isinstance(self.docstore, SQLiteDocumentStore)
+            and Path(self.docstore.kvstore.path).parent.resolve()
+            == Path(store_dir).resolve()
+        )
+        return (
+            self._snapshot_dir == Path(store_dir).resolve()
+            and docstore_journaled
+            and "index_store" in kvstores
+            and all(
+                journal.is_journaled_vector_store(vector_store)
+                for vector_store in self.store.vector_stores.values()
+            )
+        )
+
+    def _journal_records(self) -> List[dict]:
+        """Get the records that changed since the last save."""
+        records = []
+        for name, kvstore in self._journaled_kvstores().items():
+            for operation, collection, key, value in kvstore.journal:
+                records.append(
+                    dict(store=name, op=operation, collection=collection, key=key, value=value)
+                )
+
+        # only the nodes the vector stores recorded as changed are read, not all the node IDs.
+        for namespace, vector_store in self.store.vector_stores.items():
+            for node_id in vector_store.changed_ids:
+                value = journal.vector_record(vector_store, node_id)
+                record = dict(store=f"{journal.VECTOR_STORE_PREFIX}{namespace}", key=node_id)
+                if value is None:
+                    record.update(op="delete")
+                else:
+                    record.update(op="put", value=value)
+                records.append(record)
+        return records
+
+    def _replay_journal(self, store_dir: str):
+        """Apply the write-ahead log segments of a snapshot to the store."""
+        kvstores = self._journaled_kvstores()
+        vector_records = {}
+        for record in journal.read_segments(store_dir):
+            name = record["store"]
+            if name.startswith(journal.VECTOR_STORE_PREFIX):
+                namespace = name[len(journal.VECTOR_STORE_PREFIX) :]
+                vector_records.setdefault(namespace, {})[record["key"]] = record.get("value")
+            else:
+                kvstores[name].replay(
+                    record["op"], record["collection"], record["key"], record.get("value")
+                )
+
+        for namespace, records in vector_records.items():
+            journal.replay_vector_records(self.store.vector_stores[namespace], records)
+
+    def _mark_saved(self, store_dir: str):
+        """Reset the journals, the store in `store_dir` is now up to date."""
+        self._snapshot_dir = Path(store_dir).resolve()
+        for kvstore in self._journaled_kvstores().values():
+            kvstore.clear_journal()
+        for vector_store in self.store.vector_stores.values():
+            if journal.is_journaled_vector_store(vector_store):
+                vector_store.clear_changed_ids()
 
     @classmethod
-    def load(cls, store_dir: str) -> "Storage":
+    def load(cls, store_dir: str, mmap: bool = True) -> "Storage":
         """Load the store from a directory.
 
+            Each vector store is loaded with the class that saved it, see `load_vector_stores`, a `docstore.sqlite`
+            file is opened as a `SQLiteDocumentStore` (the documents are read on demand), and the segments of
+            the write-ahead log written by incremental saves are replayed on top of the snapshot.
+
         Parameters
         ----------
         store_dir: str
             The directory containing the store.
+        mmap: bool, optional, default is True.
+            True to memory-map the embeddings of a `NumpyVectorStore` instead of reading them into memory.
 
         Returns
         -------
@@ -100,34 +338,90 @@ class Storage(BaseStorage):
         if not Path(store_dir).exists():
             raise StorageNotFoundError(f"Storage not found at {store_dir}")
 
-        storage = StorageContext.from_defaults(persist_dir=store_dir)
-        return cls(storage)
+        vector_stores = load_vector_stores(store_dir, mmap=mmap)
+        if SQLiteDocumentStore.exists(store_dir):
+            docstore = SQLiteDocumentStore.from_persist_dir(store_dir)
+        else:
+            docstore = SimpleDocumentStore(
+                simple_kvstore=JournaledKVStore.from_persist_path(
+                    os.path.join(store_dir, DOCSTORE_FNAME)
+                )
+            )
+        index_store = SimpleIndexStore(
+            simple_kvstore=JournaledKVStore.from_persist_path(
+                os.path.join(store_dir, INDEX_STORE_FNAME)
+            )
+        )
+        storage = StorageContext.from_defaults(
+            persist_dir=store_dir,
+            docstore=docstore,
+            index_store=index_store,
+            vector_stores=vector_stores or None,
+        )
+        storage = cls(_journal_simple_vector_stores(storage))
+        storage._replay_journal(store_dir)
+        storage._mark_saved(store_dir)
+        return storage
 
     def add_documents(
         self,
-        docs: Sequence[Union[Document, TextNode]],
+        docs: Iterable[Union[Document, TextNode]],
         generate_id: bool = True,
         update: bool = False,
-    ):
+        bulk: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+    ) -> IngestionSummary:
         """Add node/documents to the store.
 
             The `add_documents` method adds a node to the store. The node's id is a sha256 hash generated based on the
             node's text content. if the `update` parameter is True and the nodes already exist the existing node will
             be updated.
 
+            In `bulk` mode the existence check is done once for the whole input using set operations on the IDs
+            already in the docstore, the new documents are written to the docstore in batches of `batch_size`, and
+            nothing is printed for the skipped duplicates. The input is consumed one batch at a time, so it can be a
+            generator (e.g. the chained batches of `iter_documents`) and the ingestion runs in bounded memory.
+
+            With a `near_duplicates` index, the new documents (or chunks) whose MinHash signature is similar to the
+            signature of an indexed document above the index's Jaccard threshold are not written, they are linked
+            to their canonical document in the index and listed in `IngestionSummary.near_duplicates`. The index
+            should be saved next to the store (`NearDuplicateIndex.save(store_dir)`).
+
+            With a `keyword_index`, the added and updated documents are also added to the BM25 index (see
+            `HybridRetriever`), which should be saved next to the store as well (`KeywordIndex.save(store_dir)`).
+
         Parameters
         ----------
-        docs: Sequence[TextNode/Document]
+        docs: Iterable[TextNode/Document]
             The node/documents to add to the store.
         generate_id: bool, optional, default is False.
-            True if you want to generate a sha256 hash number as a doc_id based on the content of the nodes
+            True if you want to generate a sha256 hash number as a doc_id based on the content of the nodes,
+            False to keep the IDs of the nodes (e.g. the chunk IDs of `ContentDefinedSplitter`).
         update: bool, optional, default is True.
             True to update the document in the docstore if it already exist.
+        bulk: bool, optional, default is False.
+            True to check and write the documents in batches instead of one by one.
+        batch_size: int, optional, default is 1000.
+            The number of documents written to the docstore per batch (only used if `bulk` is True).
+        near_duplicates: NearDuplicateIndex, optional, default is None.
+            The index used to skip the near-duplicates of the documents already in the store, e.g.
+            `NearDuplicateIndex.load(store_dir)`. It is updated in place.
+        keyword_index: KeywordIndex, optional, default is None.
+            The keyword index of the store, e.g. `KeywordIndex.load(store_dir)`. It is updated in place.
 
         Returns
         -------
-        None
+        IngestionSummary
+            The IDs of the added, updated, skipped and near-duplicate documents.
         """
+        if bulk:
+            return self._bulk_add_documents(
+                docs, generate_id, update, batch_size, near_duplicates, keyword_index
+            )
+
+        summary = IngestionSummary()
         new_entries = []
         file_names = []
         # Create a metadata-based index
@@ -136,8 +430,20 @@ class Storage(BaseStorage):
             if generate_id:
                 doc.node_id = generate_content_hash(doc.text)
 
-            if not self.docstore.document_exists(doc.node_id) or update:
+            exists = self.docstore.document_exists(doc.node_id)
+            if not exists and near_duplicates is not None:
+                canonical_id = near_duplicates.check(doc.node_id, doc.text)
+                if canonical_id is not None:
+                    summary.near_duplicates[doc.node_id] = canonical_id
+                    continue
+            if not exists or update:
                 self.docstore.add_documents([doc], allow_update=update)
+                if keyword_index is not None:
+                    keyword_index.add_documents([doc])
+                if exists:
+                    summary.updated.append(doc.node_id)
+                else:
+                    summary.added.append(doc.node_id)
                 # Update the metadata index with file name as key and doc_id as value
                 file_name = os.path.basename(doc.metadata["file_path"])
                 if file_name in file_names:
@@ -145,6 +451,7 @@ class Storage(BaseStorage):
                 new_entries.append({"file_name": file_name, "doc_id": doc.node_id})
                 file_names.append(file_name)
             else:
+                summary.skipped.append(doc.node_id)
                 print(f"Document with ID {doc.node_id} already exists. Skipping.")
 
         # Convert new entries to a DataFrame and append to the existing metadata DataFrame
@@ -153,6 +460,114 @@ class Storage(BaseStorage):
         #     # self._metadata_index = pd.concat(
         #     #     [self._metadata_index, new_entries_df], ignore_index=True
         #     # )
+        return summary
+
+    def delete_documents(
+        self,
+        doc_ids: Sequence[str],
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+    ):
+        """Delete documents from the docstore.
+
+        Parameters
+        ----------
+        doc_ids: Sequence[str]
+            The IDs of the documents to delete, IDs that are not in the docstore are ignored.
+        near_duplicates: NearDuplicateIndex, optional, default is None.
+            The near-duplicate index of the store, the documents (and the links to them) are removed from it.
+        keyword_index: KeywordIndex, optional, default is None.
+            The keyword index of the store, the documents are removed from it.
+        """
+        for doc_id in doc_ids:
+            self.docstore.delete_document(doc_id, raise_error=False)
+        if near_duplicates is not None:
+            near_duplicates.remove(doc_ids)
+        if keyword_index is not None:
+            keyword_index.remove(doc_ids)
+
+    def document_ids(self) -> Set[str]:
+        """Get the IDs of all the documents in the docstore, without deserializing the documents.
+
+        Returns
+        -------
+        Set[str]
+            The document IDs.
+        """
+        if isinstance(self.docstore, SQLiteDocumentStore):
+            return set(self.docstore.get_document_ids())
+        # the keys of the node collection (the document hashes map a hash to one of the documents sharing it).
+        kvstore = getattr(self.docstore, "_kvstore", None)
+        collection = getattr(self.docstore, "_node_collection", None)
+        if kvstore is None or collection is None:
+            return set(self.docstore.docs)
+        return set(kvstore.get_all(collection=collection))
+
+    def index_ids(self) -> List[str]:
+        """Get the IDs of the indexes in the index store.
+
+        The IDs are read from the keys of the index store without deserializing the index structs if the index
+        store was created by `Storage.create`/`Storage.load`.
+
+        Returns
+        -------
+        List[str]
+            The index IDs.
+        """
+        kvstore = self._journaled_kvstores().get("index_store")
+        if kvstore is None:
+            return [index_struct.index_id for index_struct in self.index_store.index_structs()]
+        return list(kvstore.get_all(collection=f"{DEFAULT_NAMESPACE}{DEFAULT_COLLECTION_SUFFIX}"))
+
+    def _bulk_add_documents(
+        self,
+        docs: Iterable[Union[Document, TextNode]],
+        generate_id: bool,
+        update: bool,
+        batch_size: int,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+    ) -> IngestionSummary:
+        """Add documents to the docstore in batches (see `add_documents`)."""
+        summary = IngestionSummary()
+        existing_ids = self.document_ids()
+        seen_ids = set()
+        docs = iter(docs)
+        # consume the input one batch at a time, so an iterator of documents is never fully held in memory.
+        while batch := list(islice(docs, batch_size)):
+            if generate_id:
+                for doc in batch:
+                    doc.node_id = generate_content_hash(doc.text)
+
+            to_write = []
+            for doc in batch:
+                doc_id = doc.node_id
+                # keep the first occurrence of a document that appears more than once in the input
+                if doc_id in seen_ids:
+                    summary.skipped.append(doc_id)
+                    continue
+                seen_ids.add(doc_id)
+                if doc_id not in existing_ids:
+                    if near_duplicates is not None:
+                        canonical_id = near_duplicates.check(doc_id, doc.text)
+                        if canonical_id is not None:
+                            summary.near_duplicates[doc_id] = canonical_id
+                            continue
+                    summary.added.append(doc_id)
+                elif update:
+                    summary.updated.append(doc_id)
+                else:
+                    summary.skipped.append(doc_id)
+                    continue
+                to_write.append(doc)
+
+            if to_write:
+                # existence was already checked, so the docstore does not need to check it again per document
+                self.docstore.add_documents(to_write, allow_update=True)
+                if keyword_index is not None:
+                    keyword_index.add_documents(to_write)
+
+        return summary
 
     @staticmethod
     def read_documents(
@@ -191,6 +606,122 @@ class Storage(BaseStorage):
             show_progress=show_progres, num_workers=num_workers, **kwargs
         )
 
+        return Storage._prepare_documents(documents)
+
+    @staticmethod
+    def iter_documents(
+        path: str,
+        batch_size: Optional[int] = None,
+        max_batch_bytes: Optional[int] = None,
+        show_progres: bool = False,
+        recursive: bool = False,
+        **kwargs,
+    ) -> Iterator[List[Union[Document, TextNode]]]:
+        """Read documents from a directory as a stream of batches.
+
+        Unlike `read_documents`, the files are parsed one at a time and the documents are yielded as soon as a
+        batch is full, so the memory used does not grow with the size of the directory. The documents are
+        prepared the same way as in `read_documents`.
+
+        Parameters
+        ----------
+        path: str
+            path to the directory containing the documents.
+        batch_size: int, optional, default is None.
+            The maximum number of documents per batch.
+        max_batch_bytes: int, optional, default is None.
+            The maximum size of the text (in UTF-8 bytes) of the documents in a batch. A batch is yielded as soon as
+            it reaches the limit. If neither `batch_size` nor `max_batch_bytes` is given, one batch is yielded per
+            file.
+        show_progres: bool, optional, default is False.
+            True to show progress bar.
+        recursive: bool, optional, default is False.
+            True to read from subdirectories.
+
+        Yields
+        ------
+        List[Union[Document, TextNode]]
+            A batch of documents. The batches can be chained (`itertools.chain.from_iterable`) and passed to
+            `add_documents(..., bulk=True)`, or passed to `IndexManager.create_from_documents`.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Directory not found: {path}")
+
+        reader = SimpleDirectoryReader(path, recursive=recursive, **kwargs)
+        batch, batch_bytes = [], 0
+        for file_docs in reader.iter_data(show_progress=show_progres):
+            if batch_size is None and max_batch_bytes is None:
+                yield Storage._prepare_documents(file_docs)
+                continue
+
+            for doc in Storage._prepare_documents(file_docs):
+                batch.append(doc)
+                batch_bytes += len(doc.text.encode("utf-8"))
+                if (batch_size is not None and len(batch) >= batch_size) or (
+                    max_batch_bytes is not None and batch_bytes >= max_batch_bytes
+                ):
+                    yield batch
+                    batch, batch_bytes = [], 0
+
+        if batch:
+            yield batch
+
+    @staticmethod
+    def read_changed_documents(
+        path: str,
+        manifest: FileManifest,
+        show_progres: bool = False,
+        recursive: bool = False,
+        **kwargs,
+    ) -> Tuple[List[Union[Document, TextNode]], ManifestDiff]:
+        """Read only the new and modified files of a directory.
+
+        The files are compared with the `manifest` (see `FileManifest.diff`), only the new and modified files are
+        parsed, and the manifest is updated in place with the files' current state and their document IDs. Deleted
+        files are removed from the manifest. The IDs of the documents read from the modified and deleted files are
+        returned in `ManifestDiff.stale_doc_ids`, so they can be removed from the store with `delete_documents`.
+
+        Parameters
+        ----------
+        path: str
+            path to the directory containing the documents.
+        manifest: FileManifest
+            The manifest of the files already in the store, e.g. `FileManifest.load(store_dir)`.
+        show_progres: bool, optional, default is False.
+            True to show progress bar.
+        recursive: bool, optional, default is False.
+            True to read from subdirectories.
+
+        Returns
+        -------
+        Tuple[List[Union[Document, TextNode]], ManifestDiff]
+            The documents read from the new and modified files, and the difference between the directory and the
+            manifest.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Directory not found: {path}")
+
+        reader = SimpleDirectoryReader(path, recursive=recursive, **kwargs)
+        files = {FileManifest.key(path, file): file for file in reader.input_files}
+        diff = manifest.diff(path, list(files.values()))
+
+        documents = []
+        for key in get_tqdm_iterable(diff.changed, show_progres, "Loading files"):
+            # read the changed files one by one to know which documents come from which file.
+            file = files[key]
+            reader.input_files = [file]
+            file_docs = Storage._prepare_documents(reader.load_data())
+            manifest.record(path, file, [doc.doc_id for doc in file_docs])
+            documents.extend(file_docs)
+
+        manifest.remove(diff.deleted)
+        return documents, diff
+
+    @staticmethod
+    def _prepare_documents(
+        documents: List[Union[Document, TextNode]],
+    ) -> List[Union[Document, TextNode]]:
+        """Set the excluded metadata keys and the content-hash ID of the documents read from files."""
         for doc in documents:
             # exclude the file name from the llm metadata in order to avoid affecting the llm by weird file names
             doc.excluded_llm_metadata_keys = ["file_name"]
@@ -202,3 +733,12 @@ class Storage(BaseStorage):
             doc.doc_id = content_hash
 
         return documents
+
+
+def _journal_simple_vector_stores(storage: StorageContext) -> StorageContext:
+    """Replace the `SimpleVectorStore`s of a storage context (e.g. the image store llama_index adds) with
+    `JournaledSimpleVectorStore`s sharing their data."""
+    for namespace, vector_store in list(storage.vector_stores.items()):
+        if type(vector_store) is SimpleVectorStore:
+            storage.add_vector_store(JournaledSimpleVectorStore(data=vector_store.data), namespace)
+    return storage
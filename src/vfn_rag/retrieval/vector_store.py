@@ -0,0 +1,644 @@
+"""A local vector store that keeps the embeddings in binary NumPy files.
+
+`SimpleVectorStore` persists the embeddings as JSON lists of floats, which makes the files large and slow to parse.
+`NumpyVectorStore` keeps the embeddings in one contiguous float32 matrix, persisted as a `.npy` file next to a small
+JSON header, and memory-maps it when the store is loaded, so loading does not depend on the size of the store.
+The memory-mapped matrix is never copied after loading: the embeddings added later are appended to a separate
+matrix (itself memory-mapped from a temporary file), the deleted rows are masked out, and the rows are compacted
+when the store is persisted.
+Queries score all the vectors with one matrix-vector product and select the top-k with `argpartition`, and a batch
+of queries is scored with one matrix-matrix product (`query_batch`).
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import fsspec
+from pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+VECTOR_STORE_SUFFIX = "__vector_store.json"
+# the maximum size of the (queries, vectors) score matrix computed at once by `query_batch`.
+BATCH_SCORE_SIZE = 2**24
+# the number of rows copied at a time when persisting the embeddings.
+PERSIST_CHUNK_SIZE = 65536
+
+__all__ = ["NumpyVectorStore", "load_vector_stores", "batch_query"]
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """A vector store backed by a float32 NumPy matrix.
+
+    The store is persisted as a JSON header (at the path given by the `StorageContext`, e.g.
+    `default__vector_store.json`) and the binary arrays next to it:
+
+    - `<name>.embeddings.npy`: the (n, dim) float32 embeddings.
+    - `<name>.norms.npy`: the L2 norm of every embedding, used for the cosine similarity.
+    - `<name>.ids.npy` / `<name>.ref_doc_ids.npy`: the node IDs and their ref_doc_ids as UTF-8 bytes.
+
+    Metadata filters are not supported, queries can only be restricted with `node_ids` and `doc_ids`.
+    """
+
+    stores_text: bool = False
+    is_embedding_query: bool = True
+
+    # the rows are those of `_embeddings` followed by those of `_appended`, `_norms`, `_ids` and `_ref_doc_ids`
+    # have one entry per row and `_deleted` masks the deleted rows (None if no row was deleted).
+    _embeddings: np.ndarray = PrivateAttr()
+    _appended: np.ndarray = PrivateAttr()
+    _appended_file: Any = PrivateAttr(default=None)
+    _deleted: Optional[np.ndarray] = PrivateAttr(default=None)
+    _norms: np.ndarray = PrivateAttr()
+    _ids: np.ndarray = PrivateAttr()
+    _ref_doc_ids: np.ndarray = PrivateAttr()
+    _pending: List[tuple] = PrivateAttr(default_factory=list)
+    _id_to_row: Optional[Dict[str, int]] = PrivateAttr(default=None)
+    _changed_ids: Dict[str, None] = PrivateAttr(default_factory=dict)
+
+    def __init__(
+        self,
+        embeddings: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None,
+        ref_doc_ids: Optional[np.ndarray] = None,
+        norms: Optional[np.ndarray] = None,
+        **kwargs: Any,
+    ) -> None:
+        """Initialize the store.
+
+        Parameters
+        ----------
+        embeddings: np.ndarray, optional, default is None.
+            The (n, dim) float32 embeddings, can be a memory-mapped array.
+        ids: np.ndarray, optional, default is None.
+            The node IDs (bytes array) of the embeddings.
+        ref_doc_ids: np.ndarray, optional, default is None.
+            The ref_doc_ids (bytes array) of the nodes.
+        norms: np.ndarray, optional, default is None.
+            The L2 norms of the embeddings, computed if not given.
+        """
+        super().__init__(**kwargs)
+        if embeddings is None:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+            ids = np.empty(0, dtype="S1")
+            ref_doc_ids = np.empty(0, dtype="S1")
+        if norms is None:
+            norms = np.linalg.norm(embeddings, axis=1).astype(np.float32)
+        self._embeddings = embeddings
+        self._appended = np.empty((0, embeddings.shape[1]), dtype=np.float32)
+        self._norms = norms
+        self._ids = ids
+        self._ref_doc_ids = ref_doc_ids
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The (n, dim) float32 embeddings.
+
+        The memory-mapped matrix itself if no embedding was added or deleted since the store was loaded, a copy
+        otherwise.
+        """
+        self._consolidate()
+        if self._deleted is None and len(self._appended) == 0:
+            return self._embeddings
+        return self._take(self._live_rows())
+
+    @property
+    def node_ids(self) -> List[str]:
+        self._consolidate()
+        return _decode(self._live(self._ids))
+
+    @property
+    def count(self) -> int:
+        """The number of vectors in the store."""
+        # not `__len__`: llama_index checks the truthiness of vector stores, an empty store must not be falsy.
+        self._consolidate()
+        count = len(self._ids)
+        if self._deleted is not None:
+            count -= int(np.count_nonzero(self._deleted))
+        return count
+
+    @property
+    def changed_ids(self) -> List[str]:
+        """The IDs of the nodes added, re-added or deleted since `clear_changed_ids` (e.g. since the last save)."""
+        return list(self._changed_ids)
+
+    def clear_changed_ids(self):
+        self._changed_ids = {}
+
+    def get(self, text_id: str) -> List[float]:
+        """Get the embedding of a node."""
+        self._consolidate()
+        return self._take(np.array([self._row_index()[text_id]]))[0].tolist()
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Add nodes to the store.
+
+        The new embeddings are buffered and appended to the matrix the next time it is needed, so adding many
+        small batches does not copy the matrix every time. A node that is already in the store is replaced.
+        """
+        if not nodes:
+            return []
+        embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        ids = _encode([node.node_id for node in nodes])
+        ref_doc_ids = _encode([node.ref_doc_id or "None" for node in nodes])
+        self._pending.append((ids, ref_doc_ids, embeddings))
+        node_ids = [node.node_id for node in nodes]
+        self._changed_ids.update(dict.fromkeys(node_ids))
+        return node_ids
+
+    def add_embeddings(
+        self,
+        node_ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        ref_doc_ids: Sequence[str],
+    ):
+        """Add embeddings without building nodes, e.g. when replaying a journal."""
+        if not node_ids:
+            return
+        self._changed_ids.update(dict.fromkeys(node_ids))
+        self._pending.append(
+            (
+                _encode(node_ids),
+                _encode(ref_doc_ids),
+                np.asarray(embeddings, dtype=np.float32),
+            )
+        )
+
+    def get_ref_doc_id(self, text_id: str) -> str:
+        """Get the ref_doc_id of a node."""
+        self._consolidate()
+        return self._ref_doc_ids[self._row_index()[text_id]].decode("utf-8")
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete the nodes of a document.
+
+        Parameters
+        ----------
+        ref_doc_id: str
+            The doc_id of the document to delete.
+        """
+        self._consolidate()
+        self._delete(self._ref_doc_ids == ref_doc_id.encode("utf-8"))
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Any = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        """Delete nodes by ID."""
+        if filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if node_ids is None:
+            return
+        self._consolidate()
+        self._delete(np.isin(self._ids, _encode(node_ids)))
+
+    def clear(self) -> None:
+        """Clear the store."""
+        self._pending = []
+        self._delete(np.ones(len(self._ids), dtype=bool))
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """Get the top-k most similar nodes (cosine similarity)."""
+        if query.filters is not None:
+            raise ValueError("NumpyVectorStore does not support metadata filters.")
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        self._consolidate()
+        rows = self._candidate_rows(query)
+        if self.count == 0 or (rows is not None and len(rows) == 0):
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        query_embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        scores = self._scores(query_embedding, rows)
+        top = top_k_indices(scores, query.similarity_top_k)
+        ids = self._ids[top] if rows is None else self._ids[rows[top]]
+        return VectorStoreQueryResult(similarities=scores[top].tolist(), ids=_decode(ids))
+
+    def query_batch(
+        self, query_embeddings: np.ndarray, similarity_top_k: int
+    ) -> List[VectorStoreQueryResult]:
+        """Get the top-k most similar nodes (cosine similarity) of several queries at once.
+
+        The exact store scores all the queries with one matrix-matrix product. The subclasses overriding `query`
+        (approximate search through inverted lists or quantized codes) are queried one query at a time.
+
+        Parameters
+        ----------
+        query_embeddings: np.ndarray
+            The (num_queries, dim) embeddings of the queries.
+        similarity_top_k: int
+            The number of nodes per query.
+
+        Returns
+        -------
+        List[VectorStoreQueryResult]
+            The result of every query.
+        """
+        if type(self).query is not NumpyVectorStore.query:
+            return [
+                self.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=similarity_top_k))
+                for embedding in np.asarray(query_embeddings, dtype=np.float32).tolist()
+            ]
+        self._consolidate()
+        return _batch_results(
+            self._blocks(),
+            self._norms,
+            self._ids,
+            query_embeddings,
+            similarity_top_k,
+            deleted=self._deleted,
+        )
+
+    def _scores(
+        self, query_embedding: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Compute the cosine similarity between the query and the stored embeddings (or a subset of rows).
+
+        A large subset of rows is scored with the whole matrix, reading contiguous rows instead of gathering them.
+        """
+        if rows is None or len(rows) > len(self._ids) // 2:
+            products = [block @ query_embedding for block in self._blocks()]
+            scores = np.concatenate(products) if products else np.empty(0, dtype=np.float32)
+            if rows is not None:
+                scores = scores[rows]
+        else:
+            scores = self._take(rows) @ query_embedding
+        norms = self._norms if rows is None else self._norms[rows]
+        query_norm = np.linalg.norm(query_embedding) or 1.0
+        return scores / (np.where(norms == 0, 1.0, norms) * query_norm)
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """Get the rows the query is restricted to, or None to search all the rows (none is deleted)."""
+        mask = None if self._deleted is None else ~self._deleted
+        if query.node_ids is not None:
+            node_mask = np.isin(self._ids, _encode(query.node_ids))
+            mask = node_mask if mask is None else mask & node_mask
+        if query.doc_ids is not None:
+            doc_mask = np.isin(self._ref_doc_ids, _encode(query.doc_ids))
+            mask = doc_mask if mask is None else mask & doc_mask
+        return None if mask is None else np.flatnonzero(mask)
+
+    def _blocks(self) -> List[np.ndarray]:
+        """The non-empty matrices holding the rows, in order."""
+        return [block for block in (self._embeddings, self._appended) if len(block)]
+
+    def _take(self, rows: np.ndarray) -> np.ndarray:
+        """Read the embeddings of some rows."""
+        base_count = len(self._embeddings)
+        if len(self._appended) == 0:
+            return np.asarray(self._embeddings[rows], dtype=np.float32)
+        if base_count == 0:
+            return np.asarray(self._appended[rows], dtype=np.float32)
+        embeddings = np.empty((len(rows), self._appended.shape[1]), dtype=np.float32)
+        in_base = rows < base_count
+        embeddings[in_base] = self._embeddings[rows[in_base]]
+        embeddings[~in_base] = self._appended[rows[~in_base] - base_count]
+        return embeddings
+
+    def _live_rows(self) -> np.ndarray:
+        """The rows that are not deleted."""
+        if self._deleted is None:
+            return np.arange(len(self._ids))
+        return np.flatnonzero(~self._deleted)
+
+    def _live(self, array: np.ndarray) -> np.ndarray:
+        """Select the entries of the rows that are not deleted from a per-row array."""
+        return array if self._deleted is None else array[~self._deleted]
+
+    def _consolidate(self):
+        """Append the buffered embeddings to the matrix of the added rows.
+
+        The appended rows are kept in a memory-mapped temporary file if the loaded matrix is memory-mapped, so
+        adding embeddings to a loaded store never reads the loaded matrix into memory.
+        """
+        if not self._pending:
+            return
+        ids, ref_doc_ids, embeddings = zip(*self._pending)
+        new_ids = np.concatenate(ids)
+        # a re-added node replaces its rows in the matrix and its earlier rows in the buffer.
+        stale = np.isin(self._ids, new_ids)
+        _, last = np.unique(new_ids[::-1], return_index=True)
+        stale_new = np.ones(len(new_ids), dtype=bool)
+        stale_new[len(new_ids) - 1 - last] = False
+        new_embeddings = np.ascontiguousarray(np.concatenate(embeddings), dtype=np.float32)
+        if len(self._appended) == 0 and self._appended.shape[1] != new_embeddings.shape[1]:
+            self._appended = np.empty((0, new_embeddings.shape[1]), dtype=np.float32)
+        if isinstance(self._embeddings, np.memmap):
+            if self._appended_file is None:
+                self._appended_file = tempfile.TemporaryFile()
+            self._appended_file.seek(0, os.SEEK_END)
+            self._appended_file.write(new_embeddings.tobytes())
+            self._appended_file.flush()
+            shape = (len(self._appended) + len(new_embeddings), new_embeddings.shape[1])
+            self._appended = np.memmap(self._appended_file, dtype=np.float32, mode="r", shape=shape)
+        else:
+            self._appended = np.concatenate([self._appended, new_embeddings])
+        if self._deleted is not None:
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(new_embeddings), dtype=bool)])
+        new_norms = np.linalg.norm(new_embeddings, axis=1).astype(np.float32)
+        self._norms = np.concatenate([self._norms, new_norms])
+        self._ids = np.concatenate([self._ids, new_ids])
+        self._ref_doc_ids = np.concatenate([self._ref_doc_ids, *ref_doc_ids])
+        self._pending = []
+        self._id_to_row = None
+        self._delete(np.concatenate([stale, stale_new]))
+
+    def _delete(self, mask: np.ndarray):
+        """Mark the rows selected by a boolean mask as deleted."""
+        if self._deleted is not None:
+            mask = mask & ~self._deleted
+        if not mask.any():
+            return
+        self._changed_ids.update(dict.fromkeys(_decode(self._ids[mask])))
+        self._deleted = mask if self._deleted is None else self._deleted | mask
+        self._id_to_row = None
+
+    def _row_index(self) -> Dict[str, int]:
+        if self._id_to_row is None:
+            rows = self._live_rows()
+            self._id_to_row = dict(zip(_decode(self._ids[rows]), rows.tolist()))
+        return self._id_to_row
+
+    def persist(
+        self,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+    ) -> None:
+        """Persist the store.
+
+        The arrays are written to temporary files and moved in place, so a store that is memory-mapped from the
+        same files keeps reading the old data. Only the rows that are not deleted are written, the embeddings are
+        copied in chunks of `PERSIST_CHUNK_SIZE` rows.
+
+        Parameters
+        ----------
+        persist_path: str
+            The path of the JSON header, e.g. `<store_dir>/default__vector_store.json`.
+        fs: fsspec.AbstractFileSystem, optional
+            Only the local file system is supported.
+        """
+        self._consolidate()
+        os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+        base = _base_path(persist_path)
+        _atomic_save_rows(f"{base}.embeddings.npy", self._blocks(), self._live_rows(), self._dim())
+        for name, array in self._arrays().items():
+            _atomic_save(f"{base}.{name}.npy", array)
+
+        with open(persist_path, "w", encoding="utf-8") as f:
+            json.dump(self._header(), f)
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays persisted next to the header (the embeddings are written separately), by name."""
+        return dict(
+            norms=self._live(self._norms),
+            ids=self._live(self._ids),
+            ref_doc_ids=self._live(self._ref_doc_ids),
+        )
+
+    def _dim(self) -> int:
+        return int(max(self._embeddings.shape[1], self._appended.shape[1]))
+
+    def _header(self) -> Dict[str, Any]:
+        """The JSON header of the persisted store, `class_name` must be the first key (see `vector_store_class`)."""
+        return {
+            "class_name": self.class_name(),
+            "count": self.count,
+            "dim": self._dim(),
+        }
+
+    @classmethod
+    def from_persist_path(
+        cls,
+        persist_path: str,
+        fs: Optional[fsspec.AbstractFileSystem] = None,
+        mmap: bool = True,
+    ) -> "NumpyVectorStore":
+        """Load a persisted store.
+
+        Parameters
+        ----------
+        persist_path: str
+            The path of the JSON header.
+        fs: fsspec.AbstractFileSystem, optional
+            Only the local file system is supported.
+        mmap: bool, optional, default is True.
+            True to memory-map the embeddings instead of reading them into memory.
+        """
+        if not os.path.exists(persist_path):
+            raise ValueError(f"No existing {cls.class_name()} found at {persist_path}.")
+        with open(persist_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        return cls(**cls._load_arrays(_base_path(persist_path), header, mmap))
+
+    @classmethod
+    def _load_arrays(cls, base: str, header: Dict[str, Any], mmap: bool) -> Dict[str, Any]:
+        """Get the arguments of the store from its persisted arrays and header."""
+        return dict(
+            embeddings=np.load(f"{base}.embeddings.npy", mmap_mode="r" if mmap else None),
+            norms=np.load(f"{base}.norms.npy"),
+            ids=np.load(f"{base}.ids.npy"),
+            ref_doc_ids=np.load(f"{base}.ref_doc_ids.npy"),
+        )
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Get the indices of the k highest scores, sorted by decreasing score."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def batch_query(
+    vector_store: BasePydanticVectorStore, query_embeddings: np.ndarray, similarity_top_k: int
+) -> List[VectorStoreQueryResult]:
+    """Query a vector store with several query embeddings.
+
+    The vfn_rag stores answer with `query_batch`, the embeddings of a `SimpleVectorStore` are stacked once and scored
+    with one matrix-matrix product, and the other stores are queried one query at a time.
+
+    Parameters
+    ----------
+    vector_store: BasePydanticVectorStore
+        The vector store.
+    query_embeddings: np.ndarray
+        The (num_queries, dim) embeddings of the queries.
+    similarity_top_k: int
+        The number of nodes per query.
+
+    Returns
+    -------
+    List[VectorStoreQueryResult]
+        The result of every query.
+    """
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.query_batch(query_embeddings, similarity_top_k)
+    if isinstance(vector_store, SimpleVectorStore):
+        embedding_dict = vector_store.data.embedding_dict
+        ids = np.array(list(embedding_dict), dtype=object)
+        embeddings = np.array(list(embedding_dict.values()), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1) if len(ids) else np.empty(0, np.float32)
+        return _batch_results([embeddings], norms, ids, query_embeddings, similarity_top_k)
+    return [
+        vector_store.query(
+            VectorStoreQuery(query_embedding=embedding.tolist(), similarity_top_k=similarity_top_k)
+        )
+        for embedding in query_embeddings
+    ]
+
+
+def _batch_results(
+    blocks: List[np.ndarray],
+    norms: np.ndarray,
+    ids: np.ndarray,
+    query_embeddings: np.ndarray,
+    k: int,
+    deleted: Optional[np.ndarray] = None,
+) -> List[VectorStoreQueryResult]:
+    """Score the queries against all the embeddings in blocks of queries, and select the top-k of every query.
+
+    The embeddings are the rows of `blocks` in order, the rows masked by `deleted` are never selected.
+    """
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+    k = min(k, len(ids) - (0 if deleted is None else int(np.count_nonzero(deleted))))
+    if k <= 0:
+        return [VectorStoreQueryResult(similarities=[], ids=[]) for _ in query_embeddings]
+    query_norms = np.linalg.norm(query_embeddings, axis=1)
+    query_norms[query_norms == 0] = 1.0
+    norms = np.where(norms == 0, 1.0, norms)
+    block = max(1, BATCH_SCORE_SIZE // len(ids))
+    results = []
+    for start in range(0, len(query_embeddings), block):
+        queries = query_embeddings[start : start + block]
+        products = np.concatenate([queries @ embeddings.T for embeddings in blocks], axis=1)
+        scores = products / (query_norms[start : start + block, None] * norms)
+        if deleted is not None:
+            scores[:, deleted] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for rows, similarities in zip(top, top_scores):
+            row_ids = ids[rows]
+            results.append(
+                VectorStoreQueryResult(
+                    similarities=similarities.tolist(),
+                    ids=_decode(row_ids) if row_ids.dtype.kind == "S" else row_ids.tolist(),
+                )
+            )
+    return results
+
+
+def load_vector_stores(
+    store_dir: str, mmap: bool = True
+) -> Dict[str, BasePydanticVectorStore]:
+    """Load all the vector stores persisted in a directory.
+
+    Every `<namespace>__vector_store.json` file is loaded with the vector store class that wrote it, i.e.
+    a vfn_rag store if the file is one of their headers and a `SimpleVectorStore` otherwise.
+
+    Parameters
+    ----------
+    store_dir: str
+        The directory containing the store.
+    mmap: bool, optional, default is True.
+        True to memory-map the binary arrays of the vfn_rag vector stores.
+
+    Returns
+    -------
+    Dict[str, BasePydanticVectorStore]
+        The vector stores by namespace.
+    """
+    vector_stores = {}
+    for file in sorted(Path(store_dir).glob(f"*{VECTOR_STORE_SUFFIX}")):
+        namespace = file.name[: -len(VECTOR_STORE_SUFFIX)]
+        store_class = vector_store_class(str(file))
+        if store_class is SimpleVectorStore:
+            vector_stores[namespace] = SimpleVectorStore.from_persist_path(str(file))
+        else:
+            vector_stores[namespace] = store_class.from_persist_path(str(file), mmap=mmap)
+    return vector_stores
+
+
+def vector_store_class(persist_path: str) -> type:
+    """Get the class of the vector store persisted at a path, without parsing the whole file."""
+    with open(persist_path, "rb") as f:
+        head = f.read(256)
+    if head.startswith(b'{"class_name": '):
+        class_name = head.split(b'"')[3].decode("utf-8")
+        for store_class in _subclasses(NumpyVectorStore):
+            if store_class.class_name() == class_name:
+                return store_class
+        raise ValueError(f"Unknown vector store class: {class_name}")
+    return SimpleVectorStore
+
+
+def _subclasses(cls: type) -> List[type]:
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes.extend(_subclasses(subclass))
+    return classes
+
+
+def _base_path(persist_path: str) -> str:
+    return persist_path[: -len(".json")] if persist_path.endswith(".json") else persist_path
+
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _atomic_save_rows(path: str, blocks: List[np.ndarray], rows: np.ndarray, dim: int):
+    """Save some rows of the matrix made of `blocks` as one float32 `.npy` array, copied in chunks of rows."""
+    tmp_path = f"{path}.tmp"
+    if len(rows) == 0:
+        _atomic_save(path, np.empty((0, dim), dtype=np.float32))
+        return
+    array = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(rows), dim))
+    position, offset = 0, 0
+    for block in blocks:
+        block_rows = rows[(rows >= offset) & (rows < offset + len(block))] - offset
+        for start in range(0, len(block_rows), PERSIST_CHUNK_SIZE):
+            chunk = block_rows[start : start + PERSIST_CHUNK_SIZE]
+            array[position : position + len(chunk)] = block[chunk]
+            position += len(chunk)
+        offset += len(block)
+    array.flush()
+    del array
+    os.replace(tmp_path, path)
+
+
+def _encode(values: Sequence[str]) -> np.ndarray:
+    if len(values) == 0:
+        return np.empty(0, dtype="S1")
+    return np.asarray([value.encode("utf-8") for value in values])
+
+
+def _decode(values: np.ndarray) -> List[str]:
+    return [value.decode("utf-8") for value in values.tolist()]
@@ -1,6 +1,8 @@
-from typing import Any
+from typing import Any, Dict
 from llama_index.core import Settings
 from vfn_rag.utils.models import get_azure_open_ai_embedding, azure_open_ai
+from vfn_rag.utils.embedding_cache import CachedEmbedding, EmbeddingCache
+from vfn_rag.utils.embedding_executor import RateLimitedEmbedding
 
 
 class ConfigLoader:
@@ -10,6 +12,8 @@ class ConfigLoader:
         self,
         llm: Any = None,
         embedding: Any = None,
+        embedding_cache: str = None,
+        embedding_rate_limit: Dict[str, Any] = None,
     ):
         """Initialize the ConfigLoader class.
 
@@ -19,11 +23,25 @@ class ConfigLoader:
             llm model to use.
         embedding: Any, optional, default is BAAI/bge-base-en-v1.5
             Embedding model to use.
+        embedding_cache: str, optional, default is None
+            Path to a persistent embedding cache (SQLite file). If given, the embedding model is wrapped in a
+            `CachedEmbedding`, so texts that were already embedded by the same model are read from the cache.
+        embedding_rate_limit: Dict[str, Any], optional, default is None
+            The arguments of a `RateLimitedEmbedding` (e.g. {"requests_per_minute": 1800, "tokens_per_minute":
+            300_000, "max_concurrency": 8, "batch_size": 16}). If given, the embedding model is wrapped in a
+            `RateLimitedEmbedding` (inside the cache, so the cached texts do not count against the quota).
         """
         if llm is None:
             llm = azure_open_ai()
         if embedding is None:
-            embedding = get_azure_open_ai_embedding()
+            # the retries are done by the rate limiter.
+            embedding = get_azure_open_ai_embedding(
+                max_retries=0 if embedding_rate_limit is not None else 10
+            )
+        if embedding_rate_limit is not None:
+            embedding = RateLimitedEmbedding(embedding, **embedding_rate_limit)
+        if embedding_cache is not None:
+            embedding = CachedEmbedding(embedding, EmbeddingCache(embedding_cache))
 
         Settings.embed_model = embedding
         Settings.llm = llm
@@ -0,0 +1,260 @@
+"""A persistent embedding cache shared across ingests.
+
+The embeddings are stored in a SQLite database as float32 blobs, keyed by the SHA-256 hash of the embedded text and
+the embedding model (name and dimensions), so rebuilding an index over an unchanged corpus does not call the
+embedding endpoint again. The cache is bounded in size and evicts the least recently used embeddings.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from pydantic import Field, PrivateAttr
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from vfn_rag.utils.helper_functions import generate_content_hash
+
+DEFAULT_MAX_BYTES = 2 * 2**30
+
+__all__ = ["EmbeddingCache", "CachedEmbedding"]
+
+
+class EmbeddingCache:
+    """A size-bounded LRU cache of embeddings in a SQLite database."""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        """Open (or create) the cache.
+
+        Parameters
+        ----------
+        path: str
+            The database file.
+        max_bytes: int, optional, default is 2 GB.
+            The maximum total size of the cached embeddings. The least recently used embeddings are evicted when
+            the size is exceeded. None for no limit.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "content_hash TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (content_hash, model)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def size_bytes(self) -> int:
+        """The total size of the cached embeddings."""
+        return self._size
+
+    @property
+    def count(self) -> int:
+        """The number of cached embeddings."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, content_hashes: Sequence[str], model: str) -> Dict[str, Embedding]:
+        """Get the cached embeddings of a model.
+
+        Parameters
+        ----------
+        content_hashes: Sequence[str]
+            The hashes of the embedded texts.
+        model: str
+            The model key, see `CachedEmbedding.model_key`.
+
+        Returns
+        -------
+        Dict[str, Embedding]
+            The embeddings found, by content hash.
+        """
+        found = {}
+        unique_hashes = list(dict.fromkeys(content_hashes))
+        now = time.time()
+        with self._lock, self._conn:
+            # stay below the SQLite limit on the number of query parameters.
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                for content_hash, vector in rows:
+                    found[content_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE content_hash = ? AND model = ?",
+                [(now, content_hash, model) for content_hash in found],
+            )
+        return found
+
+    def put_many(self, embeddings: Dict[str, Embedding], model: str):
+        """Cache embeddings, and evict the least recently used ones if the cache is too large.
+
+        Parameters
+        ----------
+        embeddings: Dict[str, Embedding]
+            The embeddings by content hash.
+        model: str
+            The model key, see `CachedEmbedding.model_key`.
+        """
+        now = time.time()
+        rows = [
+            (content_hash, model, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for content_hash, embedding in embeddings.items()
+        ]
+        with self._lock, self._conn:
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start : start + 500]]
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE model = ? "
+                    f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (content_hash, model, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._size += sum(len(row[2]) for row in rows) - replaced
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used embeddings until the cache fits in `max_bytes`."""
+        if self._max_bytes is None or self._size <= self._max_bytes:
+            return
+        cursor = self._conn.execute(
+            "SELECT content_hash, model, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        )
+        evicted = []
+        excess = self._size - self._max_bytes
+        for content_hash, model, size in cursor:
+            if excess <= 0:
+                break
+            evicted.append((content_hash, model))
+            excess -= size
+            self._size -= size
+        self._conn.executemany(
+            "DELETE FROM embeddings WHERE content_hash = ? AND model = ?", evicted
+        )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """An embedding model that looks up the `EmbeddingCache` before calling the wrapped model.
+
+    Only the texts that are not in the cache are sent to the wrapped model, in one batch. Query embeddings are not
+    cached.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    hits: int = Field(default=0, description="The number of embeddings read from the cache.")
+    misses: int = Field(default=0, description="The number of embeddings computed by the model.")
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any):
+        """Wrap an embedding model.
+
+        Parameters
+        ----------
+        embed_model: BaseEmbedding
+            The embedding model (e.g. `get_azure_open_ai_embedding()`).
+        cache: EmbeddingCache
+            The cache to use.
+        """
+        kwargs.setdefault("model_name", embed_model.model_name)
+        kwargs.setdefault("embed_batch_size", embed_model.embed_batch_size)
+        super().__init__(embed_model=embed_model, **kwargs)
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    @property
+    def model_key(self) -> str:
+        """The cache key of the wrapped model: its class, name and dimensions.
+
+        Wrappers that do not change the embeddings (e.g. `RateLimitedEmbedding`) are unwrapped, the key is the one
+        of the innermost `embed_model`, so a rate-limited model shares the cache of the model itself.
+        """
+        model = self.embed_model
+        while isinstance(getattr(model, "embed_model", None), BaseEmbedding):
+            model = model.embed_model
+        dimensions = getattr(model, "dimensions", None) or getattr(model, "embed_dim", None)
+        return f"{model.class_name()}/{model.model_name}/{dimensions}"
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self.embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self.embed_model.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        hashes, cached, missing = self._lookup(texts)
+        if missing:
+            embeddings = self.embed_model.get_text_embedding_batch([texts[i] for i in missing])
+            self._store(hashes, cached, missing, embeddings)
+        return [cached[content_hash] for content_hash in hashes]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        hashes, cached, missing = self._lookup(texts)
+        if missing:
+            embeddings = await self.embed_model.aget_text_embedding_batch(
+                [texts[i] for i in missing]
+            )
+            self._store(hashes, cached, missing, embeddings)
+        return [cached[content_hash] for content_hash in hashes]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _lookup(self, texts: List[str]):
+        """Get the hashes of the texts, the cached embeddings and the positions of the texts to embed."""
+        hashes = [generate_content_hash(text) for text in texts]
+        cached = self._cache.get_many(hashes, self.model_key)
+        missing, seen = [], set()
+        for i, content_hash in enumerate(hashes):
+            if content_hash not in cached and content_hash not in seen:
+                missing.append(i)
+                seen.add(content_hash)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return hashes, cached, missing
+
+    def _store(self, hashes, cached, missing, embeddings):
+        new = {hashes[i]: embedding for i, embedding in zip(missing, embeddings)}
+        self._cache.put_many(new, self.model_key)
+        cached.update(new)
@@ -0,0 +1,234 @@
+"""A rate-limit aware executor for embedding models (e.g. Azure OpenAI).
+
+`RateLimitedEmbedding` wraps an embedding model and sends the texts to embed in batches of `batch_size`, with at
+most `max_concurrency` requests in flight. Two token buckets keep the requests and the tokens sent per minute
+within the deployment quota, and the requests that are throttled (HTTP 429) or fail with a transient error are
+retried with a jittered exponential backoff, waiting at least as long as the `Retry-After` header asks.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Callable, List, Optional
+from pydantic import Field, PrivateAttr
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.utils import get_tokenizer
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 8
+# the texts given to the executor at once by llama_index, they are split in batches of `batch_size`.
+DEFAULT_EMBED_BATCH_SIZE = 2048
+RETRIABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+__all__ = ["TokenBucket", "RateLimitedEmbedding"]
+
+
+class TokenBucket:
+    """An async token bucket refilled continuously at a rate per minute."""
+
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 10.0):
+        """Initialize the bucket (full).
+
+        Parameters
+        ----------
+        rate_per_minute: float
+            The number of tokens added per minute.
+        burst_seconds: float, optional, default is 10.
+            The capacity of the bucket, in seconds of refill. Azure OpenAI enforces the quota over short windows
+            (a sixth of the per-minute quota per 10 seconds), so a bucket holding a full minute would allow
+            bursts that are throttled.
+        """
+        self._rate = rate_per_minute / 60.0
+        self._capacity = max(1.0, self._rate * burst_seconds)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        # asyncio locks are bound to an event loop, the bucket is shared by the loops of successive sync calls.
+        self._lock = None
+        self._loop = None
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until `amount` tokens are available and take them.
+
+        An amount larger than the capacity is taken as soon as the bucket is full, the bucket then goes negative
+        and the next callers wait for the debt to be refilled.
+        """
+        needed = min(amount, self._capacity)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((needed - self._tokens) / self._rate)
+
+
+class RateLimitedEmbedding(BaseEmbedding):
+    """An embedding model that calls the wrapped model in concurrent, rate-limited and retried batches.
+
+    The wrapped model should not retry by itself (e.g. `AzureOpenAIEmbedding(max_retries=0)`), otherwise its
+    retries are not rate limited. Note that the openai client used by `AzureOpenAIEmbedding` still retries a
+    request twice (honoring `Retry-After`) before the error reaches the executor. Query embeddings go through the
+    same limiter.
+    """
+
+    embed_model: BaseEmbedding = Field(description="The wrapped embedding model.")
+    batch_size: int = Field(default=DEFAULT_BATCH_SIZE, description="The number of texts per request.", gt=0)
+    max_concurrency: int = Field(
+        default=DEFAULT_MAX_CONCURRENCY, description="The maximum number of requests in flight.", gt=0
+    )
+    requests_per_minute: Optional[float] = Field(default=None, description="The request quota, None for no limit.")
+    tokens_per_minute: Optional[float] = Field(default=None, description="The token quota, None for no limit.")
+    max_retries: int = Field(default=DEFAULT_MAX_RETRIES, description="The retries of a failed request.", ge=0)
+    backoff: float = Field(default=1.0, description="The base delay of the exponential backoff (seconds).", gt=0)
+    max_backoff: float = Field(default=60.0, description="The maximum backoff delay (seconds).", gt=0)
+    num_requests: int = Field(default=0, description="The number of requests sent (including retries).")
+    num_retries: int = Field(default=0, description="The number of retried requests.")
+    _request_bucket: Optional[TokenBucket] = PrivateAttr(default=None)
+    _token_bucket: Optional[TokenBucket] = PrivateAttr(default=None)
+    _semaphore: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+    _loop: Any = PrivateAttr(default=None)
+    _tokenizer: Callable = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, **kwargs: Any):
+        """Wrap an embedding model.
+
+        Parameters
+        ----------
+        embed_model: BaseEmbedding
+            The embedding model (e.g. `get_azure_open_ai_embedding(max_retries=0)`).
+        batch_size: int, optional, default is 16.
+            The number of texts sent per request.
+        max_concurrency: int, optional, default is 8.
+            The maximum number of requests in flight.
+        requests_per_minute: float, optional, default is None.
+            The requests-per-minute quota of the deployment.
+        tokens_per_minute: float, optional, default is None.
+            The tokens-per-minute quota of the deployment.
+        max_retries: int, optional, default is 8.
+            The number of times a throttled or failed request is retried.
+        backoff: float, optional, default is 1.
+            The base delay of the exponential backoff, in seconds.
+        max_backoff: float, optional, default is 60.
+            The maximum delay of the exponential backoff, in seconds.
+        """
+        kwargs.setdefault("model_name", embed_model.model_name)
+        kwargs.setdefault("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE)
+        super().__init__(embed_model=embed_model, **kwargs)
+        self._tokenizer = get_tokenizer()
+        self._request_bucket = (
+            TokenBucket(self.requests_per_minute) if self.requests_per_minute else None
+        )
+        self._token_bucket = TokenBucket(self.tokens_per_minute) if self.tokens_per_minute else None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RateLimitedEmbedding"
+
+    def _limiters(self):
+        """Get the limiters, the semaphore is created in the running event loop (it is bound to a loop)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore, self._request_bucket, self._token_bucket
+
+    async def _call(self, function: Callable, texts: List[str], num_tokens: int):
+        """Call the wrapped model within the limits, retrying throttled and failed requests."""
+        semaphore, request_bucket, token_bucket = self._limiters()
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                if request_bucket is not None:
+                    await request_bucket.acquire()
+                if token_bucket is not None:
+                    await token_bucket.acquire(num_tokens)
+                self.num_requests += 1
+                try:
+                    return await function(texts)
+                except Exception as error:
+                    if attempt == self.max_retries or not _is_retriable(error):
+                        raise
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+                    retry_after = _retry_after(error)
+                    if retry_after is not None:
+                        delay = max(delay, retry_after)
+                    self.num_retries += 1
+            # wait outside of the semaphore, so the other requests keep going.
+            await asyncio.sleep(delay)
+
+    def _count_tokens(self, texts: List[str]) -> int:
+        return sum(len(self._tokenizer(text)) for text in texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *[
+                self._call(self.embed_model._aget_text_embeddings, batch, self._count_tokens(batch))
+                for batch in batches
+            ]
+        )
+        return [embedding for result in results for embedding in result]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return asyncio_run(self._aget_text_embeddings(texts))
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        async def embed(texts: List[str]) -> List[Embedding]:
+            return [await self.embed_model._aget_query_embedding(texts[0])]
+
+        return (await self._call(embed, [query], self._count_tokens([query])))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return asyncio_run(self._aget_query_embedding(query))
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and getattr(error, "response", None) is not None:
+        status_code = getattr(error.response, "status_code", None)
+    return status_code
+
+
+def _is_retriable(error: Exception) -> bool:
+    """Check if a request failed because of throttling or a transient error (HTTP status, timeout, connection)."""
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRIABLE_STATUS_CODES
+    names = {cls.__name__ for cls in type(error).__mro__}
+    # the connection and timeout errors of the openai/httpx clients have no status code.
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)) or bool(
+        names & {"APIConnectionError", "APITimeoutError", "TransportError"}
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Get the delay (seconds) asked by the `retry-after-ms` or `retry-after` header of the response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        # an HTTP date, fall back to the backoff.
+        return None
+    return None
@@ -34,3 +34,25 @@ def is_sha256(string: str) -> bool:
     """
     # SHA-256 hash must be 64 characters long and contain only hexadecimal characters
     return bool(re.fullmatch(r"[a-fA-F0-9]{64}", string))
+
+
+def generate_file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Generate a SHA-256 hash of the content of a file.
+
+    Parameters
+    ----------
+    path: str
+        The path to the file.
+    chunk_size: int, optional, default is 1 MB.
+        The number of bytes read at a time, so large files are not loaded into memory at once.
+
+    Returns
+    -------
+    str
+        The SHA-256 hash of the file content.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
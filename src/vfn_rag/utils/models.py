@@ -39,6 +39,7 @@ def get_azure_open_ai_embedding(
     api_version: str = None,
     deployment_name: str = None,
     model: str = None,
+    max_retries: int = 10,
 ):
     endpoint = endpoint or os.environ.get("AZURE_OPENAI_BASE")
     api_key = api_key or os.environ.get("AZURE_OPENAI_KEY")
@@ -55,5 +56,6 @@ def get_azure_open_ai_embedding(
         azure_endpoint=endpoint,
         api_version=api_version,
         deployment_name=deployment_name,
+        max_retries=max_retries,
     )
     return embed_model
\ No newline at end of file
@@ -0,0 +1,72 @@
+import random
+import pytest
+from llama_index.core.schema import Document
+from vfn_rag.indexing.chunking import ContentDefinedSplitter, chunk_id
+from vfn_rag.retrieval.storage import Storage
+
+
+@pytest.fixture()
+def long_text() -> str:
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(500)]
+    return " ".join(rng.choice(words) for _ in range(5000))
+
+
+@pytest.fixture()
+def splitter() -> ContentDefinedSplitter:
+    return ContentDefinedSplitter(chunk_size=256, min_chunk_size=32, target_chunk_size=96)
+
+
+def test_split_text(splitter: ContentDefinedSplitter, long_text: str):
+    chunks = splitter.split_text(long_text)
+    assert "".join(chunks) == long_text
+    sizes = [len(splitter._tokenizer(chunk)) for chunk in chunks]
+    assert len(chunks) > 1
+    assert max(sizes) <= 256
+    assert 32 <= sum(sizes) / len(sizes) <= 256
+
+
+def test_split_long_word(splitter: ContentDefinedSplitter):
+    text = "a short sentence " + "x" * 5000 + " and the end"
+    chunks = splitter.split_text(text)
+    assert "".join(chunks) == text
+    assert max(len(splitter._tokenizer(chunk)) for chunk in chunks) <= 256
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        ContentDefinedSplitter(chunk_size=100, min_chunk_size=50, target_chunk_size=200)
+
+
+def test_edited_document_reuses_chunks(splitter: ContentDefinedSplitter, long_text: str):
+    storage = Storage.create()
+    document = Document(text=long_text, metadata={"file_path": "report.txt"})
+    nodes = splitter([document])
+    summary = storage.add_documents(nodes, generate_id=False, bulk=True)
+    assert summary.reuse_ratio == 0
+    # the stored chunks keep the IDs of the splitter.
+    assert storage.document_ids() == {node.node_id for node in nodes}
+    assert chunk_id("report.txt", nodes[0].text) in storage.document_ids()
+
+    # fix a "typo" in the middle of the document.
+    words = long_text.split(" ")
+    words[len(words) // 2] = "typo"
+    edited = Document(text=" ".join(words), metadata={"file_path": "report.txt"})
+    summary = storage.add_documents(splitter([edited]), generate_id=False, bulk=True)
+    assert 1 <= summary.num_added <= 2
+    assert summary.reuse_ratio > 0.9
+
+
+def test_repeated_chunks_get_distinct_ids(splitter: ContentDefinedSplitter, long_text: str):
+    # the same text twice in a document, and in another document.
+    text = f"{long_text}\n\n{long_text}"
+    nodes = splitter([Document(text=text, metadata={"file_path": "a.txt"})])
+    other = splitter([Document(text=text, metadata={"file_path": "b.txt"})])
+    texts = [node.text for node in nodes]
+    assert len(set(texts)) < len(texts)
+    ids = [node.node_id for node in nodes + other]
+    assert len(set(ids)) == len(ids)
+    storage = Storage.create()
+    summary = storage.add_documents(nodes + other, generate_id=False, bulk=True)
+    assert summary.num_skipped == 0
+    assert storage.document_ids() == set(ids)
@@ -1,5 +1,17 @@
-from llama_index.core import VectorStoreIndex
-from vfn_rag.indexing.index_manager import IndexManager
+import asyncio
+import string
+import time
+from typing import List
+import pytest
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import TextNode
+from vfn_rag.indexing.index_manager import (
+    BuildProgress,
+    CHECKPOINT_FILE,
+    IndexManager,
+    SyncSummary,
+)
 from vfn_rag.retrieval.storage import Storage
 
 
@@ -29,3 +41,267 @@ def test_create_from_storage(paul_grahm_essay_storage: str):
     assert isinstance(index_manager, IndexManager)
     assert len(index_manager.indexes) == 1
     assert isinstance(index_manager.indexes[0], VectorStoreIndex)
+
+
+def test_create_from_documents(data_path: str):
+    storage = Storage.create()
+    batches = Storage.iter_documents(data_path, batch_size=3)
+    index_manager = IndexManager.create_from_documents(storage, batches)
+    assert len(index_manager.indexes) == 1
+    index = index_manager.indexes[0]
+    assert isinstance(index, VectorStoreIndex)
+    assert len(index.index_struct.nodes_dict) == 4
+    assert len(storage.docstore.docs) == 4
+
+
+def test_create_from_storage_resumes_from_checkpoint(tmp_path, data_path: str):
+    store_dir = str(tmp_path)
+    storage = Storage.create()
+    storage.add_documents(Storage.read_documents(data_path))
+    storage.save(store_dir)
+
+    def interrupt(progress: BuildProgress):
+        if progress.num_done == 2:
+            raise ConnectionError("network hiccup")
+
+    with pytest.raises(ConnectionError):
+        IndexManager.create_from_storage(
+            storage, batch_size=1, store_dir=store_dir, progress_callback=interrupt
+        )
+    assert (tmp_path / CHECKPOINT_FILE).exists()
+
+    progress = []
+    storage = Storage.load(store_dir)
+    index_manager = IndexManager.create_from_storage(
+        storage, batch_size=1, store_dir=store_dir, progress_callback=progress.append
+    )
+    # only the two documents that were not indexed before the interruption are embedded.
+    assert [p.num_done for p in progress] == [3, 4]
+    assert progress[-1].num_inserted == 2
+    assert progress[-1].tokens_per_second > 0
+    assert not (tmp_path / CHECKPOINT_FILE).exists()
+
+    loaded = IndexManager.load_from_storage(Storage.load(store_dir))
+    assert loaded.ids == index_manager.ids
+    assert len(loaded.indexes[0].index_struct.nodes_dict) == 4
+
+
+@pytest.mark.parametrize("saved", [True, False])
+def test_create_from_storage_interrupted_first_save(tmp_path, data_path: str, monkeypatch, saved: bool):
+    # the first save is interrupted after (or before) the store is written, the build resumes in one index.
+    store_dir = str(tmp_path)
+    storage = Storage.create()
+    storage.add_documents(Storage.read_documents(data_path))
+    storage.save(store_dir)
+    save = Storage.save
+
+    def interrupted_save(self, *args, **kwargs):
+        if saved:
+            save(self, *args, **kwargs)
+        raise ConnectionError("network hiccup")
+
+    monkeypatch.setattr(Storage, "save", interrupted_save)
+    with pytest.raises(ConnectionError):
+        IndexManager.create_from_storage(storage, batch_size=1, store_dir=store_dir)
+    monkeypatch.setattr(Storage, "save", save)
+    assert (tmp_path / CHECKPOINT_FILE).exists()
+
+    index_manager = IndexManager.create_from_storage(
+        Storage.load(store_dir), batch_size=1, store_dir=store_dir
+    )
+    loaded = IndexManager.load_from_storage(Storage.load(store_dir))
+    assert loaded.ids == index_manager.ids
+    assert len(loaded.indexes[0].index_struct.nodes_dict) == 4
+
+
+def test_sync(tmp_path, data_path: str, text_node):
+    store_dir = str(tmp_path)
+    storage = Storage.create()
+    docs = Storage.read_documents(data_path)
+    storage.add_documents(docs)
+    IndexManager.create_from_storage(storage)
+    storage.save(store_dir)
+
+    storage = Storage.load(store_dir)
+    index_manager = IndexManager.load_from_storage(storage)
+    storage.delete_documents([docs[0].doc_id])
+    storage.add_documents([text_node])
+    summaries = index_manager.sync(storage, store_dir=store_dir)
+    summary = summaries[index_manager.ids[0]]
+    assert summary.inserted == [text_node.node_id]
+    assert summary.deleted == [docs[0].doc_id]
+    # nothing changed since the last sync.
+    assert index_manager.sync(storage)[index_manager.ids[0]] == SyncSummary()
+
+    index = IndexManager.load_from_storage(Storage.load(store_dir)).indexes[0]
+    assert set(index.index_struct.nodes_dict) == {text_node.node_id} | {
+        doc.doc_id for doc in docs[1:]
+    }
+    assert set(index.vector_store.data.embedding_dict) == set(index.index_struct.nodes_dict)
+
+
+def test_sync_keeps_nodes_sharing_text():
+    storage = Storage.create()
+    nodes = [
+        TextNode(text="same", id_=node_id, metadata={"file_path": "report.txt"})
+        for node_id in ("a", "b")
+    ]
+    storage.add_documents(nodes, generate_id=False)
+    index_manager = IndexManager.create_from_storage(storage)
+    index = index_manager.indexes[0]
+    assert set(index.index_struct.nodes_dict) == {"a", "b"}
+    summary = index_manager.sync(storage)[index_manager.ids[0]]
+    assert summary.deleted == []
+    assert set(index.index_struct.nodes_dict) == {"a", "b"}
+    assert set(index.vector_store.data.embedding_dict) == {"a", "b"}
+
+
+def test_sync_rejects_several_vector_indexes(data_path: str):
+    storage = Storage.create()
+    storage.add_documents(Storage.read_documents(data_path))
+    indexes = [VectorStoreIndex([], storage_context=storage.store) for _ in range(2)]
+    index_manager = IndexManager([index.index_id for index in indexes], indexes)
+    with pytest.raises(ValueError):
+        index_manager.sync(storage)
+    assert all(not index.index_struct.nodes_dict for index in indexes)
+
+
+class LetterEmbedding(BaseEmbedding):
+    """Embeds a text as its letter counts, so the similarity depends on the text."""
+
+    def _embed(self, text: str) -> List[float]:
+        return [float(text.lower().count(letter)) + 0.01 for letter in string.ascii_lowercase]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class SlowLetterEmbedding(LetterEmbedding):
+    """Counts the query embeddings in flight."""
+
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return self._embed(query)
+
+
+@pytest.fixture()
+def letter_embedding(monkeypatch):
+    monkeypatch.setattr(Settings, "embed_model", LetterEmbedding())
+
+
+def test_shards(tmp_path, data_path: str, letter_embedding):
+    docs = Storage.read_documents(data_path)
+    shards = IndexManager.create_shards(3)
+    counts = shards.insert_documents(docs)
+    assert sum(counts.values()) == 4
+    for doc in docs:
+        assert doc.doc_id in shards.indexes[shards.shard_of(doc.doc_id)].index_struct.nodes_dict
+
+    # the merged top-k of the shards is the top-k of one index with all the documents.
+    single = VectorStoreIndex(Storage.read_documents(data_path))
+    expected = single.as_retriever(similarity_top_k=2).retrieve("rainfall and rivers")
+    retrieved = shards.retrieve("rainfall and rivers", similarity_top_k=2)
+    assert [node.node.node_id for node in retrieved] == [node.node.node_id for node in expected]
+
+    shards.save_shards(str(tmp_path))
+    loaded = IndexManager.load_shards(str(tmp_path))
+    assert loaded.ids == shards.ids
+    assert [n.node.node_id for n in loaded.retrieve("rainfall and rivers", 2)] == [
+        node.node.node_id for node in expected
+    ]
+
+
+def test_retrieve_batch(data_path: str, letter_embedding):
+    shards = IndexManager.create_shards(2)
+    shards.insert_documents(Storage.read_documents(data_path))
+    queries = ["rainfall and rivers", "birds", "feathers and eggs"]
+    batch = shards.retrieve_batch(queries, similarity_top_k=3)
+    for query, nodes in zip(queries, batch):
+        expected = shards.retrieve(query, similarity_top_k=3)
+        assert [node.node.node_id for node in nodes] == [node.node.node_id for node in expected]
+        assert [node.score for node in nodes] == pytest.approx([node.score for node in expected])
+
+    responses = shards.query_batch(queries, similarity_top_k=2, max_concurrency=2)
+    assert len(responses) == 3
+    assert all(len(response.source_nodes) == 2 for response in responses)
+
+
+def test_retrieve_batch_bounds_embeddings(data_path: str, monkeypatch):
+    embed_model = SlowLetterEmbedding()
+    monkeypatch.setattr(Settings, "embed_model", embed_model)
+    shards = IndexManager.create_shards(2)
+    shards.insert_documents(Storage.read_documents(data_path))
+    batch = shards.retrieve_batch(["birds"] * 50, similarity_top_k=2, max_concurrency=4)
+    assert len(batch) == 50
+    assert embed_model.max_in_flight == 4
+
+
+def test_retrieve_batch_shared_vector_store(data_path: str, letter_embedding):
+    # two indexes in one storage context share the vector store, each hit belongs to the index holding the node.
+    storage_context = StorageContext.from_defaults()
+    docs = Storage.read_documents(data_path)
+    indexes = [
+        VectorStoreIndex.from_documents(docs[:2], storage_context=storage_context),
+        VectorStoreIndex.from_documents(docs[2:], storage_context=storage_context),
+    ]
+    manager = IndexManager(["first", "second"], indexes)
+    batch = manager.retrieve_batch(["rainfall and rivers", "birds"], similarity_top_k=10)
+    num_nodes = sum(len(index.index_struct.nodes_dict) for index in indexes)
+    assert all(len(nodes) == num_nodes for nodes in batch)
+    for nodes in batch:
+        for node in nodes:
+            owners = [index for index in indexes if node.node.node_id in index.index_struct.nodes_dict]
+            assert len(owners) == 1
+
+
+def test_shard_timeout(data_path: str, letter_embedding):
+    shards = IndexManager.create_shards(2)
+    shards.insert_documents(Storage.read_documents(data_path))
+    slow = shards.indexes[0]
+    retriever = slow.as_retriever(similarity_top_k=4)
+
+    class SlowRetriever:
+        def retrieve(self, query):
+            time.sleep(1)
+            return retriever.retrieve(query)
+
+    slow.as_retriever = lambda **kwargs: SlowRetriever()
+    retrieved = shards.retrieve("water", similarity_top_k=4, timeout=0.2)
+    fast_ids = set(shards.indexes[1].index_struct.nodes_dict)
+    assert {node.node.node_id for node in retrieved} == fast_ids
+
+
+def test_lazy_load_from_storage(paul_grahm_essay_storage: str):
+    storage = Storage.load(paul_grahm_essay_storage)
+    # a storage context not created by Storage has its index structs read.
+    plain = Storage(StorageContext.from_defaults(persist_dir=paul_grahm_essay_storage))
+    assert storage.index_ids() == plain.index_ids()
+    index_manager = IndexManager.load_from_storage(storage, lazy=True, max_resident=1)
+    assert index_manager.ids == [
+        "8d57e294-fd17-43c9-9dec-a12aa7ea0751",
+        "edd0d507-9100-4cfb-8002-2267449c6668",
+    ]
+    assert index_manager.resident_ids == []
+
+    first = index_manager.get_index(index_manager.ids[0])
+    assert first.index_id == index_manager.ids[0]
+    assert index_manager.get_index(index_manager.ids[0]) is first
+    # the least recently used index is dropped.
+    index_manager.get_index(index_manager.ids[1])
+    assert index_manager.resident_ids == [index_manager.ids[1]]
+    assert index_manager.get_index(index_manager.ids[0]) is not first
+    assert [index.index_id for index in index_manager.indexes] == index_manager.ids
+    with pytest.raises(ValueError):
+        index_manager.get_index("unknown")
@@ -0,0 +1,138 @@
+from pathlib import Path
+from typing import Dict, List, Sequence
+import pytest
+from llama_index.core.extractors import BaseExtractor, TitleExtractor
+from llama_index.core.schema import BaseNode, NodeRelationship, RelatedNodeInfo, TextNode
+from vfn_rag.indexing.pipeline import ExtractionPipeline
+from vfn_rag.retrieval import storage
+from vfn_rag.retrieval.storage import Storage
+
+
+class CountingExtractor(BaseExtractor):
+    calls: int = 0
+
+    async def aextract(self, nodes: Sequence[BaseNode]) -> List[Dict]:
+        self.calls += len(nodes)
+        return [{"length": len(node.get_content())} for node in nodes]
+
+
+@pytest.fixture()
+def counting_extractor(monkeypatch):
+    monkeypatch.setitem(storage.EXTRACTORS, "counting", CountingExtractor)
+
+
+def test_unknown_extractor():
+    with pytest.raises(ValueError):
+        ExtractionPipeline(["unknown"])
+
+
+def test_split(data_path: str):
+    docs = Storage.read_documents(data_path)
+    pipeline = ExtractionPipeline(
+        ["text_splitter"], extractor_kwargs={"text_splitter": {"chunk_size": 128, "chunk_overlap": 0}}
+    )
+    nodes = pipeline.run(docs)
+    assert len(nodes) > len(docs)
+    assert {node.ref_doc_id for node in nodes} == {doc.doc_id for doc in docs}
+
+
+def test_extract_with_cache(tmp_path: Path, data_path: str, counting_extractor):
+    cache_path = str(tmp_path / "extractors.sqlite")
+    docs = Storage.read_documents(data_path)
+    pipeline = ExtractionPipeline(["counting"], cache_path=cache_path, batch_size=3)
+    nodes = pipeline.run(docs)
+    extractor = pipeline._transformations[0][1]
+    assert extractor.calls == 4
+    assert all(node.metadata["length"] == len(node.text) for node in nodes)
+    assert pipeline.stats["counting"] == {"cached": 0, "extracted": 4}
+
+    # a new pipeline with the same cache only extracts the new nodes.
+    pipeline = ExtractionPipeline(["counting"], cache_path=cache_path)
+    docs = Storage.read_documents(data_path)
+    docs[0].set_content("a changed document")
+    nodes = pipeline.run(docs)
+    assert pipeline._transformations[0][1].calls == 1
+    assert pipeline.stats["counting"] == {"cached": 3, "extracted": 1}
+    assert nodes[1].metadata["length"] == len(nodes[1].text)
+
+
+def test_extract_cache_key(tmp_path: Path, counting_extractor):
+    cache_path = str(tmp_path / "extractors.sqlite")
+    nodes = [TextNode(text="same text", id_=f"n{i}") for i in range(2)]
+    nodes[0].relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id="doc-1")
+    nodes[1].relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id="doc-2")
+    pipeline = ExtractionPipeline(["counting"], cache_path=cache_path)
+    pipeline.run(nodes[:1])
+    assert pipeline.stats["counting"] == {"cached": 0, "extracted": 1}
+    # the same chunk in another document (e.g. an edited version) reuses the cached metadata.
+    pipeline.run(nodes[1:])
+    assert pipeline.stats["counting"] == {"cached": 1, "extracted": 0}
+    # but not with other metadata, the prompts read it.
+    other = TextNode(text="same text", id_="n2", metadata={"section": "appendix"})
+    pipeline.run([other])
+    assert pipeline.stats["counting"] == {"cached": 0, "extracted": 1}
+
+    # another configuration of the extractor does not reuse the cached metadata.
+    kwargs = {"counting": {"metadata_mode": "embed"}}
+    pipeline = ExtractionPipeline(["counting"], extractor_kwargs=kwargs, cache_path=cache_path)
+    pipeline.run(nodes)
+    assert pipeline.stats["counting"] == {"cached": 0, "extracted": 2}
+    pipeline.run(nodes)
+    assert pipeline.stats["counting"] == {"cached": 2, "extracted": 0}
+
+
+def test_edited_document_extracts_changed_chunks(tmp_path: Path, data_path: str, counting_extractor):
+    kwargs = {"text_splitter": {"chunk_size": 64, "chunk_overlap": 0}}
+    cache_path = str(tmp_path / "extractors.sqlite")
+    docs = Storage.read_documents(data_path)
+    pipeline = ExtractionPipeline(["text_splitter", "counting"], extractor_kwargs=kwargs, cache_path=cache_path)
+    nodes = pipeline.run(docs)
+    num_nodes = sum(node.ref_doc_id == docs[0].doc_id for node in nodes)
+    assert num_nodes > 1
+
+    # the edit changes the document ID, only the chunks whose content changed are extracted again.
+    edited = Storage.read_documents(data_path)
+    edited[0].set_content(docs[0].text + " An appended sentence.")
+    edited[0].id_ = "edited"
+    nodes = pipeline.run(edited)
+    assert 1 <= pipeline.stats["counting"]["extracted"] < num_nodes
+
+
+def test_document_extractor_batches(tmp_path: Path, monkeypatch, data_path: str):
+    batches = []
+
+    class Titles(TitleExtractor):
+        async def aextract(self, nodes: Sequence[BaseNode]) -> List[Dict]:
+            batches.append({node.ref_doc_id for node in nodes})
+            return [{"document_title": node.ref_doc_id} for node in nodes]
+
+    monkeypatch.setitem(storage.EXTRACTORS, "title", Titles)
+    kwargs = {"text_splitter": {"chunk_size": 64, "chunk_overlap": 0}}
+    cache_path = str(tmp_path / "extractors.sqlite")
+    docs = Storage.read_documents(data_path)
+    pipeline = ExtractionPipeline(
+        ["text_splitter", "title"], extractor_kwargs=kwargs, cache_path=cache_path, batch_size=2
+    )
+    nodes = pipeline.run(docs)
+    # one call per document, whatever the batch size.
+    assert sorted(len(batch) for batch in batches) == [1] * len(docs)
+    assert all(node.metadata["document_title"] == node.ref_doc_id for node in nodes)
+
+    # a changed document is extracted again with all its nodes.
+    batches.clear()
+    docs[0].set_content(docs[0].text + " An appended sentence.")
+    nodes = pipeline.run(docs)
+    assert batches == [{docs[0].doc_id}]
+    num_nodes = sum(node.ref_doc_id == docs[0].doc_id for node in nodes)
+    assert num_nodes > 1
+    assert pipeline.stats["title"] == {"cached": len(nodes) - num_nodes, "extracted": num_nodes}
+
+
+def test_split_in_process_pool(data_path: str):
+    docs = Storage.read_documents(data_path)
+    kwargs = {"text_splitter": {"chunk_size": 128, "chunk_overlap": 0}}
+    serial = ExtractionPipeline(["text_splitter"], extractor_kwargs=kwargs).run(docs)
+    parallel = ExtractionPipeline(
+        ["text_splitter"], extractor_kwargs=kwargs, num_workers=2
+    ).run(docs)
+    assert [node.text for node in parallel] == [node.text for node in serial]
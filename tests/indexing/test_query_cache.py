@@ -0,0 +1,99 @@
+import time
+from typing import List
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.response.schema import Response
+from llama_index.core.query_engine import CustomQueryEngine
+from vfn_rag.indexing.index_manager import IndexManager
+from vfn_rag.indexing.query_cache import CachedQueryEngine, QueryCache, normalize_query
+from vfn_rag.retrieval.storage import Storage
+
+
+class WordEmbedding(BaseEmbedding):
+    """Embeds a text as the counts of a few words."""
+
+    def _embed(self, text: str) -> List[float]:
+        words = text.lower().split()
+        return [float(words.count(word)) + 0.01 for word in ("bird", "species", "ducks", "names")]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class CountingQueryEngine(CustomQueryEngine):
+    calls: int = 0
+
+    def custom_query(self, query_str: str) -> Response:
+        self.calls += 1
+        time.sleep(0.01)
+        return Response(response=f"answer to {query_str}")
+
+
+@pytest.fixture()
+def engine():
+    query_engine = CountingQueryEngine()
+    cache = QueryCache(similarity_threshold=0.9, ttl=60, max_entries=10)
+    return CachedQueryEngine(query_engine, cache, version=lambda: ("index", 0), embed_model=WordEmbedding())
+
+
+def test_normalize_query():
+    assert normalize_query("  What bird   Species exist? ") == "what bird species exist"
+
+
+def test_exact_and_semantic_tiers(engine: CachedQueryEngine):
+    first = engine.query("What bird species exist in the netherlands?")
+    assert engine.query("what bird species exist in the Netherlands").response == first.response
+    # a different wording with a similar embedding.
+    assert engine.query("What are the bird species that exist?").response == first.response
+    # a different question.
+    engine.query("are there any ducks in the netherlands?")
+    assert engine._query_engine.calls == 2
+    stats = engine.cache.stats
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 2)
+    assert stats["hit_rate"] == 0.5
+    assert stats["saved_seconds"] >= 0.02
+
+
+def test_exact_tier_only():
+    cache = QueryCache(similarity_threshold=None)
+    engine = CachedQueryEngine(CountingQueryEngine(), cache, version=lambda: 1)
+    engine.query("bird species")
+    engine.query("bird species names")
+    assert engine._query_engine.calls == 2
+
+
+def test_ttl_and_size_eviction():
+    cache = QueryCache(ttl=0.05, max_entries=2)
+    cache.put("a", 1, "answer a")
+    assert cache.get_exact("a", 1) == "answer a"
+    time.sleep(0.06)
+    assert cache.get_exact("a", 1) is None
+
+    for query in ("a", "b", "c"):
+        cache.put(query, 1, f"answer {query}")
+    assert len(cache) == 2
+    assert cache.get_exact("a", 1) is None
+
+
+def test_invalidated_by_sync(data_path: str, text_node):
+    storage = Storage.create()
+    storage.add_documents(Storage.read_documents(data_path))
+    index_manager = IndexManager.create_from_storage(storage)
+    cache = QueryCache()
+    query_engine = index_manager.as_query_engine(cache=cache)
+    query_engine.query("what is in the documents?")
+    query_engine.query("what is in the documents?")
+    assert cache.stats["exact_hits"] == 1
+
+    storage.add_documents([text_node])
+    index_manager.sync(storage)
+    query_engine.query("what is in the documents?")
+    assert cache.stats["misses"] == 2
+    # the answers of the old version are dropped.
+    assert len(cache) == 1
@@ -0,0 +1,766 @@
+"""An in-process stand-in for an Azure Cosmos DB (NoSQL) account, to test and benchmark the `Cosmos` backend
+(a test helper, not part of the package).
+
+`InMemoryCosmosClient` implements the part of the `azure.cosmos` client API used by `Cosmos` and by llama_index's
+`AzureCosmosDBNoSqlVectorSearch`: databases, containers, point operations and the subset of the query language they
+use (`SELECT [TOP n] ... FROM c [WHERE ...] [ORDER BY VectorDistance(...)]`). It also models what makes Cosmos
+costly:
+
+- every request is charged request units (RUs, returned in the `x-ms-request-charge` header): writes by item size,
+  queries by the number of physical partitions they touch and the number of items they read and score.
+- with a provisioned `throughput` (RU/s), the requests above the budget fail with HTTP 429 and a
+  `x-ms-retry-after-ms` header.
+- every request takes `latency` seconds, and a cross-partition query visits the physical partitions one by one.
+  The metadata requests (reading a database or a container, its partition key ranges) take `latency` seconds as
+  well, but are not charged; they are counted in `num_metadata_requests`.
+
+`InMemoryAsyncCosmosClient` is the `azure.cosmos.aio` counterpart, on the same in-memory account: its requests
+await their latency instead of blocking the thread.
+
+The charges are a simplified model for comparing strategies (e.g. partition-scoped or filtered queries), not the
+exact charges of the service.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+import zlib
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from azure.cosmos.exceptions import (
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+# the charge model, in request units.
+WRITE_RU = 5.0
+WRITE_RU_PER_KB = 0.2
+READ_RU = 1.0
+QUERY_RU = 2.5
+PARTITION_RU = 1.0
+SCAN_RU_PER_ITEM = 0.02
+VECTOR_RU_PER_ITEM = 0.05
+DEFAULT_PHYSICAL_PARTITIONS = 4
+
+# set by the async client: the latency of a request is awaited by the caller instead of blocking the thread.
+_deferred_delays: ContextVar[Optional[List[float]]] = ContextVar(
+    "deferred_delays", default=None
+)
+
+__all__ = [
+    "InMemoryCosmosClient",
+    "InMemoryDatabase",
+    "InMemoryContainer",
+    "InMemoryAsyncCosmosClient",
+]
+
+
+class _Undefined:
+    """A missing property: every comparison with it is false, as in the Cosmos query language."""
+
+    def __eq__(self, other):
+        return False
+
+    def __ne__(self, other):
+        return False
+
+    __lt__ = __le__ = __gt__ = __ge__ = __eq__
+
+    def __hash__(self):
+        return 0
+
+
+UNDEFINED = _Undefined()
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<path>c(?:\.\w+|\[\s*"(?:[^"\\]|\\.)*"\s*\])*)(?![\w(])
+      | (?P<param>@\w+)
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<op><>|!=|<=|>=|=|<|>|\(|\)|,|\[|\])
+      | (?P<word>\w+)
+    )""",
+    re.X,
+)
+_KEYWORDS = {
+    "and": "and",
+    "or": "or",
+    "not": "not",
+    "in": "in",
+    "true": "True",
+    "false": "False",
+    "null": "None",
+}
+_FUNCTIONS = {
+    "array_contains": "_array_contains",
+    "contains": "_contains",
+    "is_defined": "_is_defined",
+    "startswith": "_startswith",
+}
+
+
+def _split_path(path: str) -> List[str]:
+    """Split `c.a["b c"].d` in ["a", "b c", "d"] (the quoted keys are JSON strings)."""
+    return [
+        key or json.loads(quoted)
+        for key, quoted in re.findall(
+            r'\.(\w+)|\[\s*("(?:[^"\\]|\\.)*")\s*\]', path[1:]
+        )
+    ]
+
+
+def _get(item: dict, keys: List[str]) -> Any:
+    value = item
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return UNDEFINED
+        value = value[key]
+    return value
+
+
+def compile_condition(
+    condition: str,
+) -> Tuple[Callable[[dict, dict], bool], List[List[str]]]:
+    """Compile a WHERE condition of the supported subset of the Cosmos query language.
+
+    Parameters
+    ----------
+    condition: str
+        The condition, e.g. `c.metadata.year >= @year AND ARRAY_CONTAINS(@files, c.metadata.file_name)`.
+
+    Returns
+    -------
+    Tuple[Callable[[dict, dict], bool], List[List[str]]]
+        A function of an item and the query parameters, and the paths used by the condition.
+    """
+    source, paths, position = [], [], 0
+    while position < len(condition.rstrip()):
+        match = _TOKEN.match(condition, position)
+        if match is None:
+            raise ValueError(f"Unsupported condition: {condition[position:]}")
+        position = match.end()
+        kind, token = match.lastgroup, match.group(match.lastgroup)
+        if kind == "path":
+            paths.append(_split_path(token))
+            source.append(f"_get(item, {paths[-1]!r})")
+        elif kind == "param":
+            source.append(f"parameters[{token!r}]")
+        elif kind == "op":
+            source.append({"=": "==", "<>": "!="}.get(token, token))
+        elif kind == "word":
+            word = token.lower()
+            if word in _FUNCTIONS:
+                source.append(_FUNCTIONS[word])
+            elif word in _KEYWORDS:
+                source.append(_KEYWORDS[word])
+            else:
+                raise ValueError(f"Unsupported keyword: {token}")
+        else:
+            source.append(token)
+    code = compile(" ".join(source), "<condition>", "eval")
+    namespace = {
+        "__builtins__": {},
+        "_get": _get,
+        "_array_contains": lambda array, value: isinstance(array, (list, tuple))
+        and value in array,
+        "_is_defined": lambda value: value is not UNDEFINED,
+        "_startswith": lambda value, prefix: isinstance(value, str)
+        and value.startswith(prefix),
+        "_contains": _contains,
+    }
+
+    def evaluate(item: dict, parameters: dict) -> bool:
+        try:
+            return (
+                eval(code, namespace, {"item": item, "parameters": parameters}) is True
+            )
+        except TypeError:
+            # a comparison of values of different types is undefined.
+            return False
+
+    return evaluate, paths
+
+
+def _contains(value: Any, substring: Any, ignore_case: bool = False) -> bool:
+    if not isinstance(value, str) or not isinstance(substring, str):
+        return False
+    return substring.lower() in value.lower() if ignore_case else substring in value
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split a list of expressions on the commas outside of parentheses."""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+_QUERY = re.compile(
+    r"^\s*SELECT\s+(?:TOP\s+(?P<top>\d+|@\w+)\s+)?(?P<fields>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\d+)\s+LIMIT\s+(?P<limit>\d+))?\s*$",
+    re.I | re.S,
+)
+_VECTOR_DISTANCE = re.compile(
+    r"^VectorDistance\(\s*(c[.\w\[\]\"]*)\s*,\s*(@\w+)\s*\)$", re.I
+)
+
+
+class InMemoryContainer:
+    """A container holding its items in memory, see the module documentation."""
+
+    def __init__(
+        self,
+        id: str,
+        partition_key: Any,
+        indexing_policy: Optional[Dict[str, Any]] = None,
+        vector_embedding_policy: Optional[Dict[str, Any]] = None,
+        throughput: Optional[float] = None,
+        latency: float = 0.0,
+        num_physical_partitions: int = DEFAULT_PHYSICAL_PARTITIONS,
+    ):
+        """Create an empty container.
+
+        Parameters
+        ----------
+        id: str
+            The name of the container.
+        partition_key: PartitionKey
+            The partition key definition, e.g. `PartitionKey(path="/id")` (a single path).
+        indexing_policy: Dict[str, Any], optional, default is None.
+            The indexing policy, a filter on a path excluded from the index reads all the items it is applied to.
+        vector_embedding_policy: Dict[str, Any], optional, default is None.
+            The vector embedding policy.
+        throughput: float, optional, default is None.
+            The provisioned throughput (RU/s), requests above it are throttled (HTTP 429). None for no limit.
+        latency: float, optional, default is 0.
+            The time (seconds) taken by every request, and by every physical partition a query visits.
+        num_physical_partitions: int, optional, default is 4.
+            The number of physical partitions the logical partitions are hashed to.
+        """
+        self.id = id
+        self.partition_key = partition_key
+        self.partition_key_path = _split_path(
+            "c" + partition_key["paths"][0].replace("/", ".")
+        )
+        self.indexing_policy = indexing_policy or {}
+        self.vector_embedding_policy = vector_embedding_policy or {}
+        self.latency = latency
+        self.num_physical_partitions = num_physical_partitions
+        self.throughput = throughput
+        self._tokens = throughput or 0.0
+        self._updated = time.monotonic()
+        self._items: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        self.request_charge = 0.0
+        self.num_requests = 0
+        self.num_throttled = 0
+        self.num_metadata_requests = 0
+        # the requests of the async client awaiting their latency, and their maximum over time.
+        self.num_in_flight = 0
+        self.max_in_flight = 0
+        self.client_connection = SimpleNamespace(last_response_headers={})
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def read(self, **kwargs) -> Dict[str, Any]:
+        self.num_metadata_requests += 1
+        _wait(self.latency)
+        return {
+            "id": self.id,
+            "partitionKey": dict(self.partition_key),
+            "indexingPolicy": self.indexing_policy,
+            "vectorEmbeddingPolicy": self.vector_embedding_policy,
+        }
+
+    def read_feed_ranges(self, **kwargs) -> List[Dict[str, Any]]:
+        """Get the ranges of the physical partitions (the partition key ranges of the SDK routing map)."""
+        self.num_metadata_requests += 1
+        _wait(self.latency)
+        return [{"physicalPartition": i} for i in range(self.num_physical_partitions)]
+
+    def partition_key_of(self, item: dict) -> Any:
+        return _get(item, self.partition_key_path)
+
+    def physical_partition(self, partition_key: Any) -> int:
+        return (
+            zlib.crc32(json.dumps(partition_key).encode("utf-8"))
+            % self.num_physical_partitions
+        )
+
+    def _charge(
+        self,
+        charge: float,
+        response_hook: Optional[Callable],
+        result: Any = None,
+        delay: float = 0.0,
+    ):
+        """Charge a request, or throttle it if the throughput budget is exhausted."""
+        with self._lock:
+            self.num_requests += 1
+            if self.throughput is not None:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.throughput,
+                    self._tokens + (now - self._updated) * self.throughput,
+                )
+                self._updated = now
+                if self._tokens < charge:
+                    self.num_throttled += 1
+                    error = CosmosHttpResponseError(
+                        status_code=429, message="Request rate is large."
+                    )
+                    retry_after = (
+                        min(charge, self.throughput) - self._tokens
+                    ) / self.throughput
+                    error.headers = {"x-ms-retry-after-ms": f"{retry_after * 1000:.0f}"}
+                    raise error
+                self._tokens -= charge
+            self.request_charge += charge
+            headers = {"x-ms-request-charge": f"{charge:.2f}"}
+            self.client_connection.last_response_headers = headers
+        _wait(self.latency + delay)
+        if response_hook is not None:
+            response_hook(headers, result)
+
+    def upsert_item(
+        self, body: dict, response_hook: Optional[Callable] = None, **kwargs
+    ) -> dict:
+        item, size = _copy_item(body)
+        self._charge(WRITE_RU + WRITE_RU_PER_KB * size / 1024, response_hook, item)
+        with self._lock:
+            self._items[(json.dumps(self.partition_key_of(item)), item["id"])] = item
+        return item
+
+    def create_item(
+        self, body: dict, response_hook: Optional[Callable] = None, **kwargs
+    ) -> dict:
+        key = (json.dumps(self.partition_key_of(body)), body["id"])
+        if key in self._items:
+            raise CosmosResourceExistsError(
+                message=f"Item {body['id']} already exists."
+            )
+        return self.upsert_item(body, response_hook=response_hook)
+
+    def read_item(
+        self,
+        item: str,
+        partition_key: Any,
+        response_hook: Optional[Callable] = None,
+        **kwargs,
+    ) -> dict:
+        self._charge(READ_RU, response_hook)
+        found = self._items.get((json.dumps(partition_key), item))
+        if found is None:
+            raise CosmosResourceNotFoundError(message=f"Item {item} not found.")
+        return found
+
+    def delete_item(
+        self,
+        item: Any,
+        partition_key: Any,
+        response_hook: Optional[Callable] = None,
+        **kwargs,
+    ):
+        item_id = item["id"] if isinstance(item, dict) else item
+        self._charge(WRITE_RU, response_hook)
+        with self._lock:
+            if self._items.pop((json.dumps(partition_key), item_id), None) is None:
+                raise CosmosResourceNotFoundError(message=f"Item {item_id} not found.")
+
+    def read_all_items(self, **kwargs) -> List[dict]:
+        return list(self._items.values())
+
+    def _is_indexed(self, path: List[str]) -> bool:
+        """Check if a path is indexed by the range index of the indexing policy."""
+        if self.indexing_policy.get("indexingMode", "consistent") == "none":
+            return False
+        text = "/" + "/".join(path)
+
+        def matches(pattern: str) -> bool:
+            pattern = pattern.replace('"', "")
+            if pattern.endswith("/*"):
+                return (
+                    text.startswith(pattern[:-2].rstrip("/") + "/") or pattern == "/*"
+                )
+            return text == pattern.rstrip("?").rstrip("/")
+
+        excluded = [p["path"] for p in self.indexing_policy.get("excludedPaths", [])]
+        included = [
+            p["path"]
+            for p in self.indexing_policy.get("includedPaths", [{"path": "/*"}])
+        ]
+
+        def longest(patterns: List[str]) -> int:
+            return max((len(p) for p in patterns if matches(p)), default=-1)
+
+        return longest(included) > longest(excluded)
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Any = None,
+        enable_cross_partition_query: Optional[bool] = None,
+        response_hook: Optional[Callable] = None,
+        **kwargs,
+    ) -> List[dict]:
+        """Run a query of the supported subset (see the module documentation)."""
+        match = _QUERY.match(query)
+        if match is None:
+            raise ValueError(f"Unsupported query: {query}")
+        parameters = {p["name"]: p["value"] for p in parameters or []}
+
+        with self._lock:
+            items = list(self._items.values())
+        num_partitions = self.num_physical_partitions
+        if partition_key is not None:
+            items = [
+                item for item in items if self.partition_key_of(item) == partition_key
+            ]
+            num_partitions = 1
+        num_candidates = len(items)
+        scanned = len(items)
+        if match.group("where"):
+            condition, paths = compile_condition(match.group("where"))
+            items = [item for item in items if condition(item, parameters)]
+            # a filter on indexed paths reads only the matching items, otherwise every candidate is read.
+            if all(self._is_indexed(path) for path in paths):
+                scanned = len(items)
+            else:
+                scanned = num_candidates
+
+        scores = None
+        fields = _split_top_level(match.group("fields"))
+        vector_fields = [
+            _VECTOR_DISTANCE.match(field.split(" AS ")[0].strip()) for field in fields
+        ]
+        order = match.group("order")
+        vector_order = _VECTOR_DISTANCE.match(order.strip()) if order else None
+        vector = next(
+            (m for m in vector_fields + [vector_order] if m is not None), None
+        )
+        if vector is not None:
+            scores = _cosine(
+                items, _split_path(vector.group(1)), parameters[vector.group(2)]
+            )
+        if vector_order is not None:
+            order_rows = np.argsort(-scores, kind="stable")
+            items = [items[i] for i in order_rows]
+            scores = scores[order_rows]
+        elif order:
+            path, _, direction = order.strip().partition(" ")
+            items.sort(
+                key=lambda item: _get(item, _split_path(path)),
+                reverse=direction.upper() == "DESC",
+            )
+
+        top = match.group("top")
+        if top is not None:
+            top = int(parameters[top]) if top.startswith("@") else int(top)
+        if match.group("offset") is not None:
+            start = int(match.group("offset"))
+            items = items[start : start + int(match.group("limit"))]
+            scores = (
+                None
+                if scores is None
+                else scores[start : start + int(match.group("limit"))]
+            )
+        if top is not None:
+            items = items[:top]
+            scores = None if scores is None else scores[:top]
+
+        charge = QUERY_RU + PARTITION_RU * num_partitions + SCAN_RU_PER_ITEM * scanned
+        if vector is not None:
+            charge += VECTOR_RU_PER_ITEM * scanned
+        results = [
+            self._project(item, fields, None if scores is None else scores[i])
+            for i, item in enumerate(items)
+        ]
+        self._charge(
+            charge, response_hook, results, delay=self.latency * (num_partitions - 1)
+        )
+        return results
+
+    @staticmethod
+    def _project(item: dict, fields: List[str], score: Optional[float]) -> dict:
+        if fields == ["*"]:
+            return item
+        result = {}
+        for field in fields:
+            expression, _, alias = field.partition(" AS ")
+            expression = expression.strip()
+            if _VECTOR_DISTANCE.match(expression):
+                result[alias.strip() or "$1"] = float(score)
+            else:
+                keys = _split_path(expression)
+                value = _get(item, keys)
+                if value is not UNDEFINED:
+                    result[alias.strip() or keys[-1]] = value
+        return result
+
+
+def _wait(delay: float):
+    """Wait for the response of a request, or leave the wait to the async client."""
+    deferred = _deferred_delays.get()
+    if deferred is not None:
+        deferred.append(delay)
+    elif delay:
+        time.sleep(delay)
+
+
+def _copy_item(body: dict) -> Tuple[dict, int]:
+    """Copy an item and estimate its JSON size, the vectors (lists of numbers) are not serialized."""
+    item, size = {}, 2
+    for key, value in body.items():
+        if isinstance(value, list) and value and isinstance(value[0], (int, float)):
+            item[key] = list(value)
+            # about 20 characters per number.
+            size += len(key) + 20 * len(value)
+        else:
+            text = json.dumps(value)
+            item[key] = json.loads(text)
+            size += len(key) + len(text)
+    return item, size
+
+
+def _cosine(items: List[dict], path: List[str], vector: Iterable[float]) -> np.ndarray:
+    if not items:
+        return np.empty(0, dtype=np.float32)
+    embeddings = np.asarray([_get(item, path) for item in items], dtype=np.float32)
+    vector = np.asarray(vector, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * (np.linalg.norm(vector) or 1.0)
+    return (embeddings @ vector) / np.where(norms == 0, 1.0, norms)
+
+
+class InMemoryDatabase:
+    """A database of `InMemoryContainer`s."""
+
+    def __init__(self, id: str, client: "InMemoryCosmosClient"):
+        self.id = id
+        self._client = client
+        self._containers: Dict[str, InMemoryContainer] = {}
+        self._num_metadata_requests = 0
+
+    @property
+    def num_metadata_requests(self) -> int:
+        """The number of metadata requests to the database and its containers."""
+        return self._num_metadata_requests + sum(
+            c.num_metadata_requests for c in self._containers.values()
+        )
+
+    def create_container_if_not_exists(
+        self, id: str, partition_key: Any, **kwargs
+    ) -> InMemoryContainer:
+        self._num_metadata_requests += 1
+        _wait(self._client.latency)
+        if id not in self._containers:
+            self._containers[id] = InMemoryContainer(
+                id,
+                partition_key,
+                indexing_policy=kwargs.get("indexing_policy"),
+                vector_embedding_policy=kwargs.get("vector_embedding_policy"),
+                throughput=self._client.throughput,
+                latency=self._client.latency,
+                num_physical_partitions=self._client.num_physical_partitions,
+            )
+        return self._containers[id]
+
+    def get_container_client(self, container: str) -> InMemoryContainer:
+        if container not in self._containers:
+            raise CosmosResourceNotFoundError(
+                message=f"Container {container} not found."
+            )
+        return self._containers[container]
+
+    def delete_container(self, container: str, **kwargs):
+        self._containers.pop(container, None)
+
+    def read(self, **kwargs) -> Dict[str, Any]:
+        self._num_metadata_requests += 1
+        _wait(self._client.latency)
+        return {"id": self.id}
+
+
+class InMemoryCosmosClient:
+    """A stand-in for `azure.cosmos.CosmosClient`, holding the databases in memory."""
+
+    def __init__(
+        self,
+        throughput: Optional[float] = None,
+        latency: float = 0.0,
+        num_physical_partitions: int = DEFAULT_PHYSICAL_PARTITIONS,
+    ):
+        """Create an empty account.
+
+        Parameters
+        ----------
+        throughput: float, optional, default is None.
+            The throughput (RU/s) of every container, None for no limit.
+        latency: float, optional, default is 0.
+            The time (seconds) taken by every request.
+        num_physical_partitions: int, optional, default is 4.
+            The number of physical partitions of every container.
+        """
+        self.throughput = throughput
+        self.latency = latency
+        self.num_physical_partitions = num_physical_partitions
+        self._databases: Dict[str, InMemoryDatabase] = {}
+        self._num_metadata_requests = 0
+        self.closed = False
+
+    @property
+    def num_metadata_requests(self) -> int:
+        """The number of metadata requests to the account, its databases and containers."""
+        return self._num_metadata_requests + sum(
+            d.num_metadata_requests for d in self._databases.values()
+        )
+
+    def create_database_if_not_exists(self, id: str, **kwargs) -> InMemoryDatabase:
+        self._num_metadata_requests += 1
+        _wait(self.latency)
+        if id not in self._databases:
+            self._databases[id] = InMemoryDatabase(id, self)
+        return self._databases[id]
+
+    def get_database_client(self, database: str) -> InMemoryDatabase:
+        if database not in self._databases:
+            raise CosmosResourceNotFoundError(message=f"Database {database} not found.")
+        return self._databases[database]
+
+    def close(self):
+        self.closed = True
+
+
+async def _deferred(function: Callable, *args, **kwargs) -> Any:
+    """Call a method of the in-memory account and await the latency of its request."""
+    token = _deferred_delays.set([])
+    try:
+        result = function(*args, **kwargs)
+        delay = sum(_deferred_delays.get())
+    finally:
+        _deferred_delays.reset(token)
+    if delay:
+        await asyncio.sleep(delay)
+    return result
+
+
+class _AsyncContainer:
+    """The `azure.cosmos.aio` interface of an `InMemoryContainer`."""
+
+    def __init__(self, container: InMemoryContainer):
+        self.sync_container = container
+        self.id = container.id
+
+    async def _request(self, function: Callable, *args, **kwargs) -> Any:
+        """Make a request, counting the requests in flight together."""
+        container = self.sync_container
+        container.num_in_flight += 1
+        container.max_in_flight = max(container.max_in_flight, container.num_in_flight)
+        try:
+            return await _deferred(function, *args, **kwargs)
+        finally:
+            container.num_in_flight -= 1
+
+    async def read(self, **kwargs) -> Dict[str, Any]:
+        return await self._request(self.sync_container.read)
+
+    async def read_feed_ranges(self, **kwargs) -> List[Dict[str, Any]]:
+        return await self._request(self.sync_container.read_feed_ranges)
+
+    async def upsert_item(self, body: dict, **kwargs) -> dict:
+        return await self._request(self.sync_container.upsert_item, body, **kwargs)
+
+    async def create_item(self, body: dict, **kwargs) -> dict:
+        return await self._request(self.sync_container.create_item, body, **kwargs)
+
+    async def read_item(self, item: str, partition_key: Any, **kwargs) -> dict:
+        return await self._request(
+            self.sync_container.read_item, item, partition_key, **kwargs
+        )
+
+    async def delete_item(self, item: Any, partition_key: Any, **kwargs):
+        return await self._request(
+            self.sync_container.delete_item, item, partition_key, **kwargs
+        )
+
+    async def query_items(self, query: str, **kwargs):
+        # an async iterator, as `CosmosAsyncItemPaged`.
+        for item in await self._request(
+            self.sync_container.query_items, query, **kwargs
+        ):
+            yield item
+
+
+class _AsyncDatabase:
+    """The `azure.cosmos.aio` interface of an `InMemoryDatabase`."""
+
+    def __init__(self, database: InMemoryDatabase):
+        self.sync_database = database
+        self.id = database.id
+
+    async def create_container_if_not_exists(
+        self, id: str, partition_key: Any, **kwargs
+    ) -> _AsyncContainer:
+        return _AsyncContainer(
+            await _deferred(
+                self.sync_database.create_container_if_not_exists,
+                id,
+                partition_key,
+                **kwargs,
+            )
+        )
+
+    def get_container_client(self, container: str) -> _AsyncContainer:
+        return _AsyncContainer(self.sync_database.get_container_client(container))
+
+    async def delete_container(self, container: str, **kwargs):
+        self.sync_database.delete_container(container)
+
+    async def read(self, **kwargs) -> Dict[str, Any]:
+        return await _deferred(self.sync_database.read)
+
+
+class InMemoryAsyncCosmosClient:
+    """A stand-in for `azure.cosmos.aio.CosmosClient`, see `InMemoryCosmosClient`."""
+
+    def __init__(self, account: Optional[InMemoryCosmosClient] = None, **kwargs):
+        """Create the client.
+
+        Parameters
+        ----------
+        account: InMemoryCosmosClient, optional, default is None.
+            The in-memory account, to share it with sync clients. A new account if None.
+        **kwargs:
+            The arguments of a new `InMemoryCosmosClient` (`throughput`, `latency`, `num_physical_partitions`).
+        """
+        self.account = account or InMemoryCosmosClient(**kwargs)
+        self.closed = False
+
+    async def create_database_if_not_exists(self, id: str, **kwargs) -> _AsyncDatabase:
+        return _AsyncDatabase(
+            await _deferred(self.account.create_database_if_not_exists, id)
+        )
+
+    def get_database_client(self, database: str) -> _AsyncDatabase:
+        return _AsyncDatabase(self.account.get_database_client(database))
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self) -> "InMemoryAsyncCosmosClient":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,303 @@
+import pytest
+from azure.core.exceptions import ServiceRequestError
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
+from vfn_rag.retrieval import cosmos as cosmos_module
+from vfn_rag.retrieval.cosmos import (
+    BULK_CHECKPOINT_FILE,
+    ClientRegistry,
+    Cosmos,
+    PartitionStrategy,
+    filter_indexing_policy,
+    filters_to_where,
+)
+from tests.retrieval.cosmos_memory import InMemoryCosmosClient
+
+DATABASE = "vectorSearchDB"
+CONTAINER = "vectorSearchContainer"
+
+
+def make_nodes(num_nodes: int) -> list:
+    return [
+        TextNode(text=f"chunk {i} of the report", id_=f"node-{i}", metadata={"file_name": f"file-{i % 5}.txt"})
+        for i in range(num_nodes)
+    ]
+
+
+def test_bulk_upsert():
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient())
+    progress = []
+    summary = cosmos.bulk_upsert(make_nodes(250), batch_size=50, progress_callback=progress.append)
+    assert [p.num_done for p in progress] == [50, 100, 150, 200, 250]
+    assert summary.num_upserted == 250 and summary.num_total == 250
+    assert len(cosmos.container) == 250
+    assert summary.request_charge == pytest.approx(cosmos.container.request_charge, rel=1e-3)
+    assert summary.items_per_second > 0 and summary.ru_per_second > 0
+
+    # the items are the ones written by AzureCosmosDBNoSqlVectorSearch, the index reads them back.
+    index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+    retrieved = index.as_retriever(similarity_top_k=3).retrieve("chunk of the report")
+    assert len(retrieved) == 3
+    assert retrieved[0].node.metadata["file_name"].startswith("file-")
+
+
+def test_bulk_upsert_backs_off_when_throttled():
+    # about 6 RU per item: the 60 items take more than two seconds of throughput.
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient(throughput=150))
+    summary = cosmos.bulk_upsert(make_nodes(60), batch_size=30, max_concurrency=8)
+    assert summary.num_throttled > 0
+    assert summary.concurrency < 8
+    assert len(cosmos.container) == 60
+
+
+def test_bulk_upsert_resumes_from_checkpoint(tmp_path):
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient())
+    container = cosmos.container
+    upsert_item = container.upsert_item
+    calls = []
+
+    def failing_upsert(item, **kwargs):
+        calls.append(item["id"])
+        if len(calls) == 130:
+            raise CosmosHttpResponseError(status_code=500, message="internal error")
+        return upsert_item(item, **kwargs)
+
+    container.upsert_item = failing_upsert
+    with pytest.raises(CosmosHttpResponseError):
+        cosmos.bulk_upsert(make_nodes(250), batch_size=50, max_concurrency=1, checkpoint_dir=str(tmp_path))
+    assert (tmp_path / BULK_CHECKPOINT_FILE).exists()
+
+    container.upsert_item = upsert_item
+    summary = cosmos.bulk_upsert(make_nodes(250), batch_size=50, checkpoint_dir=str(tmp_path))
+    # the two batches written before the failure are skipped.
+    assert summary.num_upserted == 150
+    assert summary.num_done == 250
+    assert len(container) == 250
+    assert not (tmp_path / BULK_CHECKPOINT_FILE).exists()
+
+
+def test_bulk_upsert_ignores_checkpoint_of_other_input(tmp_path):
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient())
+    container = cosmos.container
+    upsert_item = container.upsert_item
+
+    def failing_upsert(item, **kwargs):
+        if item["id"] == "node-70":
+            raise CosmosHttpResponseError(status_code=500, message="internal error")
+        return upsert_item(item, **kwargs)
+
+    container.upsert_item = failing_upsert
+    with pytest.raises(CosmosHttpResponseError):
+        cosmos.bulk_upsert(make_nodes(100), batch_size=50, max_concurrency=1, checkpoint_dir=str(tmp_path))
+    container.upsert_item = upsert_item
+
+    # another input (in another order) does not skip the nodes counted by the checkpoint.
+    summary = cosmos.bulk_upsert(make_nodes(100)[::-1], batch_size=50, checkpoint_dir=str(tmp_path))
+    assert summary.num_upserted == 100
+    assert len(container) == 100
+
+
+def test_bulk_upsert_raises_transport_errors():
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient())
+    container = cosmos.container
+    upsert_item = container.upsert_item
+
+    def failing_upsert(item, **kwargs):
+        if item["id"] == "node-2":
+            raise ServiceRequestError("connection reset")
+        return upsert_item(item, **kwargs)
+
+    container.upsert_item = failing_upsert
+    # the failed request frees its slot, the other upserts of the batch do not wait for it.
+    with pytest.raises(ServiceRequestError):
+        cosmos.bulk_upsert(make_nodes(10), max_concurrency=1)
+    assert len(container) == 9
+
+
+def test_client_registry(monkeypatch):
+    account = InMemoryCosmosClient(latency=0.02)
+    created = []
+
+    def client_factory(uri, key, pool_size, **kwargs):
+        created.append((uri, pool_size))
+        return account
+
+    registry = ClientRegistry(client_factory)
+    monkeypatch.setattr(cosmos_module, "CLIENTS", registry)
+    uri = "https://account.documents.azure.com:443/"
+    Cosmos.create(DATABASE, CONTAINER, uri=uri, key="key").bulk_upsert(make_nodes(10))
+    assert registry.get(uri, "key") is account
+    assert created == [(uri, 10)]
+    # another credential of the same account has its own client.
+    registry.get(uri, "other-key", pool_size=50)
+    assert created[-1] == (uri, 50) and len(registry) == 2
+
+    proxies = registry.warm_up([(DATABASE, CONTAINER)], uri=uri, key="key")
+    assert registry.warmed_container(DATABASE, CONTAINER, uri, "key") is proxies[(DATABASE, CONTAINER)]
+    with pytest.raises(CosmosResourceNotFoundError):
+        registry.warm_up([(DATABASE, "missing")], uri=uri, key="key")
+
+    # a warmed container is opened without metadata requests.
+    num_metadata_requests = account.num_metadata_requests
+    cosmos = Cosmos.load(DATABASE, CONTAINER, uri=uri, key="key")
+    assert account.num_metadata_requests == num_metadata_requests
+    assert cosmos.container is proxies[(DATABASE, CONTAINER)]
+    # the warmed store has the attributes of a store built by `AzureCosmosDBNoSqlVectorSearch.__init__`.
+    built = Cosmos.create(DATABASE, CONTAINER, client=account).vector_store
+    assert cosmos.vector_store.__pydantic_private__ == built.__pydantic_private__
+    index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+    assert len(index.as_retriever(similarity_top_k=2).retrieve("chunk")) == 2
+
+    registry.close(uri, "other-key")
+    assert len(registry) == 1
+    registry.close()
+    assert len(registry) == 0 and account.closed
+    assert registry.warmed_container(DATABASE, CONTAINER, uri, "key") is None
+
+
+def test_partitioned_container():
+    strategy = PartitionStrategy.by_metadata("tenant")
+    cosmos = Cosmos.create(
+        DATABASE, CONTAINER, client=InMemoryCosmosClient(num_physical_partitions=8), partition_strategy=strategy
+    )
+    nodes = make_nodes(200)
+    for node in nodes:
+        node.metadata["tenant"] = f"tenant-{int(node.node_id.split('-')[1]) % 4}"
+    cosmos.bulk_upsert(nodes)
+    container = cosmos.container
+    assert container.partition_key_path == ["partitionKey"]
+    assert container.read_item("node-5", partition_key="tenant-1")["partitionKey"] == "tenant-1"
+
+    index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+    charge = container.request_charge
+    retrieved = index.as_retriever(similarity_top_k=5).retrieve("chunk")
+    cross_partition = container.request_charge - charge
+    assert len({node.node.metadata["tenant"] for node in retrieved}) > 1
+
+    charge = container.request_charge
+    retriever = index.as_retriever(similarity_top_k=5, vector_store_kwargs={"partition_key": "tenant-2"})
+    retrieved = retriever.retrieve("chunk")
+    assert {node.node.metadata["tenant"] for node in retrieved} == {"tenant-2"}
+    # one partition and a quarter of the items are read.
+    assert container.request_charge - charge < cross_partition / 2
+
+    # the strategy is needed to load the container, the nodes are deleted from their partitions.
+    loaded = Cosmos.load(DATABASE, CONTAINER, client=cosmos.client, partition_strategy=strategy)
+    document = TextNode(text="the annual report", id_="report-chunk", metadata={"tenant": "tenant-3"})
+    document.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id="report")
+    index = VectorStoreIndex.from_vector_store(loaded.vector_store)
+    index.insert_nodes([document])
+    assert len(container) == 201
+    index.delete_ref_doc("report")
+    assert len(container) == 200
+    with pytest.raises(ValueError, match="tenant"):
+        index.insert_nodes(make_nodes(1))
+    # without the strategy, the items would be looked up in the partitions of their id.
+    with pytest.raises(ValueError, match="/partitionKey"):
+        Cosmos.load(DATABASE, CONTAINER, client=cosmos.client)
+    with pytest.raises(ValueError, match="/partitionKey"):
+        Cosmos.load(DATABASE, CONTAINER, client=cosmos.client, partition_strategy=PartitionStrategy.by_id())
+    # creating the existing container checks its partition key as well.
+    with pytest.raises(ValueError, match="/partitionKey"):
+        Cosmos.create(DATABASE, CONTAINER, client=cosmos.client)
+    assert Cosmos.create(DATABASE, CONTAINER, client=cosmos.client, partition_strategy=strategy).container is container
+
+
+def test_partition_strategy():
+    node = TextNode(text="chunk", id_="node-0", metadata={"file_name": "report.pdf"})
+    assert PartitionStrategy().partition_key.path == "/id"
+    assert PartitionStrategy.by_id().partition_value(node) == "node-0"
+    assert PartitionStrategy.by_collection("reports").partition_value(node) == "reports"
+    assert PartitionStrategy.by_source_file().partition_value(node) == "report.pdf"
+    assert PartitionStrategy.by_source_file().partition_key.path == "/partitionKey"
+
+
+def test_filters_to_where():
+    filters = MetadataFilters(
+        filters=[
+            MetadataFilter(key="year", value=2020, operator=FilterOperator.GTE),
+            MetadataFilters(
+                filters=[
+                    MetadataFilter(key="file name", value=["a.txt", "b.txt"], operator=FilterOperator.IN),
+                    MetadataFilter(key="region", value="north", operator=FilterOperator.TEXT_MATCH_INSENSITIVE),
+                ],
+                condition=FilterCondition.OR,
+            ),
+        ]
+    )
+    where, parameters = filters_to_where(filters)
+    assert where == (
+        'c.metadata["year"] >= @filter0 AND (ARRAY_CONTAINS(@filter1, c.metadata["file name"]) '
+        'OR CONTAINS(c.metadata["region"], @filter2, true))'
+    )
+    assert [p["value"] for p in parameters] == [2020, ["a.txt", "b.txt"], "north"]
+    with pytest.raises(ValueError, match="any"):
+        filters_to_where(MetadataFilters(filters=[MetadataFilter(key="tags", value=["a"], operator="any")]))
+
+    # the keys are quoted as JSON strings.
+    where, _ = filters_to_where(MetadataFilters(filters=[MetadataFilter(key='the "file"', value="a.txt")]))
+    assert where == 'c.metadata["the \\"file\\""] = @filter0'
+    # a keyword of the query language is a valid key.
+    where, _ = filters_to_where(MetadataFilters(filters=[MetadataFilter(key="value", value="a")]))
+    assert where == 'c.metadata["value"] = @filter0'
+    # a string is not split in characters.
+    for operator in (FilterOperator.IN, FilterOperator.NIN):
+        with pytest.raises(ValueError, match="list"):
+            filters_to_where(MetadataFilters(filters=[MetadataFilter(key="file", value="a.txt", operator=operator)]))
+
+    # the empty groups are skipped.
+    empty = MetadataFilters(filters=[], condition=FilterCondition.OR)
+    nested = MetadataFilters(filters=[MetadataFilter(key="year", value=2020), empty])
+    assert filters_to_where(nested)[0] == 'c.metadata["year"] = @filter0'
+    assert filters_to_where(MetadataFilters(filters=[empty, MetadataFilters(filters=[empty])])) == ("", [])
+
+
+def test_filtered_vector_search():
+    indexing_policy = filter_indexing_policy(["file_name", "year"])
+    assert {"path": '/metadata/"year"/?'} in indexing_policy["includedPaths"]
+    cosmos = Cosmos.create(DATABASE, CONTAINER, client=InMemoryCosmosClient(), indexing_policy=indexing_policy)
+    nodes = make_nodes(200)
+    for i, node in enumerate(nodes):
+        node.metadata.update(year=2000 + i % 20, region="north" if i % 2 else "south")
+    cosmos.bulk_upsert(nodes)
+    container = cosmos.container
+    index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+
+    charge = container.request_charge
+    assert len(index.as_retriever(similarity_top_k=5).retrieve("chunk")) == 5
+    unfiltered = container.request_charge - charge
+
+    filters = MetadataFilters(
+        filters=[
+            MetadataFilter(key="file_name", value="file-3.txt"),
+            MetadataFilter(key="year", value=2010, operator=FilterOperator.GTE),
+        ]
+    )
+    charge = container.request_charge
+    retrieved = index.as_retriever(similarity_top_k=50, filters=filters).retrieve("chunk")
+    filtered = container.request_charge - charge
+    # the 20 matching items are returned, not the top 50 of the container filtered afterwards.
+    assert len(retrieved) == 20
+    assert all(n.node.metadata["file_name"] == "file-3.txt" and n.node.metadata["year"] >= 2010 for n in retrieved)
+    assert filtered < unfiltered / 2
+
+    # a filter out of the index reads every item.
+    filters = MetadataFilters(filters=[MetadataFilter(key="region", value="north")])
+    charge = container.request_charge
+    retrieved = index.as_retriever(similarity_top_k=200, filters=filters).retrieve("chunk")
+    assert len(retrieved) == 100
+    assert container.request_charge - charge >= unfiltered
+
+    # a key that is not an identifier, and empty groups that do not restrict the search.
+    cosmos.bulk_upsert(
+        [TextNode(text="chunk", id_="quoted", embedding=nodes[0].embedding, metadata={'the "region"': "east"})]
+    )
+    filters = MetadataFilters(
+        filters=[MetadataFilter(key='the "region"', value="east"), MetadataFilters(filters=[MetadataFilters(filters=[])])]
+    )
+    retrieved = index.as_retriever(similarity_top_k=5, filters=filters).retrieve("chunk")
+    assert [n.node.node_id for n in retrieved] == ["quoted"]
+    filters = MetadataFilters(filters=[MetadataFilters(filters=[])])
+    assert len(index.as_retriever(similarity_top_k=5, filters=filters).retrieve("chunk")) == 5
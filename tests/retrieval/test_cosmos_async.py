@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from azure.cosmos.exceptions import CosmosHttpResponseError, CosmosResourceNotFoundError
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import Document
+from llama_index.core.vector_stores.types import MetadataFilters
+from vfn_rag.retrieval.cosmos import Cosmos, PartitionStrategy
+from vfn_rag.retrieval import cosmos_async
+from vfn_rag.retrieval.cosmos_async import AsyncCosmos, create_async_client
+from tests.retrieval.cosmos_memory import InMemoryAsyncCosmosClient, InMemoryCosmosClient
+
+from tests.retrieval.test_cosmos import CONTAINER, DATABASE, make_nodes
+
+
+def test_create_async_client():
+    async def main():
+        client = create_async_client("https://account.documents.azure.com:443/", "a2V5", connection_limit=8)
+        session = client.client_connection.pipeline_client._pipeline._transport.session
+        assert session.connector.limit == 8
+        await client.close()
+        assert session.closed
+
+    asyncio.run(main())
+
+
+def test_insert_query_delete():
+    async def main():
+        client = InMemoryAsyncCosmosClient(latency=0.01)
+        cosmos = await AsyncCosmos.create(DATABASE, CONTAINER, client=client)
+        index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+        await index.ainsert_nodes(make_nodes(40))
+        assert len(cosmos.container.sync_container) == 40
+
+        # the queries wait for Cosmos together, on one event loop.
+        retriever = index.as_retriever(similarity_top_k=3)
+        results = await asyncio.gather(*(retriever.aretrieve(f"chunk {i}") for i in range(50)))
+        assert cosmos.container.sync_container.max_in_flight == 50
+        assert all(len(result) == 3 for result in results)
+        assert results[0][0].node.metadata["file_name"].startswith("file-")
+
+        with pytest.raises(NotImplementedError):
+            retriever.retrieve("chunk")
+
+        document = Document(text="the annual report", id_="report")
+        await index.ainsert(document)
+        assert len(cosmos.container.sync_container) == 41
+        await index.adelete_ref_doc("report")
+        await cosmos.vector_store.adelete_nodes(["node-0", "node-1"])
+        assert len(cosmos.container.sync_container) == 38
+        filters = MetadataFilters.from_dicts([{"key": "file_name", "value": "file-4.txt"}])
+        await cosmos.vector_store.adelete_nodes(filters=filters)
+        assert len(cosmos.container.sync_container) == 30
+
+        # the client is shared, not closed with the storage.
+        await cosmos.close()
+        assert not client.closed
+
+    asyncio.run(main())
+
+
+def test_load():
+    async def main():
+        account = InMemoryCosmosClient()
+        # a container written by the synchronous storage.
+        Cosmos.create(DATABASE, CONTAINER, client=account).bulk_upsert(make_nodes(10))
+        async with InMemoryAsyncCosmosClient(account) as client:
+            async with await AsyncCosmos.load(DATABASE, CONTAINER, client=client) as cosmos:
+                index = VectorStoreIndex.from_vector_store(cosmos.vector_store)
+                assert len(await index.as_retriever(similarity_top_k=4).aretrieve("chunk")) == 4
+            with pytest.raises(CosmosResourceNotFoundError):
+                await AsyncCosmos.load(DATABASE, "missing", client=client)
+            with pytest.raises(ValueError, match="/id"):
+                await AsyncCosmos.load(
+                    DATABASE, CONTAINER, client=client, partition_strategy=PartitionStrategy.by_metadata("tenant")
+                )
+
+    asyncio.run(main())
+
+
+def test_create_closes_owned_client_on_failure(monkeypatch):
+    client = InMemoryAsyncCosmosClient()
+    monkeypatch.setattr(cosmos_async, "create_async_client", lambda uri, key, connection_limit: client)
+
+    async def failing_create_database(**kwargs):
+        raise CosmosHttpResponseError(status_code=403, message="forbidden")
+
+    client.create_database_if_not_exists = failing_create_database
+
+    async def main():
+        with pytest.raises(CosmosHttpResponseError):
+            await AsyncCosmos.create(DATABASE, CONTAINER, uri="https://account.documents.azure.com:443/", key="a2V5")
+        assert client.closed
+
+    asyncio.run(main())
+
+
+def test_create_checks_existing_container(monkeypatch):
+    account = InMemoryCosmosClient()
+    Cosmos.create(DATABASE, CONTAINER, client=account, partition_strategy=PartitionStrategy.by_metadata("tenant"))
+    client = InMemoryAsyncCosmosClient(account)
+    monkeypatch.setattr(cosmos_async, "create_async_client", lambda uri, key, connection_limit: client)
+
+    async def main():
+        with pytest.raises(ValueError, match="/partitionKey"):
+            await AsyncCosmos.create(DATABASE, CONTAINER, uri="https://account.documents.azure.com:443/", key="a2V5")
+        assert client.closed
+
+    asyncio.run(main())
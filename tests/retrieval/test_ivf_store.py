@@ -0,0 +1,122 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.ivf_store import IVFVectorStore
+from vfn_rag.retrieval.journal import WAL_DIR
+from vfn_rag.retrieval.storage import Storage
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+
+def clustered_nodes(num_nodes: int, dim: int = 16, num_clusters: int = 20, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim))
+    embeddings = centers[rng.integers(num_clusters, size=num_nodes)] + 0.1 * rng.normal(
+        size=(num_nodes, dim)
+    )
+    return [
+        TextNode(text="", id_=f"n{seed}-{i}", embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+
+def recall(store, exact, queries, k: int = 10) -> float:
+    hits = 0
+    for query in queries:
+        vector_query = VectorStoreQuery(query_embedding=query, similarity_top_k=k)
+        hits += len(set(store.query(vector_query).ids) & set(exact.query(vector_query).ids))
+    return hits / (k * len(queries))
+
+
+@pytest.fixture()
+def stores():
+    nodes = clustered_nodes(2000)
+    ivf = IVFVectorStore(nlist=20, nprobe=3, min_train_size=100)
+    exact = NumpyVectorStore()
+    ivf.add(nodes)
+    exact.add(nodes)
+    ivf.train()
+    return ivf, exact
+
+
+def test_exact_below_min_train_size():
+    nodes = clustered_nodes(50)
+    store = IVFVectorStore(min_train_size=100)
+    store.add(nodes)
+    result = store.query(VectorStoreQuery(query_embedding=nodes[0].embedding, similarity_top_k=1))
+    assert result.ids == [nodes[0].node_id]
+    assert not store.is_trained and not store.needs_training
+
+
+def test_query_does_not_train(tmp_path: Path):
+    store = IVFVectorStore(nlist=20, min_train_size=100)
+    store.add(clustered_nodes(200))
+    query = VectorStoreQuery(query_embedding=[0.0] * 16, similarity_top_k=1)
+    store.query(query)
+    assert not store.is_trained and store.needs_training
+    # the index is trained when the store is persisted.
+    store.persist(str(tmp_path / "default__vector_store.json"))
+    assert store.is_trained and not store.needs_training
+    store.add(clustered_nodes(300, seed=1))
+    store.query(query)
+    assert store.needs_training
+
+
+def test_recall(stores):
+    ivf, exact = stores
+    queries = [node.embedding for node in clustered_nodes(20, seed=1)]
+    assert recall(ivf, exact, queries) > 0.9
+    assert ivf.is_trained
+    # probing all the lists is an exact search.
+    ivf.nprobe = 20
+    assert recall(ivf, exact, queries) == 1.0
+
+
+def test_incremental_add_and_delete(stores):
+    ivf, exact = stores
+    new_nodes = clustered_nodes(10, seed=2)
+    ivf.add(new_nodes)
+    result = ivf.query(VectorStoreQuery(query_embedding=new_nodes[3].embedding, similarity_top_k=1))
+    assert result.ids == [new_nodes[3].node_id]
+
+    ivf.delete_nodes([new_nodes[3].node_id])
+    result = ivf.query(VectorStoreQuery(query_embedding=new_nodes[3].embedding, similarity_top_k=1))
+    assert result.ids != [new_nodes[3].node_id]
+    assert len(ivf._assignments) == len(ivf._ids) == ivf.count + 1
+
+
+def test_persist(tmp_path: Path, stores):
+    ivf, exact = stores
+    path = str(tmp_path / "default__vector_store.json")
+    ivf.persist(path)
+    loaded = IVFVectorStore.from_persist_path(path)
+    assert loaded.is_trained and loaded.nprobe == 3
+    query = VectorStoreQuery(query_embedding=exact.get("n0-5"), similarity_top_k=5)
+    assert loaded.query(query).ids == ivf.query(query).ids
+
+
+def test_storage(tmp_path: Path):
+    storage = Storage.create(vector_store="ivf")
+    storage.vector_store.add(clustered_nodes(200))
+    storage.save(str(tmp_path))
+    loaded = Storage.load(str(tmp_path))
+    assert isinstance(loaded.vector_store, IVFVectorStore)
+    assert loaded.vector_store.count == 200
+
+
+def test_incremental_save_trains(tmp_path: Path):
+    store_dir = str(tmp_path)
+    storage = Storage.create(vector_store="ivf")
+    storage.vector_store.min_train_size = 100
+    storage.vector_store.add(clustered_nodes(50))
+    storage.save(store_dir)
+    assert not storage.vector_store.is_trained
+
+    # the store grew past min_train_size: the incremental save is a full save, which trains the index.
+    storage.vector_store.add(clustered_nodes(200, seed=1))
+    storage.save(store_dir, incremental=True)
+    assert storage.vector_store.is_trained
+    assert not (tmp_path / WAL_DIR).exists() or not list((tmp_path / WAL_DIR).iterdir())
+    loaded = Storage.load(store_dir)
+    assert loaded.vector_store.is_trained and loaded.vector_store.count == 250
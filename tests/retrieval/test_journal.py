@@ -0,0 +1,148 @@
+import os
+from pathlib import Path
+import pytest
+from llama_index.core import VectorStoreIndex, load_index_from_storage
+from llama_index.core.schema import Document, TextNode
+from vfn_rag.retrieval import journal
+from vfn_rag.retrieval.journal import JournaledKVStore, WAL_DIR, read_segments
+from vfn_rag.retrieval.storage import Storage
+
+
+def test_journaled_kvstore():
+    kvstore = JournaledKVStore()
+    kvstore.put("a", {"x": 1}, collection="c")
+    kvstore.delete("a", collection="c")
+    kvstore.delete("missing", collection="c")
+    assert kvstore.journal == [("delete", "c", "a", None)]
+    kvstore.clear_journal()
+
+    # only the last change of a key is recorded.
+    kvstore.put("a", {"x": 1}, collection="c")
+    kvstore.put("b", {"x": 2}, collection="c")
+    kvstore.put("a", {"x": 3}, collection="c")
+    kvstore.put("a", {"x": 3}, collection="d")
+    assert kvstore.journal == [
+        ("put", "c", "b", {"x": 2}),
+        ("put", "c", "a", {"x": 3}),
+        ("put", "d", "a", {"x": 3}),
+    ]
+    kvstore.clear_journal()
+    kvstore.replay("put", "c", "b", {"y": 2})
+    assert kvstore.get("b", collection="c") == {"y": 2}
+    assert kvstore.journal == []
+
+
+@pytest.mark.parametrize("vector_store", ["simple", "numpy"])
+def test_incremental_save(tmp_path: Path, vector_store: str, document: Document, text_node: TextNode):
+    store_dir = str(tmp_path)
+    storage = Storage.create(vector_store=vector_store)
+    storage.add_documents([document])
+    index = VectorStoreIndex(list(storage.docstore.docs.values()), storage_context=storage.store)
+    storage.save(store_dir)
+    snapshot = (tmp_path / "docstore.json").read_text()
+
+    new_node = TextNode(text="a new node", id_="n3", metadata={"file_path": "new-path"})
+    index.insert_nodes([new_node])
+    index.insert_nodes([TextNode(text="another node", id_="n4", metadata={"file_path": "new-path"})])
+    index.delete_nodes(["n4"], delete_from_docstore=True)
+    storage.save(store_dir, incremental=True)
+    # the snapshot is not rewritten, the change is appended to the write-ahead log.
+    assert (tmp_path / "docstore.json").read_text() == snapshot
+    records = list(read_segments(store_dir))
+    assert {record["store"] for record in records} == {
+        "docstore",
+        "index_store",
+        "vector_store/default",
+    }
+    assert [r["key"] for r in records if r["store"] == "vector_store/default"] == ["n3", "n4"]
+    # the index struct put on every insert is journaled once.
+    assert len([r for r in records if r["store"] == "index_store"]) == 1
+
+    # nothing changed: no new segment.
+    storage.save(store_dir, incremental=True)
+    assert len(os.listdir(tmp_path / WAL_DIR)) == 1
+
+    loaded = Storage.load(store_dir)
+    assert loaded.docstore.document_exists("n3")
+    loaded_index = load_index_from_storage(loaded.store, index_id=index.index_id)
+    assert "n3" in loaded_index.index_struct.nodes_dict.values()
+    retrieved = loaded_index.as_retriever(similarity_top_k=5).retrieve("node")
+    assert "n3" in [node.node.node_id for node in retrieved]
+
+    # deletes are replayed too.
+    loaded.delete_documents(["n3"])
+    loaded.vector_store.delete_nodes(["n3"])
+    loaded.save(store_dir, incremental=True)
+    reloaded = Storage.load(store_dir)
+    assert not reloaded.docstore.document_exists("n3")
+    assert len(list(read_segments(store_dir))) > len(records)
+
+
+@pytest.mark.parametrize("vector_store", ["simple", "numpy"])
+def test_changed_ids(vector_store: str):
+    storage = Storage.create(vector_store=vector_store)
+    nodes = [TextNode(text=f"node {i}", id_=f"n{i}", embedding=[float(i), 1.0]) for i in range(3)]
+    storage.vector_store.add(nodes)
+    storage.vector_store.delete_nodes(["n1", "missing"])
+    assert storage.vector_store.changed_ids == ["n0", "n1", "n2"]
+    records = storage._journal_records()
+    assert [(record["key"], record["op"]) for record in records] == [
+        ("n0", "put"),
+        ("n1", "delete"),
+        ("n2", "put"),
+    ]
+    storage.vector_store.clear_changed_ids()
+    assert storage._journal_records() == []
+
+
+def test_interrupted_compaction(tmp_path: Path, document: Document):
+    store_dir = str(tmp_path)
+    storage = Storage.create()
+    storage.add_documents([document])
+    storage.save(store_dir)
+    node = TextNode(text="a new node", id_="n3", embedding=[1.0] * 768)
+    storage.vector_store.add([node])
+    storage.save(store_dir, incremental=True)
+
+    # the node is deleted and the store compacted, but the process stops before the segments are removed.
+    storage.vector_store.delete_nodes(["n3"])
+    storage.store.persist(persist_dir=store_dir)
+    journal.mark_snapshot(store_dir)
+    assert len(os.listdir(tmp_path / WAL_DIR)) == 1
+
+    loaded = Storage.load(store_dir)
+    assert "n3" not in loaded.vector_store.data.embedding_dict
+    assert list(read_segments(store_dir)) == []
+    # the next segments are numbered after the ones the snapshot includes.
+    loaded.vector_store.add([node])
+    loaded.save(store_dir, incremental=True)
+    assert "n3" in Storage.load(store_dir).vector_store.data.embedding_dict
+
+
+def test_compact(tmp_path: Path, document: Document, text_node: TextNode):
+    store_dir = str(tmp_path)
+    storage = Storage.create()
+    storage.add_documents([document])
+    storage.save(store_dir)
+    storage.add_documents([text_node])
+    storage.save(store_dir, incremental=True, compact_threshold=0)
+    assert not (tmp_path / WAL_DIR).exists()
+    assert len(Storage.load(store_dir).docstore.docs) == 2
+
+
+def test_incremental_save_falls_back_to_full_save(
+    tmp_path: Path, storage_docstore, document: Document
+):
+    store_dir = str(tmp_path)
+    # a new store has no snapshot yet.
+    storage = Storage.create()
+    storage.add_documents([document])
+    storage.save(store_dir, incremental=True)
+    assert (tmp_path / "docstore.json").exists()
+    assert not (tmp_path / WAL_DIR).exists()
+
+    # the changes of a storage context that was not created by Storage are not journaled.
+    storage = Storage(storage_docstore)
+    storage.save(store_dir, incremental=True)
+    assert not (tmp_path / WAL_DIR).exists()
+    assert len(Storage.load(store_dir).docstore.docs) == 4
@@ -0,0 +1,70 @@
+from llama_index.core.schema import TextNode
+from vfn_rag.indexing.index_manager import IndexManager
+from vfn_rag.retrieval.keyword_index import (
+    BM25Retriever,
+    HybridRetriever,
+    KeywordIndex,
+    KEYWORD_INDEX_FILE,
+)
+from vfn_rag.retrieval.storage import Storage
+
+
+def test_search_and_incremental_updates(tmp_path, data_path: str):
+    store_dir = str(tmp_path)
+    docs = {doc.metadata["file_name"]: doc for doc in Storage.read_documents(data_path)}
+    storage = Storage.create()
+    keyword_index = KeywordIndex()
+    storage.add_documents(docs.values(), keyword_index=keyword_index, bulk=True)
+    assert len(keyword_index) == 4
+
+    assert [doc_id for doc_id, _ in keyword_index.search("guano")] == [docs["text_4.txt"].doc_id]
+    assert keyword_index.search("crocodilians ostrich")[0][0] in {
+        docs["text_1.txt"].doc_id,
+        docs["text_2.txt"].doc_id,
+    }
+    assert keyword_index.search("unknownterm") == []
+
+    station = TextNode(text="Station code HVH-042 measured the water level.", metadata={"file_path": "x.txt"})
+    storage.add_documents([station], keyword_index=keyword_index)
+    assert keyword_index.search("hvh 042", top_k=1)[0][0] == station.node_id
+
+    storage.delete_documents([docs["text_4.txt"].doc_id], keyword_index=keyword_index)
+    assert keyword_index.search("guano") == []
+    # the arrays are built once per batch of changes, not per query.
+    lengths = keyword_index._length_array
+    keyword_index.search("birds")
+    assert keyword_index._length_array is lengths
+
+    keyword_index.save(store_dir)
+    assert (tmp_path / KEYWORD_INDEX_FILE).exists()
+    loaded = KeywordIndex.load(store_dir)
+    assert len(loaded) == 4
+    for query in ("birds feathers eggs", "hvh 042", "guano"):
+        assert loaded.search(query) == keyword_index.search(query)
+
+    rebuilt = KeywordIndex.from_docstore(storage.docstore)
+    assert rebuilt.search("birds feathers eggs") == loaded.search("birds feathers eggs")
+
+
+def test_hybrid_retriever(data_path: str):
+    storage = Storage.create()
+    keyword_index = KeywordIndex()
+    docs = Storage.read_documents(data_path)
+    storage.add_documents(docs, keyword_index=keyword_index)
+    index_manager = IndexManager.create_from_storage(storage)
+    guano = next(doc.doc_id for doc in docs if "Guano" in doc.text)
+
+    bm25 = BM25Retriever(keyword_index, storage.docstore, similarity_top_k=1)
+    assert [node.node.node_id for node in bm25.retrieve("guano")] == [guano]
+
+    retriever = index_manager.as_retriever(keyword_index=keyword_index, similarity_top_k=2)
+    assert isinstance(retriever, HybridRetriever)
+    retrieved = retriever.retrieve("guano")
+    # the mock embeddings are all equal, the keyword match ranks first.
+    assert len(retrieved) == 2
+    assert retrieved[0].node.node_id == guano
+    assert retrieved[0].score > retrieved[1].score
+
+    query_engine = index_manager.as_query_engine(keyword_index=keyword_index, similarity_top_k=2)
+    response = query_engine.query("guano")
+    assert guano in {node.node.node_id for node in response.source_nodes}
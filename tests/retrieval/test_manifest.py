@@ -0,0 +1,106 @@
+import os
+import shutil
+from pathlib import Path
+import pytest
+from vfn_rag.retrieval.manifest import FileManifest, ID_MAPPING_FILE, MANIFEST_FILE
+from vfn_rag.retrieval.storage import Storage
+from vfn_rag.utils.helper_functions import generate_content_hash
+
+
+@pytest.fixture()
+def data_dir(tmp_path: Path, data_path: str) -> Path:
+    path = tmp_path / "files"
+    shutil.copytree(data_path, path)
+    return path
+
+
+def test_load_missing_or_legacy_manifest(tmp_path: Path, storage_path: str):
+    assert len(FileManifest.load(str(tmp_path))) == 0
+    # the mapping of an older store is converted, its files are read again and their old documents replaced.
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    shutil.copy(Path(storage_path) / ID_MAPPING_FILE, store_dir / ID_MAPPING_FILE)
+    legacy = (store_dir / ID_MAPPING_FILE).read_text()
+    manifest = FileManifest.load(str(store_dir))
+    assert list(manifest.records) == ["document-path", "node-path"]
+    old_ids = [doc_id for record in manifest.records.values() for doc_id in record.doc_ids]
+    assert len(old_ids) == 2
+
+    data_dir = tmp_path / "files"
+    data_dir.mkdir()
+    (data_dir / "document-path").write_text("a document")
+    docs, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert diff.modified == ["document-path"]
+    assert diff.deleted == ["node-path"]
+    assert diff.stale_doc_ids == old_ids
+    # the new manifest is saved in its own file, the mapping of the older store is not overwritten.
+    manifest.save(str(store_dir))
+    assert (store_dir / ID_MAPPING_FILE).read_text() == legacy
+    assert FileManifest.load(str(store_dir)).records["document-path"].doc_ids == [docs[0].doc_id]
+
+
+def test_read_changed_documents(tmp_path: Path, data_dir: Path):
+    store_dir = str(tmp_path / "store")
+    storage = Storage.create()
+    manifest = FileManifest.load(store_dir)
+
+    docs, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert len(docs) == 4
+    assert sorted(diff.new) == ["text_1.txt", "text_2.txt", "text_3.txt", "text_4.txt"]
+    assert diff.stale_doc_ids == []
+    storage.add_documents(docs, generate_id=False)
+    manifest.save(store_dir)
+    assert os.path.exists(os.path.join(store_dir, MANIFEST_FILE))
+
+    # nothing changed: nothing is read.
+    manifest = FileManifest.load(store_dir)
+    assert manifest.records["text_1.txt"].doc_ids == [
+        generate_content_hash((data_dir / "text_1.txt").read_text())
+    ]
+    docs, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert docs == []
+    assert not diff.has_changes
+
+    old_ids = manifest.records["text_1.txt"].doc_ids + manifest.records["text_2.txt"].doc_ids
+    (data_dir / "text_1.txt").write_text("an updated text")
+    (data_dir / "text_2.txt").unlink()
+    (data_dir / "text_5.txt").write_text("a new text")
+
+    docs, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert diff.new == ["text_5.txt"]
+    assert diff.modified == ["text_1.txt"]
+    assert diff.deleted == ["text_2.txt"]
+    assert sorted(diff.stale_doc_ids) == sorted(old_ids)
+    assert [doc.text for doc in docs] == ["a new text", "an updated text"]
+    assert "text_2.txt" not in manifest
+
+    storage.delete_documents(diff.stale_doc_ids)
+    storage.add_documents(docs, generate_id=False)
+    assert len(storage.docstore.docs) == 4
+
+
+def test_touched_file_is_unchanged(data_dir: Path):
+    manifest = FileManifest()
+    Storage.read_changed_documents(str(data_dir), manifest)
+    file = data_dir / "text_3.txt"
+    stat = file.stat()
+    os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    docs, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert docs == []
+    assert "text_3.txt" in diff.unchanged
+    assert manifest.records["text_3.txt"].mtime_ns == stat.st_mtime_ns + 10**9
+
+
+def test_stale_doc_ids_keep_live_documents(data_dir: Path):
+    # a copy of a file has the same content, hence the same document ID.
+    shutil.copy(data_dir / "text_3.txt", data_dir / "text_3_copy.txt")
+    manifest = FileManifest()
+    Storage.read_changed_documents(str(data_dir), manifest)
+    shared_id = manifest.records["text_3.txt"].doc_ids[0]
+    assert manifest.records["text_3_copy.txt"].doc_ids == [shared_id]
+
+    (data_dir / "text_3_copy.txt").unlink()
+    _, diff = Storage.read_changed_documents(str(data_dir), manifest)
+    assert diff.deleted == ["text_3_copy.txt"]
+    assert diff.stale_doc_ids == []
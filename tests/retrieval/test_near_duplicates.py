@@ -0,0 +1,77 @@
+import numpy as np
+from llama_index.core.schema import Document
+from vfn_rag.retrieval.near_duplicates import (
+    MinHasher,
+    NearDuplicateIndex,
+    NEAR_DUPLICATES_FILE,
+    optimal_bands,
+    shingle_hashes,
+)
+from vfn_rag.retrieval.storage import Storage
+
+
+def _reexport(doc: Document) -> Document:
+    """A near-copy of a document, with another header and footer."""
+    return Document(
+        text=f"Report 2024 - revised edition\n{doc.text}\nPage 1 of 1",
+        metadata=dict(doc.metadata),
+    )
+
+
+def test_signature_estimates_jaccard():
+    words = [f"w{i}" for i in range(400)]
+    first = " ".join(words[:300])
+    second = " ".join(words[100:])
+    a, b = shingle_hashes(first), shingle_hashes(second)
+    jaccard = len(np.intersect1d(a, b)) / len(np.union1d(a, b))
+    hasher = MinHasher(num_perm=256)
+    estimate = np.mean(hasher.signature(first) == hasher.signature(second))
+    assert abs(estimate - jaccard) < 0.1
+    assert np.array_equal(hasher.signature(first), MinHasher(num_perm=256).signature(first))
+
+
+def test_optimal_bands():
+    bands, rows = optimal_bands(0.8, 128)
+    assert bands * rows <= 128
+    # a higher threshold needs longer bands.
+    assert optimal_bands(0.95, 128)[1] > optimal_bands(0.5, 128)[1]
+
+
+def test_texts_without_shingles():
+    index = NearDuplicateIndex()
+    assert index.check("a", "") is None
+    assert index.check("b", "... !!! ---") is None
+    assert index.check("c", "") is None
+    assert len(index) == 0 and index.duplicates == {}
+
+
+def test_add_documents_skips_near_duplicates(tmp_path, data_path: str):
+    store_dir = str(tmp_path)
+    docs = Storage.read_documents(data_path)
+    near_duplicates = NearDuplicateIndex(threshold=0.8)
+    storage = Storage.create()
+    summary = storage.add_documents(docs, near_duplicates=near_duplicates)
+    assert summary.num_added == 4 and summary.near_duplicates == {}
+
+    copy = _reexport(docs[0])
+    summary = storage.add_documents([copy], near_duplicates=near_duplicates, bulk=True)
+    assert summary.added == []
+    assert summary.near_duplicates == {copy.doc_id: docs[0].doc_id}
+    assert len(storage.docstore.docs) == 4
+    near_duplicates.save(store_dir)
+    assert (tmp_path / NEAR_DUPLICATES_FILE).exists()
+
+    loaded = NearDuplicateIndex.load(store_dir)
+    assert len(loaded) == 4
+    assert loaded.canonical_of(copy.doc_id) == docs[0].doc_id
+    # the signatures survive the round trip, a second near-copy is found in the loaded index.
+    other = _reexport(_reexport(docs[0]))
+    summary = storage.add_documents([other], near_duplicates=loaded)
+    assert summary.near_duplicates == {other.doc_id: docs[0].doc_id}
+
+    # deleting the canonical document removes it and the links to it.
+    storage.delete_documents([docs[0].doc_id], near_duplicates=loaded)
+    assert docs[0].doc_id not in loaded
+    assert loaded.duplicates == {}
+    summary = storage.add_documents([_reexport(docs[0])], near_duplicates=loaded)
+    assert summary.num_added == 1
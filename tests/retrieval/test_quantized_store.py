@@ -0,0 +1,74 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.quantized_store import QuantizedVectorStore, quantize
+from vfn_rag.retrieval.storage import Storage
+from vfn_rag.retrieval.vector_store import NumpyVectorStore
+
+
+@pytest.fixture()
+def nodes() -> list:
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(500, 64)).astype(np.float32)
+    return [
+        TextNode(text="", id_=f"n{i}", embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+
+def test_quantize():
+    embeddings = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+    codes, scales = quantize(embeddings)
+    assert codes.dtype == np.int8
+    assert codes[0].tolist() == [64, -127, 32]
+    np.testing.assert_allclose(codes * scales[:, None], embeddings, atol=scales[0])
+
+
+def test_query(nodes: list):
+    store = QuantizedVectorStore()
+    exact = NumpyVectorStore()
+    store.add(nodes[:200])
+    store.add(nodes[200:])
+    exact.add(nodes)
+    assert store.codes.shape == (500, 64)
+    assert store.resident_bytes < store.embeddings.nbytes / 3
+
+    rng = np.random.default_rng(1)
+    for query in rng.normal(size=(10, 64)).tolist():
+        vector_query = VectorStoreQuery(query_embedding=query, similarity_top_k=10)
+        expected = exact.query(vector_query)
+        result = store.query(vector_query)
+        # the rescored scores are the full-precision scores.
+        assert result.ids == expected.ids
+        np.testing.assert_allclose(result.similarities, expected.similarities, rtol=1e-5)
+
+        store.rescore_factor = 0
+        approximate = store.query(vector_query)
+        assert len(set(approximate.ids) & set(expected.ids)) >= 8
+        store.rescore_factor = 4
+
+
+def test_delete_and_persist(tmp_path: Path, nodes: list):
+    store = QuantizedVectorStore(rescore_factor=2)
+    store.add(nodes)
+    store.delete_nodes(["n0", "n1"])
+    path = str(tmp_path / "default__vector_store.json")
+    store.persist(path)
+    loaded = QuantizedVectorStore.from_persist_path(path)
+    assert isinstance(loaded._embeddings, np.memmap)
+    assert loaded.rescore_factor == 2
+    assert loaded.codes.shape == (498, 64)
+    query = VectorStoreQuery(query_embedding=nodes[5].embedding, similarity_top_k=3)
+    assert loaded.query(query).ids == store.query(query).ids
+    assert loaded.query(query).ids[0] == "n5"
+
+
+def test_storage(tmp_path: Path, nodes: list):
+    storage = Storage.create(vector_store="quantized")
+    storage.vector_store.add(nodes)
+    storage.save(str(tmp_path))
+    loaded = Storage.load(str(tmp_path))
+    assert isinstance(loaded.vector_store, QuantizedVectorStore)
+    assert loaded.vector_store.count == 500
@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+from llama_index.core import VectorStoreIndex, load_index_from_storage
+from llama_index.core.schema import Document, TextNode
+from vfn_rag.retrieval.sqlite_store import (
+    SQLiteDocumentStore,
+    SQLiteKVStore,
+    SQLITE_DOCSTORE_FNAME,
+)
+from vfn_rag.retrieval.storage import Storage
+
+
+def test_sqlite_kvstore(tmp_path: Path):
+    kvstore = SQLiteKVStore(str(tmp_path / "kv.sqlite"))
+    kvstore.put_all([("a", {"x": 1}), ("b", {"x": 2}), ("c", {"x": 3})], collection="c1", batch_size=2)
+    kvstore.put("a", {"x": 4}, collection="c2")
+    assert kvstore.get("a", collection="c1") == {"x": 1}
+    assert kvstore.get("missing", collection="c1") is None
+    assert sorted(kvstore.keys(collection="c1")) == ["a", "b", "c"]
+    assert kvstore.get_all(collection="c2") == {"a": {"x": 4}}
+    assert kvstore.delete("a", collection="c1")
+    assert not kvstore.delete("a", collection="c1")
+    kvstore.close()
+
+
+def test_writes_committed_on_persist(tmp_path: Path):
+    path = str(tmp_path / "kv.sqlite")
+    kvstore = SQLiteKVStore(path)
+    kvstore.put("a", {"x": 1})
+    # the write is staged: the store reads it, another connection does not.
+    assert kvstore.get("a") == {"x": 1}
+    reader = SQLiteKVStore(path)
+    assert reader.get("a") is None
+    kvstore.persist(path)
+    assert reader.get("a") == {"x": 1}
+    reader.close()
+    kvstore.close()
+
+
+def test_temporary_database_moves_on_persist(tmp_path: Path):
+    kvstore = SQLiteKVStore()
+    temporary_path = kvstore.path
+    kvstore.put("a", {"x": 1})
+    kvstore.persist(str(tmp_path / "kv.sqlite"))
+    assert kvstore.path == str(tmp_path / "kv.sqlite")
+    assert not os.path.exists(temporary_path)
+    assert kvstore.get("a") == {"x": 1}
+    kvstore.close()
+
+
+def test_storage_with_sqlite_docstore(
+    tmp_path: Path, document: Document, text_node: TextNode, hash_document: str
+):
+    store_dir = str(tmp_path)
+    storage = Storage.create(docstore="sqlite")
+    assert isinstance(storage.docstore, SQLiteDocumentStore)
+    summary = storage.add_documents([document, text_node], bulk=True)
+    assert summary.num_added == 2
+    assert storage.add_documents([document], bulk=True).skipped == [hash_document]
+    assert storage.docstore.document_exists(hash_document)
+    index = VectorStoreIndex(list(storage.docstore.docs.values()), storage_context=storage.store)
+    storage.save(store_dir)
+    assert (tmp_path / SQLITE_DOCSTORE_FNAME).exists()
+    assert not (tmp_path / "docstore.json").exists()
+
+    loaded = Storage.load(store_dir)
+    assert isinstance(loaded.docstore, SQLiteDocumentStore)
+    assert loaded.docstore.get_document(hash_document).text == document.text
+    loaded_index = load_index_from_storage(loaded.store, index_id=index.index_id)
+    nodes = loaded_index.as_retriever(similarity_top_k=1).retrieve("document")
+    assert len(nodes) == 1
+
+    # the docstore writes in place, so an incremental save only journals the index and vector stores.
+    loaded.add_documents([TextNode(text="new", metadata={"file_path": "new"})])
+    loaded.save(store_dir, incremental=True)
+    assert len(Storage.load(store_dir).docstore.docs) == 3
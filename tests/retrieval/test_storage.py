@@ -1,4 +1,5 @@
 import os
+from itertools import chain
 import pytest
 from vfn_rag.utils.helper_functions import generate_content_hash
 from llama_index.core.schema import Document, TextNode
@@ -8,7 +9,7 @@ from llama_index.core.vector_stores import SimpleVectorStore
 from llama_index.core.graph_stores import SimpleGraphStore
 from llama_index.core import StorageContext
 
-from vfn_rag.retrieval.storage import Storage
+from vfn_rag.retrieval.storage import Storage, IngestionSummary
 
 
 def test_create_simple_storage_context():
@@ -106,6 +107,60 @@ class TestStorage:
             "dfbab7917ff16a68316aaf745bbbaeffe4b8c1692763548605020c227831c1c4 already exists. Skipping.\n"
         )
 
+    def test_add_documents_bulk(
+        self,
+        capsys,
+        test_empty_storage: Storage,
+        document: Document,
+        text_node: TextNode,
+        hash_document: str,
+        hash_text_node: str,
+    ):
+        summary = test_empty_storage.add_documents([document, text_node], bulk=True)
+        assert isinstance(summary, IngestionSummary)
+        assert summary.added == [hash_document, hash_text_node]
+        assert summary.num_skipped == 0
+        docstore = test_empty_storage.store.docstore
+        assert docstore.get_document(hash_document) == document
+        assert docstore.get_document(hash_text_node) == text_node
+
+        summary = test_empty_storage.add_documents(
+            [document, text_node, document], bulk=True, batch_size=1
+        )
+        assert summary.num_added == 0
+        assert summary.skipped == [hash_document, hash_text_node, hash_document]
+        assert len(docstore.docs) == 2
+        # the bulk mode reports the duplicates in the summary instead of printing them.
+        assert capsys.readouterr().out == ""
+        assert test_empty_storage.document_ids() == {hash_document, hash_text_node}
+
+    def test_document_ids_shared_text(self, test_empty_storage: Storage):
+        nodes = [
+            TextNode(text="same", id_=node_id, metadata={"file_path": "report.txt"})
+            for node_id in ("a", "b")
+        ]
+        test_empty_storage.add_documents(nodes, generate_id=False, bulk=True)
+        assert test_empty_storage.document_ids() == {"a", "b"}
+        summary = test_empty_storage.add_documents(nodes, generate_id=False, bulk=True)
+        assert summary.num_added == 0
+        assert summary.skipped == ["a", "b"]
+
+    def test_add_documents_bulk_update(
+        self,
+        test_empty_storage: Storage,
+        document: Document,
+        text_node: TextNode,
+        hash_document: str,
+        hash_text_node: str,
+    ):
+        test_empty_storage.add_documents([document], bulk=True)
+        summary = test_empty_storage.add_documents(
+            [document, text_node], update=True, bulk=True
+        )
+        assert summary.added == [hash_text_node]
+        assert summary.updated == [hash_document]
+        assert len(test_empty_storage.store.docstore.docs) == 2
+
     def test_different_nodes_same_document(
         self,
         test_empty_storage: Storage,
@@ -132,3 +187,26 @@ def test_read_documents(data_path: str):
     assert doc.excluded_embed_metadata_keys == ["file_name"]
     assert doc.excluded_embed_metadata_keys == ["file_name"]
     assert docs[0].doc_id == generate_content_hash(docs[0].text)
+
+
+def test_iter_documents(data_path: str):
+    batches = Storage.iter_documents(data_path)
+    # one batch per file by default
+    assert [len(batch) for batch in batches] == [1, 1, 1, 1]
+    batches = list(Storage.iter_documents(data_path, batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+    doc = batches[0][0]
+    assert doc.excluded_embed_metadata_keys == ["file_name"]
+    assert doc.doc_id == generate_content_hash(doc.text)
+    batches = Storage.iter_documents(data_path, max_batch_bytes=1)
+    assert [len(batch) for batch in batches] == [1, 1, 1, 1]
+
+
+def test_add_documents_from_stream(data_path: str):
+    storage = Storage.create()
+    batches = Storage.iter_documents(data_path, batch_size=2)
+    summary = storage.add_documents(
+        chain.from_iterable(batches), generate_id=False, bulk=True, batch_size=3
+    )
+    assert summary.num_added == 4
+    assert len(storage.docstore.docs) == 4
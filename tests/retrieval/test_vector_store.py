@@ -0,0 +1,163 @@
+import os
+from pathlib import Path
+import numpy as np
+import pytest
+from llama_index.core import VectorStoreIndex, load_index_from_storage
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from vfn_rag.retrieval.ivf_store import IVFVectorStore
+from vfn_rag.retrieval.quantized_store import QuantizedVectorStore
+from vfn_rag.retrieval.storage import Storage
+from vfn_rag.retrieval.vector_store import (
+    NumpyVectorStore,
+    batch_query,
+    load_vector_stores,
+    top_k_indices,
+)
+
+
+@pytest.fixture()
+def nodes() -> list:
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(20, 8)).astype(np.float32)
+    return [
+        TextNode(text=f"node {i}", id_=f"n{i}", embedding=embedding.tolist())
+        for i, embedding in enumerate(embeddings)
+    ]
+
+
+def exact_top_k(nodes: list, query: np.ndarray, k: int) -> list:
+    store = SimpleVectorStore()
+    store.add(nodes)
+    result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k))
+    return result.ids
+
+
+def test_top_k_indices():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 2, 0]
+
+
+class TestNumpyVectorStore:
+
+    def test_query_matches_simple_vector_store(self, nodes: list):
+        store = NumpyVectorStore()
+        store.add(nodes[:10])
+        store.add(nodes[10:])
+        assert store.count == 20
+        query = np.asarray(nodes[3].embedding)
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=5))
+        assert result.ids == exact_top_k(nodes, query, 5)
+        assert result.ids[0] == "n3"
+        assert result.similarities[0] == pytest.approx(1.0)
+
+    def test_query_restricted_to_node_ids(self, nodes: list):
+        store = NumpyVectorStore()
+        store.add(nodes)
+        query = VectorStoreQuery(
+            query_embedding=nodes[3].embedding, similarity_top_k=5, node_ids=["n1", "n2"]
+        )
+        assert sorted(store.query(query).ids) == ["n1", "n2"]
+
+    def test_delete(self, nodes: list):
+        store = NumpyVectorStore()
+        store.add(nodes)
+        store.delete_nodes(["n3"])
+        assert store.count == 19
+        assert "n3" not in store.node_ids
+        query = VectorStoreQuery(query_embedding=nodes[3].embedding, similarity_top_k=1)
+        assert store.query(query).ids != ["n3"]
+
+    def test_persist_and_memory_map(self, tmp_path: Path, nodes: list):
+        store = NumpyVectorStore()
+        store.add(nodes)
+        path = str(tmp_path / "default__vector_store.json")
+        store.persist(path)
+        assert os.path.exists(tmp_path / "default__vector_store.embeddings.npy")
+
+        loaded = NumpyVectorStore.from_persist_path(path)
+        assert isinstance(loaded.embeddings, np.memmap)
+        assert loaded.node_ids == store.node_ids
+        np.testing.assert_array_equal(loaded.embeddings, store.embeddings)
+        assert loaded.get("n4") == pytest.approx(nodes[4].embedding)
+
+        # adding and deleting rows leaves the memory-mapped matrix on disk.
+        loaded.add([TextNode(text="new", id_="new", embedding=[1.0] * 8)])
+        loaded.delete_nodes(["n4"])
+        query = VectorStoreQuery(query_embedding=[1.0] * 8, similarity_top_k=1)
+        assert loaded.query(query).ids == ["new"]
+        assert isinstance(loaded._embeddings, np.memmap)
+        assert isinstance(loaded._appended, np.memmap)
+        assert loaded.count == 20
+        with pytest.raises(KeyError):
+            loaded.get("n4")
+
+        # a memory-mapped store can be saved over its own files.
+        loaded.persist(path)
+        reloaded = NumpyVectorStore.from_persist_path(path)
+        assert reloaded.count == 20
+        assert "n4" not in reloaded.node_ids
+        assert reloaded.get("new") == [1.0] * 8
+        assert reloaded.get("n5") == pytest.approx(nodes[5].embedding)
+
+
+@pytest.mark.parametrize("store_class", [NumpyVectorStore, QuantizedVectorStore, IVFVectorStore])
+def test_re_add_replaces(nodes: list, store_class):
+    store = store_class()
+    store.add(nodes)
+    store.query(VectorStoreQuery(query_embedding=nodes[0].embedding, similarity_top_k=1))
+    # n0 is updated in the matrix, n1 twice in the buffer.
+    updated = TextNode(text="updated", id_="n0", embedding=nodes[1].embedding)
+    store.add([updated, nodes[1]])
+    store.add([nodes[1]])
+    assert store.count == 20
+    assert sorted(store.node_ids) == sorted(node.node_id for node in nodes)
+    assert store.get("n0") == pytest.approx(nodes[1].embedding)
+    result = store.query(VectorStoreQuery(query_embedding=nodes[1].embedding, similarity_top_k=3))
+    assert sorted(result.ids[:2]) == ["n0", "n1"]
+    assert len(set(result.ids)) == 3
+
+
+def test_batch_query(nodes: list):
+    queries = np.random.default_rng(1).normal(size=(5, 8)).astype(np.float32)
+    expected = [exact_top_k(nodes, query, 3) for query in queries]
+    simple = SimpleVectorStore()
+    simple.add(nodes)
+    numpy_store = NumpyVectorStore()
+    numpy_store.add(nodes)
+    for store in (simple, numpy_store):
+        results = batch_query(store, queries, 3)
+        assert [result.ids for result in results] == expected
+        assert all(len(result.similarities) == 3 for result in results)
+
+    # the deleted rows are never selected.
+    numpy_store.delete_nodes([expected[0][0]])
+    assert expected[0][0] not in batch_query(numpy_store, queries, 3)[0].ids
+    assert [r.ids for r in batch_query(NumpyVectorStore(), queries, 3)] == [[]] * 5
+
+
+def test_storage_with_numpy_vector_store(tmp_path: Path, data_path: str):
+    storage = Storage.create(vector_store="numpy")
+    assert isinstance(storage.vector_store, NumpyVectorStore)
+    storage.add_documents(Storage.read_documents(data_path), generate_id=False)
+    index = VectorStoreIndex(list(storage.docstore.docs.values()), storage_context=storage.store)
+    storage.save(str(tmp_path))
+
+    vector_stores = load_vector_stores(str(tmp_path))
+    assert isinstance(vector_stores["default"], NumpyVectorStore)
+    assert isinstance(vector_stores["image"], SimpleVectorStore)
+
+    storage = Storage.load(str(tmp_path))
+    assert isinstance(storage.vector_store, NumpyVectorStore)
+    assert storage.vector_store.count == 4
+    loaded_index = load_index_from_storage(storage.store, index_id=index.index_id)
+    nodes = loaded_index.as_retriever(similarity_top_k=2).retrieve("text")
+    assert len(nodes) == 2
+    assert all(storage.docstore.document_exists(node.node.node_id) for node in nodes)
+
+
+def test_create_unknown_vector_store():
+    with pytest.raises(ValueError):
+        Storage.create(vector_store="unknown")
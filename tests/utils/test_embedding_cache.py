@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import List
+import pytest
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings.mock_embed_model import MockEmbedding
+from vfn_rag.retrieval.storage import Storage
+from vfn_rag.utils.embedding_cache import CachedEmbedding, EmbeddingCache
+from vfn_rag.utils.embedding_executor import RateLimitedEmbedding
+
+
+class CountingEmbedding(MockEmbedding):
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += len(texts)
+        return [[float(len(text))] * self.embed_dim for text in texts]
+
+
+@pytest.fixture()
+def cache(tmp_path: Path) -> EmbeddingCache:
+    return EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+
+
+def test_embedding_cache(cache: EmbeddingCache):
+    cache.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0]}, model="m1")
+    assert cache.get_many(["a", "b", "c"], model="m1") == {"a": [1.0, 2.0], "b": [3.0, 4.0]}
+    # embeddings are keyed by model too.
+    assert cache.get_many(["a"], model="m2") == {}
+    assert cache.count == 2
+    assert cache.size_bytes == 16
+    cache.put_many({"a": [5.0, 6.0]}, model="m1")
+    assert cache.size_bytes == 16
+
+
+def test_lru_eviction(tmp_path: Path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_bytes=16)
+    cache.put_many({"a": [1.0, 2.0]}, model="m")
+    cache.put_many({"b": [1.0, 2.0]}, model="m")
+    cache.get_many(["a"], model="m")
+    cache.put_many({"c": [1.0, 2.0]}, model="m")
+    # "b" is the least recently used.
+    assert set(cache.get_many(["a", "b", "c"], model="m")) == {"a", "c"}
+    assert cache.size_bytes == 16
+    # the size is restored when the cache is reopened.
+    assert EmbeddingCache(cache.path).size_bytes == 16
+
+
+def test_cached_embedding(cache: EmbeddingCache):
+    model = CountingEmbedding(embed_dim=4)
+    cached = CachedEmbedding(model, cache)
+    embeddings = cached.get_text_embedding_batch(["one", "three", "one"])
+    assert embeddings == [[3.0] * 4, [5.0] * 4, [3.0] * 4]
+    assert model.calls == 2
+    assert cached.get_text_embedding("three") == [5.0] * 4
+    assert model.calls == 2
+    assert cached.hits == 2
+
+    # a model with other dimensions does not reuse the embeddings.
+    other = CachedEmbedding(CountingEmbedding(embed_dim=2), cache)
+    assert other.get_text_embedding("one") == [3.0] * 2
+
+
+def test_model_key_of_rate_limited_model(cache: EmbeddingCache):
+    model = CountingEmbedding(embed_dim=4)
+    rate_limited = CachedEmbedding(RateLimitedEmbedding(model, requests_per_minute=600), cache)
+    assert rate_limited.model_key == CachedEmbedding(model, cache).model_key
+    assert rate_limited.model_key.endswith("/4")
+
+
+def test_rebuild_index_without_embedding_calls(cache: EmbeddingCache, data_path: str):
+    model = CountingEmbedding(embed_dim=4)
+    cached = CachedEmbedding(model, cache)
+    docs = Storage.read_documents(data_path)
+    VectorStoreIndex(docs, embed_model=cached)
+    assert model.calls == 4
+    VectorStoreIndex(Storage.read_documents(data_path), embed_model=cached)
+    assert model.calls == 4
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List
+import pytest
+from llama_index.core.embeddings.mock_embed_model import MockEmbedding
+from vfn_rag.utils.embedding_executor import RateLimitedEmbedding, TokenBucket
+from vfn_rag.utils.models import get_azure_open_ai_embedding
+
+
+class FakeAzureOpenAI(BaseHTTPRequestHandler):
+    """A local Azure OpenAI embeddings endpoint that throttles the first requests."""
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            throttle = server.requests <= server.throttled
+        time.sleep(0.02)
+        with server.lock:
+            server.in_flight -= 1
+        if throttle:
+            self.send_response(429)
+            self.send_header("retry-after-ms", "50")
+            self.send_header("Content-Type", "application/json")
+            payload = {"error": {"code": "429", "message": "Rate limit is exceeded."}}
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            payload = {
+                "object": "list",
+                "model": "text-embedding-3-small",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": [float(len(text)), 1.0]}
+                    for i, text in enumerate(body["input"])
+                ],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAzureOpenAI)
+    server.lock = threading.Lock()
+    server.requests = server.in_flight = server.max_in_flight = 0
+    server.throttled = 2
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_token_bucket():
+    async def acquire_all():
+        bucket = TokenBucket(rate_per_minute=600, burst_seconds=0.5)
+        start = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # 5 tokens are available at once, the other 5 come at 10 per second.
+    assert 0.4 < asyncio.run(acquire_all()) < 1.5
+
+
+class ThrottledError(Exception):
+    def __init__(self, status_code: int, retry_after: str = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(
+            headers={"retry-after": retry_after} if retry_after else {}
+        )
+
+
+class FlakyEmbedding(MockEmbedding):
+    """Fails the first calls with the given errors."""
+
+    errors: List[Exception] = []
+    calls: int = 0
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return [[float(len(text))] * self.embed_dim for text in texts]
+
+
+def test_retry_honors_retry_after():
+    embed_model = FlakyEmbedding(embed_dim=2, errors=[ThrottledError(429, "0.2"), ThrottledError(503)])
+    executor = RateLimitedEmbedding(embed_model, batch_size=10, backoff=0.01)
+    start = time.monotonic()
+    assert executor.get_text_embedding_batch(["ab"]) == [[2.0, 2.0]]
+    assert time.monotonic() - start >= 0.2
+    assert executor.num_requests == 3
+    assert executor.num_retries == 2
+
+
+def test_errors_are_not_retried():
+    embed_model = FlakyEmbedding(embed_dim=2, errors=[ThrottledError(400)])
+    executor = RateLimitedEmbedding(embed_model, backoff=0.01)
+    with pytest.raises(ThrottledError):
+        executor.get_text_embedding_batch(["a"])
+    assert executor.num_requests == 1
+
+    embed_model = FlakyEmbedding(embed_dim=2, errors=[ThrottledError(429)] * 3)
+    executor = RateLimitedEmbedding(embed_model, max_retries=1, backoff=0.01)
+    with pytest.raises(ThrottledError):
+        executor.get_text_embedding_batch(["a"])
+    assert executor.num_requests == 2
+
+
+def test_fake_endpoint(endpoint):
+    embed_model = get_azure_open_ai_embedding(
+        endpoint=f"http://127.0.0.1:{endpoint.server_port}",
+        api_key="fake",
+        api_version="2024-02-01",
+        deployment_name="embedding",
+        model="text-embedding-3-small",
+        max_retries=0,
+    )
+    executor = RateLimitedEmbedding(
+        embed_model,
+        batch_size=4,
+        max_concurrency=2,
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        backoff=0.01,
+    )
+    texts = [f"text {'x' * i}" for i in range(20)]
+    embeddings = executor.get_text_embedding_batch(texts)
+    assert embeddings == [[float(len(text)), 1.0] for text in texts]
+    # 5 batches, and the 2 throttled requests were retried.
+    assert endpoint.requests == 7
+    assert endpoint.max_in_flight <= 2